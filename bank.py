@@ -16,20 +16,39 @@ except ImportError:
 
 try:
     from modules.csv_reader import BankStatementReader
-    from modules.filters import filter_transactions
+    from modules.dedup import TransactionDeduplicator
+    from modules.archives import expand_inputs
+    from modules.filters import partition_transactions
+    from modules.parallel_reader import ParallelStatementReader
+    from modules.planner import DEFAULT_MEMORY_BUDGET_MB, MODE_AUTO, MODE_STREAMING, MemoryTracker, plan_execution
+    from modules.recurring import STATE_FILENAME as RECURRING_STATE_FILENAME, RecurringDetector
+    from modules.rules import RuleEngine
     from modules.settlement import calculate_bank_settlement
     from modules.report_writer import BankReportWriter
+    from modules.run_cache import RunCache
     from modules.csv_exporter import CsvExporter
-    from modules.utils import find_latest_file, read_config, create_directories
+    from modules.sinks import SECTION_RECURRING, SECTION_TRANSACTIONS, resolve_sections
+    from modules.streaming import StreamingBankRun
+    from modules.utils import find_latest_file, find_files, read_config, create_directories
     from config.settings import Settings
 except ImportError as e:
     print(f"Import-Fehler: {e}")
     print("Stelle sicher, dass alle Dateien im richtigen Verzeichnis sind:")
+    print("- modules/archives.py")
     print("- modules/csv_reader.py")
+    print("- modules/dedup.py")
     print("- modules/filters.py")
+    print("- modules/parallel_reader.py")
+    print("- modules/planner.py")
+    print("- modules/recurring.py")
+    print("- modules/rules.py")
     print("- modules/settlement.py")
     print("- modules/report_writer.py")
+    print("- modules/run_cache.py")
     print("- modules/csv_exporter.py")
+    print("- modules/sinks.py")
+    print("- modules/streaming.py")
+    print("- modules/diagnostics.py")
     print("- modules/utils.py")
     print("- config/settings.py")
     print("- config/allowlist.yaml")
@@ -37,52 +56,270 @@ except ImportError as e:
     sys.exit(1)
 
 
-def main():
-    print("=== Monatsabrechnung Programm ===\n")
+EXPORT_LABELS = {
+    "csv": "Excel-Import",
+    "xlsx": "Excel-Arbeitsmappe",
+    "jsonl": "JSON Lines",
+    "sqlite": "SQLite",
+}
+
+CONFIG_FILE = "config_bank.yaml"
+DIRECTORIES = ("input/bank", "output/bank", "output/bank/archiv", "modules", "config")
+
+
+def archive_patterns(config):
+    """Old outputs in the output folder that a run archives, as (prefix, extensions) tuples."""
+    patterns = [CsvExporter.ARCHIVE_PATTERN]
+    if config.get("generate_text_report", True):
+        patterns.append(BankReportWriter.ARCHIVE_PATTERN)
+    return patterns
+
+
+def run_in_memory(config, statement_files, reader, deduplicator, rule_engine, settings,
+                  report_writer, csv_exporter, recurring_detector=None):
+    """Read all transactions into lists. Returns (settlement_result, output_file, export_paths).
+
+    Without a report writer no text report is written and output_file is None.
+    """
+    parallel_reader = ParallelStatementReader(reader, workers=config.get("parse_workers"))
+    raw_transactions = []
+    for statement_file in statement_files:
+        raw_transactions.extend(deduplicator.add_statement(parallel_reader.read_csv(statement_file)))
+    reader.diagnostics.report(config["output_folder"])
+    print(f"Gefunden: {len(raw_transactions)} Transaktionen")
+    if deduplicator.duplicates:
+        print(f"Duplikate übersprungen: {len(deduplicator.duplicates)}")
+
+    filter_result = partition_transactions(
+        raw_transactions,
+        settings.income_allow_list,
+        settings.expense_block_list,
+        rule_engine=rule_engine
+    )
+    filtered_transactions = filter_result.kept
+    print(f"Relevante Transaktionen: {len(filtered_transactions)}")
+    print(f"Ignoriert: {len(filter_result.ignored)}")
+    if filter_result.zero_amount:
+        print(f"Ohne Betrag: {len(filter_result.zero_amount)}")
+    print_unused_rules(rule_engine)
+    # Same failure as the streaming path, before any report or export is started
+    if not filtered_transactions:
+        raise ValueError("Keine relevanten Transaktionen gefunden")
+
+    settlement_result = calculate_bank_settlement(filtered_transactions)
+
+    if recurring_detector is not None:
+        for transaction in filtered_transactions:
+            recurring_detector.add(transaction)
+    recurring = detect_recurring(recurring_detector)
+
+    sections = config.get("report_sections")
+    output_file = None
+    if report_writer is not None:
+        output_file = report_writer.generate_report(settlement_result, filtered_transactions, recurring, sections)
+    export_paths = csv_exporter.export(
+        settlement_result,
+        filtered_transactions,
+        all_transactions=raw_transactions,
+        ignored_transactions=filter_result.ignored,
+        zero_amount_transactions=filter_result.zero_amount,
+        formats=config.get("output_formats", ["csv"]),
+        recurring=recurring,
+        sections=sections
+    )
+    return settlement_result, output_file, export_paths
+
+
+def run_streaming(config, statement_files, reader, deduplicator, rule_engine, plan,
+                  report_writer, csv_exporter, recurring_detector=None):
+    """Process the transactions one by one, spilling the sorted sections to disk.
+
+    Returns (settlement_result, output_file, export_paths), output_file None without a report writer.
+    """
+    writer = csv_exporter.record_writer(config.get("output_formats", ["csv"]), config.get("report_sections"))
+    run = StreamingBankRun(
+        writer, rule_engine, plan.run_size, recurring_detector=recurring_detector,
+        report_rows=report_writer is not None and SECTION_TRANSACTIONS in writer.sections
+    )
+    try:
+        last_index = len(statement_files) - 1
+        for index, statement_file in enumerate(statement_files):
+            run.consume(deduplicator.iter_statement(
+                reader.iter_csv(statement_file), remember=index < last_index
+            ))
+        reader.diagnostics.report(config["output_folder"])
+        print(f"Gefunden: {run.total_count} Transaktionen")
+        if deduplicator.duplicates:
+            print(f"Duplikate übersprungen: {len(deduplicator.duplicates)}")
+
+        print(f"Relevante Transaktionen: {run.kept_count}")
+        print(f"Ignoriert: {run.ignored_count}")
+        if run.zero_amount_count:
+            print(f"Ohne Betrag: {run.zero_amount_count}")
+        print_unused_rules(rule_engine)
+        if not run.kept_count:
+            raise ValueError("Keine relevanten Transaktionen gefunden")
+        if run.spilled_runs:
+            print(f"Auf Platte ausgelagerte Sortierläufe: {run.spilled_runs}")
 
-    create_directories("input/bank", "output/bank", "output/bank/archiv", "modules", "config")
+        settlement_result = run.settlement_result()
+        aggregates = run.aggregates(settlement_result)
+        aggregates.recurring = detect_recurring(recurring_detector)
 
-    config_file = "config_bank.yaml"
-    config = read_config(config_file)
-    print(f"Konfiguration geladen: {config_file}")
+        output_file = None
+        if report_writer is not None:
+            output_file = report_writer.generate_report_from_rows(
+                settlement_result, aggregates.start_date, aggregates.end_date,
+                run.income_rows, run.expense_rows, aggregates.recurring, writer.sections
+            )
+        export_paths = csv_exporter.write_records(writer, aggregates, run.records, run.ignored_records)
+    finally:
+        run.close()
+
+    return settlement_result, output_file, export_paths
+
+
+def detect_recurring(recurring_detector):
+    """Detect recurring payments and store the updated series. Returns a list (empty if disabled)."""
+    if recurring_detector is None:
+        return []
+    recurring = recurring_detector.detect()
+    recurring_detector.save()
+    if recurring:
+        print(f"Wiederkehrende Zahlungen: {len(recurring)}")
+    return recurring
+
+
+def print_cached_run(cached):
+    print("Keine Änderungen seit dem letzten Lauf, vorhandene Ausgaben bleiben gültig")
+    outputs = dict(cached["outputs"])
+    text_file = outputs.pop("text", None)
+    print()
+    if text_file:
+        print(f"Abrechnung: {text_file}")
+    for output_format, path in outputs.items():
+        print(f"{EXPORT_LABELS.get(output_format, output_format)}: {path}")
+    print()
+    for line in cached["summary"]:
+        print(line)
+
+
+def print_unused_rules(rule_engine):
+    unused_rules = rule_engine.unused_rules()
+    if unused_rules:
+        print(f"Regeln ohne Treffer ({len(unused_rules)}):")
+        for rule in unused_rules:
+            print(f"   {rule.name}")
+
+
+def main(config=None):
+    """Run the bank settlement.
+
+    Args:
+        config: Configuration already loaded by the caller (run.py), which then
+            has also created DIRECTORIES and archived old outputs; None to do
+            all of that here
+    """
+    print("=== Monatsabrechnung Programm ===\n")
+
+    prepared = config is not None
+    if not prepared:
+        create_directories(*DIRECTORIES)
+        config = read_config(CONFIG_FILE)
+    print(f"Konfiguration geladen: {CONFIG_FILE}")
 
     try:
-        latest_statement_file = find_latest_file(config["input_folder"])
-        if not latest_statement_file:
-            raise FileNotFoundError("Keine gültige Kontoauszug-Datei gefunden")
-        print(f"Verwende Kontoauszug: {latest_statement_file}")
+        if config.get("combine_statements", False):
+            statement_files = expand_inputs(find_files(config["input_folder"]))
+        else:
+            latest_statement_file = find_latest_file(config["input_folder"])
+            if not latest_statement_file:
+                raise FileNotFoundError("Keine gültige Kontoauszug-Datei gefunden")
+            statement_files = expand_inputs([latest_statement_file], latest_only=True)
+        for statement_file in statement_files:
+            print(f"Verwende Kontoauszug: {statement_file}")
 
+        # Unchanged statements, config, lists, rules and code: the outputs of the last run are still valid
         settings = Settings()
-        reader = BankStatementReader(delimiter=config.get("csv_delimiter"))
-        report_writer = BankReportWriter(config["output_folder"])
-        csv_exporter = CsvExporter(config["output_folder"])
+        run_cache = None
+        if config.get("run_cache", True):
+            run_cache = RunCache(config["output_folder"], "bank")
+            cache_key = run_cache.key(
+                statement_files, config, settings.income_allow_list, settings.expense_block_list,
+                settings.filter_rules
+            )
+            cached = run_cache.lookup(cache_key)
+            if cached:
+                print_cached_run(cached)
+                return True
 
-        raw_transactions = reader.read_csv(latest_statement_file)
-        print(f"Gefunden: {len(raw_transactions)} Transaktionen")
+        plan = plan_execution(
+            statement_files,
+            memory_budget_mb=config.get("memory_budget_mb", DEFAULT_MEMORY_BUDGET_MB),
+            mode=config.get("execution_mode", MODE_AUTO)
+        )
+        print(plan.describe())
 
-        filtered_transactions = filter_transactions(
-            raw_transactions,
+        reader = BankStatementReader(delimiter=config.get("csv_delimiter"))
+        deduplicator = TransactionDeduplicator()
+        # Sections and outputs that are switched off are not computed at all
+        sections = resolve_sections(config.get("report_sections"))
+        archive_old_files = config.get("archive_old_files", True) and not prepared
+        report_writer = None
+        if config.get("generate_text_report", True):
+            report_writer = BankReportWriter(config["output_folder"], archive_old_files)
+        csv_exporter = CsvExporter(config["output_folder"], archive_old_files)
+        rule_engine = RuleEngine(
             settings.income_allow_list,
-            settings.expense_block_list
+            settings.expense_block_list,
+            settings.filter_rules,
+            fuzzy_threshold=config.get("fuzzy_match_threshold")
         )
-        print(f"Relevante Transaktionen: {len(filtered_transactions)}")
+        recurring_detector = None
+        if config.get("detect_recurring", True) and SECTION_RECURRING in sections:
+            recurring_detector = RecurringDetector(
+                os.path.join(config["output_folder"], RECURRING_STATE_FILENAME)
+            )
 
-        settlement_result = calculate_bank_settlement(filtered_transactions)
+        with MemoryTracker(trace=config.get("trace_memory", False)) as memory:
+            if plan.mode == MODE_STREAMING:
+                settlement_result, output_file, export_paths = run_streaming(
+                    config, statement_files, reader, deduplicator, rule_engine, plan,
+                    report_writer, csv_exporter, recurring_detector
+                )
+            else:
+                settlement_result, output_file, export_paths = run_in_memory(
+                    config, statement_files, reader, deduplicator, rule_engine, settings,
+                    report_writer, csv_exporter, recurring_detector
+                )
 
-        output_file = report_writer.generate_report(settlement_result, filtered_transactions)
-        csv_file = csv_exporter.export_for_excel(settlement_result, filtered_transactions)
+        print()
+        if output_file:
+            print(f"Abrechnung erstellt: {output_file}")
+        for output_format, path in export_paths.items():
+            print(f"{EXPORT_LABELS.get(output_format, output_format)} erstellt: {path}")
 
-        print(f"\nAbrechnung erstellt: {output_file}")
-        print(f"Excel-Import erstellt: {csv_file}")
+        summary = [
+            f"Gesamtausgaben: {settlement_result['total_expenses']:.2f} €",
+            f"Gesamteinnahmen: {settlement_result['total_income']:.2f} €",
+            f"Nettoausgaben: {settlement_result['net_expenses']:.2f} €",
+            f"Pro Person: {settlement_result['amount_per_person']:.2f} €",
+        ]
+        print()
+        for line in summary:
+            print(line)
+        print(f"\n{memory.describe()}")
 
-        print(f"\nGesamtausgaben: {settlement_result['total_expenses']:.2f} €")
-        print(f"Gesamteinnahmen: {settlement_result['total_income']:.2f} €")
-        print(f"Nettoausgaben: {settlement_result['net_expenses']:.2f} €")
-        print(f"Pro Person: {settlement_result['amount_per_person']:.2f} €")
+        if run_cache:
+            outputs = {"text": output_file} if output_file else {}
+            run_cache.store(cache_key, {**outputs, **export_paths}, summary)
 
     except Exception as error:
         print(f"Fehler: {error}")
+        return False
+
+    return True
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,208 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# Stelle sicher, dass alle Module gefunden werden
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+PIPELINE_CONFIGS = {
+    "bank": "config_bank.yaml",
+    "paper": "config_paper.yaml",
+}
+STATE_FILENAME = "batch_state.json"
+
+
+def discover_jobs(tenants_directory: str) -> list:
+    """Find all (tenant, pipeline) jobs in the tenants directory.
+
+    Every subdirectory is a tenant profile. A pipeline is scheduled if the
+    tenant has the matching config file (config_bank.yaml / config_paper.yaml).
+
+    Args:
+        tenants_directory: Directory containing one subdirectory per tenant
+
+    Returns:
+        Sorted list of (tenant, pipeline) tuples
+    """
+    jobs = []
+    for tenant in sorted(os.listdir(tenants_directory)):
+        tenant_directory = os.path.join(tenants_directory, tenant)
+        if not os.path.isdir(tenant_directory):
+            continue
+        for pipeline, config_file in PIPELINE_CONFIGS.items():
+            if os.path.isfile(os.path.join(tenant_directory, config_file)):
+                jobs.append((tenant, pipeline))
+    return jobs
+
+
+def run_tenant_pipeline(tenants_directory: str, tenant: str, pipeline: str) -> dict:
+    """Run one pipeline for one tenant inside a worker process.
+
+    The pipelines resolve config, input and output paths relative to the
+    working directory, so the worker switches into the tenant directory and
+    redirects the console output into a per-tenant log file.
+
+    Returns:
+        Dictionary with tenant, pipeline, status, duration and log path
+    """
+    tenant_directory = os.path.abspath(os.path.join(tenants_directory, tenant))
+    log_path = os.path.join(tenant_directory, f"batch_{pipeline}.log")
+    previous_directory = os.getcwd()
+    start = time.perf_counter()
+    message = ""
+
+    try:
+        os.chdir(tenant_directory)
+        with open(log_path, "w", encoding="utf-8") as log_file, \
+                contextlib.redirect_stdout(log_file):
+            if pipeline == "bank":
+                import bank
+                success = bank.main()
+            else:
+                import paper
+                success = paper.main()
+        if not success:
+            message = f"Pipeline fehlgeschlagen, siehe {log_path}"
+    except Exception as error:
+        success = False
+        message = f"{type(error).__name__}: {' '.join(str(error).split())}"
+    finally:
+        os.chdir(previous_directory)
+
+    return {
+        "tenant": tenant,
+        "pipeline": pipeline,
+        "status": "ok" if success else "fehler",
+        "duration": round(time.perf_counter() - start, 3),
+        "message": message,
+        "log": log_path,
+    }
+
+
+def load_state(state_path: str) -> dict:
+    """Load the checkpoint of a previous batch run."""
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_state(state_path: str, state: dict) -> None:
+    """Write the checkpoint atomically so an interrupted batch can resume."""
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, state_path)
+
+
+def write_report(tenants_directory: str, results: list) -> str:
+    """Write the aggregated batch report as CSV.
+
+    Args:
+        tenants_directory: Directory the report is written to
+        results: List of result dictionaries from run_tenant_pipeline
+
+    Returns:
+        Path to the report file
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = os.path.join(tenants_directory, f"batchlauf_{timestamp}.csv")
+
+    with open(report_path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile, delimiter=";")
+        writer.writerow(["Mandant", "Pipeline", "Status", "Dauer (s)", "Meldung", "Log"])
+        for result in sorted(results, key=lambda r: (r["tenant"], r["pipeline"])):
+            writer.writerow([
+                result["tenant"],
+                result["pipeline"],
+                result["status"],
+                f"{result['duration']:.3f}".replace(".", ","),
+                result["message"],
+                result["log"],
+            ])
+
+    return report_path
+
+
+def run_batch(tenants_directory: str, workers: int = None, resume: bool = False) -> list:
+    """Run all tenant pipelines on a process pool.
+
+    Args:
+        tenants_directory: Directory containing one subdirectory per tenant
+        workers: Number of worker processes (default: number of CPU cores)
+        resume: Skip jobs that completed successfully in the previous batch
+
+    Returns:
+        List of result dictionaries (including skipped jobs from the checkpoint)
+    """
+    state_path = os.path.join(tenants_directory, STATE_FILENAME)
+    state = load_state(state_path) if resume else {}
+
+    jobs = discover_jobs(tenants_directory)
+    results = [
+        result for result in state.values()
+        if (result["tenant"], result["pipeline"]) in jobs and result["status"] == "ok"
+    ]
+    done = {(result["tenant"], result["pipeline"]) for result in results}
+    pending = [job for job in jobs if job not in done]
+
+    if done:
+        print(f"Fortsetzen: {len(done)} Jobs bereits erledigt, {len(pending)} offen")
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_tenant_pipeline, tenants_directory, tenant, pipeline): (tenant, pipeline)
+            for tenant, pipeline in pending
+        }
+        for future in as_completed(futures):
+            tenant, pipeline = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool as error:
+                result = {
+                    "tenant": tenant, "pipeline": pipeline, "status": "fehler",
+                    "duration": 0.0, "message": f"Worker abgestürzt: {error}", "log": "",
+                }
+
+            results.append(result)
+            state[f"{tenant}:{pipeline}"] = result
+            save_state(state_path, state)
+
+            symbol = "✓" if result["status"] == "ok" else "✗"
+            print(f"{symbol} {tenant} ({pipeline}) {result['duration']:.2f}s {result['message']}")
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Abrechnung für mehrere Haushalte ausführen")
+    parser.add_argument("tenants_directory", help="Ordner mit einem Unterordner pro Haushalt")
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl paralleler Prozesse")
+    parser.add_argument("--resume", action="store_true", help="Abgebrochenen Batch fortsetzen")
+    args = parser.parse_args()
+
+    print("=== Batch-Abrechnung ===\n")
+
+    results = run_batch(args.tenants_directory, args.workers, args.resume)
+    report_path = write_report(args.tenants_directory, results)
+
+    failed = [result for result in results if result["status"] != "ok"]
+    print(f"\nJobs gesamt: {len(results)}")
+    print(f"Erfolgreich: {len(results) - len(failed)}")
+    print(f"Fehlgeschlagen: {len(failed)}")
+    print(f"Bericht: {report_path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
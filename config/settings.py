@@ -7,6 +7,7 @@ class Settings:
         self.config_directory = "config"
         self.income_allow_list = self._load_allowlist()
         self.expense_block_list = self._load_blocklist()
+        self.filter_rules = self._load_rules()
 
     def _load_allowlist(self):
         allowlist_file = os.path.join(self.config_directory, "allowlist.yaml")
@@ -38,8 +39,25 @@ class Settings:
             print(f"Fehler beim Laden von {blocklist_file}: {error}")
             return self._get_default_blocklist()
 
+    def _load_rules(self):
+        rules_file = os.path.join(self.config_directory, "rules.yaml")
+        try:
+            with open(rules_file, "r", encoding="utf-8") as file:
+                data = yaml.safe_load(file)
+                if data is None:
+                    return self._get_default_rules()
+                return data.get("rules", [])
+        except FileNotFoundError:
+            return self._get_default_rules()
+        except yaml.YAMLError as error:
+            print(f"Fehler beim Laden von {rules_file}: {error}")
+            return self._get_default_rules()
+
     def _get_default_allowlist(self):
         return []
 
     def _get_default_blocklist(self):
         return []
+
+    def _get_default_rules(self):
+        return []
@@ -0,0 +1,123 @@
+import contextlib
+import fnmatch
+import gzip
+import io
+import lzma
+import os
+import struct
+import zipfile
+
+# Input files picked up in the input folders, plain or compressed
+INPUT_PATTERNS = ("*.csv", "*.csv.gz", "*.csv.xz", "*.zip")
+
+# Separates the archive path from the member name in an input path ("2024.zip::2024-03.csv")
+MEMBER_SEPARATOR = "::"
+
+# xz keeps the uncompressed size only in its index; CSV exports compress about this well
+ESTIMATED_XZ_RATIO = 10
+
+
+def split_member(path: str) -> tuple:
+    """Split an input path into (file path, zip member name or None)."""
+    file_path, separator, member = path.partition(MEMBER_SEPARATOR)
+    return file_path, (member if separator else None)
+
+
+def is_compressed(path: str) -> bool:
+    file_path = split_member(path)[0].lower()
+    return file_path.endswith((".gz", ".xz", ".zip"))
+
+
+def expand_inputs(paths: list, latest_only: bool = False) -> list:
+    """Replace zip archives by their CSV members.
+
+    Members are listed oldest first like find_files, with latest_only just
+    the most recently modified one. Other paths are passed through.
+
+    Raises:
+        ValueError: If an archive contains no CSV file
+    """
+    inputs = []
+    for path in paths:
+        if not path.lower().endswith(".zip") or MEMBER_SEPARATOR in path:
+            inputs.append(path)
+            continue
+        members = _csv_members(path)
+        if latest_only:
+            members = members[-1:]
+        inputs.extend(f"{path}{MEMBER_SEPARATOR}{info.filename}" for info in members)
+    return inputs
+
+
+@contextlib.contextmanager
+def open_binary(path: str):
+    """Open an input file for reading bytes, decompressing as it is read.
+
+    Nothing is unpacked to disk; gzip, xz and zip members are decoded block
+    by block while the caller consumes the stream.
+    """
+    file_path, member = split_member(path)
+    lowered = file_path.lower()
+    if lowered.endswith(".zip"):
+        with zipfile.ZipFile(file_path) as archive:
+            if member is None:
+                members = _csv_members(file_path, archive)
+                if len(members) > 1:
+                    raise ValueError(f"Archiv {file_path} enthält mehrere CSV-Dateien, bitte eine angeben")
+                member = members[0].filename
+            with archive.open(member) as stream:
+                yield stream
+    elif lowered.endswith(".gz"):
+        with gzip.open(file_path, "rb") as stream:
+            yield stream
+    elif lowered.endswith(".xz"):
+        with lzma.open(file_path, "rb") as stream:
+            yield stream
+    else:
+        with open(file_path, "rb") as stream:
+            yield stream
+
+
+@contextlib.contextmanager
+def open_text(path: str, encoding: str = "utf-8"):
+    """Open an input file as text with universal newlines, like open(path, "r")."""
+    with open_binary(path) as stream:
+        with io.TextIOWrapper(stream, encoding=encoding) as text:
+            yield text
+
+
+def input_size(path: str) -> int:
+    """Uncompressed size of an input in bytes (estimated for xz).
+
+    gzip stores the size modulo 4 GiB in its trailer, so the compressed
+    size is used as a lower bound.
+    """
+    file_path, member = split_member(path)
+    lowered = file_path.lower()
+    if lowered.endswith(".zip"):
+        with zipfile.ZipFile(file_path) as archive:
+            if member is not None:
+                return archive.getinfo(member).file_size
+            return sum(info.file_size for info in _csv_members(file_path, archive))
+    compressed_size = os.path.getsize(file_path)
+    if lowered.endswith(".gz"):
+        with open(file_path, "rb") as file:
+            file.seek(-4, os.SEEK_END)
+            return max(struct.unpack("<I", file.read(4))[0], compressed_size)
+    if lowered.endswith(".xz"):
+        return compressed_size * ESTIMATED_XZ_RATIO
+    return compressed_size
+
+
+def _csv_members(file_path: str, archive: zipfile.ZipFile = None) -> list:
+    if archive is None:
+        with zipfile.ZipFile(file_path) as archive:
+            return _csv_members(file_path, archive)
+    members = sorted(
+        (info for info in archive.infolist()
+         if not info.is_dir() and fnmatch.fnmatch(info.filename.lower(), "*.csv")),
+        key=lambda info: (info.date_time, info.filename)
+    )
+    if not members:
+        raise ValueError(f"Keine CSV-Datei im Archiv {file_path} gefunden")
+    return members
@@ -0,0 +1,47 @@
+import re
+import sys
+from functools import lru_cache
+
+CACHE_SIZE = 65536
+
+# Legal forms, dropped wherever they appear ("GmbH & Co. KG", "S.a.r.l.", ...)
+LEGAL_SUFFIXES = frozenset({
+    "gmbh", "mbh", "ag", "kg", "kgaa", "ohg", "gbr", "ug", "se", "e.k", "ek", "e.v", "ev",
+    "co", "&", "cie", "et", "ltd", "inc", "llc", "plc", "bv", "nv", "sa", "s.a", "sas",
+    "sarl", "s.a.r.l", "s.c.a", "sca", "spa", "srl",
+})
+
+# Words DKB exports add around the actual name ("REWE SAGT DANKE 1234", "REWE Markt")
+NOISE_WORDS = frozenset({"sagt", "danke", "markt", "filiale", "fil", "nr"})
+
+# Store and terminal numbers: tokens without letters, e.g. "1234", "#1234", "12-34"
+_STORE_NUMBER = re.compile(r"^[\d#/.\-]+$")
+
+_EDGE_PUNCTUATION = ".,;:()[]\"'*"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_name(name: str) -> str:
+    """Canonical form of a counterparty name, interned.
+
+    Lowercases, drops legal forms, noise words and store numbers, and
+    collapses whitespace, e.g. "REWE Markt GmbH" and "REWE SAGT DANKE 1234"
+    both become "rewe". Every remaining word is a lowercased word of the
+    original name, so keyword checks on the canonical name give the same
+    result as on the lowercased original.
+
+    Args:
+        name: Raw sender or recipient
+
+    Returns:
+        Interned canonical name; the lowercased name if nothing would remain
+    """
+    tokens = name.lower().split()
+    kept = []
+    for token in tokens:
+        word = token.strip(_EDGE_PUNCTUATION)
+        if not word or word in LEGAL_SUFFIXES or word in NOISE_WORDS or _STORE_NUMBER.match(word):
+            continue
+        kept.append(word)
+    return sys.intern(" ".join(kept or tokens))
+
@@ -1,158 +1,134 @@
 import csv
 import os
-import shutil
 from datetime import datetime
-from collections import defaultdict
+
+from modules.counterparty import canonical_name
+from modules.filters import describe_ignore_reason
+from modules.formatting import format_date, format_euro
+from modules.locking import directory_lock, sweep_old_outputs
+from modules.sinks import (
+    ANALYSIS_SECTIONS, OUTPUT_BUFFER_BYTES, SECTION_CATEGORIES, SECTION_DAILY, SECTION_TRANSACTIONS,
+    JsonLinesSink, MultiSinkWriter, RecordSink, SqliteSink,
+)
+from modules.xlsx_writer import XlsxSink
 
 
 class CsvExporter:
-    def __init__(self, output_directory: str):
+    # Old exports in the output directory that are archived before writing
+    ARCHIVE_PATTERN = ("abrechnung_", [".csv"])
+
+    def __init__(self, output_directory: str, archive_old_files: bool = True):
         self.output_directory = output_directory
+        self.archive_old_files = archive_old_files
         self.archive_directory = os.path.join(self.output_directory, "archiv")
+        # Counterparty names repeat a lot, so category and display name are
+        # computed once per distinct raw name
+        self._category_cache = {}
+        self._keyword_category_cache = {}
+        self._clean_name_cache = {}
 
     def export_for_excel(
-        self, settlement_result, transactions, all_transactions=None, ignored_transactions=None
+        self, settlement_result, transactions, all_transactions=None, ignored_transactions=None,
+        zero_amount_transactions=None
     ):
+        paths = self.export(
+            settlement_result, transactions, all_transactions, ignored_transactions,
+            zero_amount_transactions, formats=["csv"]
+        )
+        return paths["csv"]
+
+    def export(
+        self, settlement_result, transactions, all_transactions=None, ignored_transactions=None,
+        zero_amount_transactions=None, formats=("csv",), recurring=None, sections=None
+    ):
+        """Write the settlement to all requested formats in a single pass.
+
+        Args:
+            settlement_result: Dictionary with settlement results
+            transactions: List of relevant transaction objects
+            all_transactions: List of all read transactions (for statistics)
+            ignored_transactions: List of (transaction, reason_code, rule) tuples
+            zero_amount_transactions: List of transactions with amount 0
+            formats: Output formats, any of "csv", "jsonl", "sqlite", "xlsx"
+            recurring: List of detected RecurringPayment objects
+            sections: Report sections to compute and write (see modules.sinks), None for all
+
+        Returns:
+            Dictionary mapping format names to the written file paths
+        """
+        writer = self.record_writer(formats, sections)
+        aggregates, records, ignored_records = writer.build(
+            settlement_result, transactions, all_transactions, ignored_transactions,
+            zero_amount_transactions
+        )
+        aggregates.recurring = recurring or []
+        return self.write_records(writer, aggregates, records, ignored_records)
+
+    def record_writer(self, formats=("csv",), sections=None) -> MultiSinkWriter:
+        """Create the writer for the requested formats and report sections.
+
+        Raises:
+            ValueError: If a format or section is unknown
+        """
+        sinks = {}
+        for output_format in formats:
+            if output_format not in SINK_TYPES:
+                raise ValueError(
+                    f"Unbekanntes Ausgabeformat '{output_format}'. Erlaubt: {', '.join(SINK_TYPES)}"
+                )
+            sinks[output_format] = SINK_TYPES[output_format](self)
+
+        return MultiSinkWriter(sinks, self._determine_expense_category, describe_ignore_reason, sections)
+
+    def write_records(self, writer: MultiSinkWriter, aggregates, records, ignored_records) -> dict:
+        """Write already built records (lists or sorted iterators) to all sinks of the writer.
+
+        Returns:
+            Dictionary mapping format names to the written file paths
+        """
         self._archive_old_files()
 
-        start_date = min(t.date for t in transactions)
-        end_date = max(t.date for t in transactions)
-
         # Use YYYY-MM format for folder
-        foldername = start_date.strftime("%Y-%m")
-        filename = f"monatsabrechnung_{start_date.strftime('%Y-%m-%d')}_{end_date.strftime('%Y-%m-%d')}.csv"
-
-        filepath = os.path.join(self.output_directory, foldername, filename)
-
-        if not os.path.exists(os.path.dirname(filepath)):
-            os.makedirs(os.path.dirname(filepath))
-
-        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile, delimiter=";")
-
-            self._write_header_with_analysis(
-                writer, settlement_result, transactions, all_transactions, ignored_transactions
-            )
-            self._write_summary_section(writer, settlement_result)
-            self._write_expense_analysis(writer, transactions)
-            self._write_transaction_section(writer, transactions)
-            if ignored_transactions:
-                self._write_ignored_transactions_section(writer, ignored_transactions)
-
-        return filepath
+        foldername = aggregates.start_date.strftime("%Y-%m")
+        basename = (
+            f"monatsabrechnung_{aggregates.start_date.strftime('%Y-%m-%d')}"
+            f"_{aggregates.end_date.strftime('%Y-%m-%d')}"
+        )
+        folder_path = os.path.join(self.output_directory, foldername)
+        with directory_lock(folder_path):
+            return writer.write(os.path.join(folder_path, basename), aggregates, records, ignored_records)
 
     def _archive_old_files(self):
-        os.makedirs(self.archive_directory, exist_ok=True)
-
-        for filename in os.listdir(self.output_directory):
-            if filename.startswith("abrechnung_") and filename.endswith(".csv"):
-                old_file = os.path.join(self.output_directory, filename)
-                archive_file = os.path.join(self.archive_directory, filename)
-
-                if os.path.isfile(old_file):
-                    shutil.move(old_file, archive_file)
-                    print(f"Archiviert: {filename}")
-
-    def _write_header_with_analysis(
-        self, writer, settlement_result, transactions, all_transactions, ignored_transactions
-    ):
-        writer.writerow(["MONATSABRECHNUNG - DETAILANALYSE"])
-        writer.writerow(["Erstellt am:", datetime.now().strftime("%d.%m.%Y")])
-        writer.writerow([])
-
-        # Quick stats
-        total_transactions = len(all_transactions) if all_transactions else len(transactions)
-        ignored_count = len(ignored_transactions) if ignored_transactions else 0
-        processed_count = len(transactions)
-
-        writer.writerow(["STATISTIK"])
-        writer.writerow(["Transaktionen gesamt:", total_transactions])
-        writer.writerow(["Berücksichtigt:", processed_count])
-        writer.writerow(["Ignoriert:", ignored_count])
-        writer.writerow([])
-
-    def _write_summary_section(self, writer, result):
-        writer.writerow(["ZUSAMMENFASSUNG"])
-        writer.writerow(["Gesamtausgaben:", f"{result['total_expenses']:.2f} €".replace(".", ",")])
-        writer.writerow(["Gesamteinnahmen:", f"{result['total_income']:.2f} €".replace(".", ",")])
-        writer.writerow(["Nettoausgaben:", f"{result['net_expenses']:.2f} €".replace(".", ",")])
-        writer.writerow(["Pro Person:", f"{result['amount_per_person']:.2f} €".replace(".", ",")])
-        writer.writerow([])
-
-    def _write_expense_analysis(self, writer, transactions):
-        writer.writerow(["AUSGABEN-ANALYSE"])
-        writer.writerow([])
-
-        # Top 3 Ausgaben
-        expense_transactions = [t for t in transactions if t.is_expense]
-        if expense_transactions:
-            sorted_expenses = sorted(expense_transactions, key=lambda x: x.amount)
-
-            writer.writerow(["TOP 3 AUSGABEN"])
-            writer.writerow(["Rang", "Empfänger", "Betrag", "Datum"])
-
-            for i, transaction in enumerate(sorted_expenses[:3], 1):
-                recipient = self._clean_recipient_name(transaction.recipient)
-                amount_str = f"{abs(transaction.amount):.2f} €".replace(".", ",")
-                date_str = transaction.date.strftime("%d.%m.%Y")
-                writer.writerow([i, recipient, amount_str, date_str])
-
-            writer.writerow([])
-
-        # Ausgaben nach Kategorien
-        self._write_expense_categories(writer, expense_transactions)
-
-        # Tägliche Ausgaben-Übersicht
-        self._write_daily_expense_overview(writer, expense_transactions)
-
-    def _write_expense_categories(self, writer, expense_transactions):
-        writer.writerow(["AUSGABEN NACH KATEGORIEN"])
-        writer.writerow(["Kategorie", "Anzahl", "Gesamtbetrag"])
-
-        categories = self._categorize_expenses(expense_transactions)
-        sorted_categories = sorted(categories.items(), key=lambda x: x[1]["total"], reverse=True)
-
-        for category, data in sorted_categories:
-            count = data["count"]
-            total = data["total"]
-            total_str = f"{total:.2f} €".replace(".", ",")
-            writer.writerow([category, count, total_str])
-
-        writer.writerow([])
-
-    def _write_daily_expense_overview(self, writer, expense_transactions):
-        writer.writerow(["TÄGLICHE AUSGABEN"])
-        writer.writerow(["Datum", "Anzahl Transaktionen", "Tagesbetrag"])
-
-        daily_expenses = defaultdict(lambda: {"count": 0, "total": 0})
-
-        for transaction in expense_transactions:
-            date_key = transaction.date
-            daily_expenses[date_key]["count"] += 1
-            daily_expenses[date_key]["total"] += abs(transaction.amount)
-
-        sorted_days = sorted(daily_expenses.items(), key=lambda x: x[0], reverse=True)
-
-        for date, data in sorted_days:
-            date_str = date.strftime("%d.%m.%Y")
-            count = data["count"]
-            total_str = f"{data['total']:.2f} €".replace(".", ",")
-            writer.writerow([date_str, count, total_str])
-
-        writer.writerow([])
-
-    def _categorize_expenses(self, expense_transactions):
-        categories = defaultdict(lambda: {"count": 0, "total": 0})
-
-        for transaction in expense_transactions:
-            category = self._determine_expense_category(transaction.recipient)
-            categories[category]["count"] += 1
-            categories[category]["total"] += abs(transaction.amount)
-
-        return categories
+        if not self.archive_old_files:
+            return
+        for filename in sweep_old_outputs(self.output_directory, [self.ARCHIVE_PATTERN]):
+            print(f"Archiviert: {filename}")
 
     def _determine_expense_category(self, recipient):
-        recipient_lower = recipient.lower()
+        category = self._category_cache.get(recipient)
+        if category is None:
+            category = self._keyword_category(canonical_name(recipient))
+            if category is None:
+                # Personen (Namen enthalten meist mehrere Wörter mit Groß-/Kleinschreibung)
+                if any(char.isupper() for char in recipient) and len(recipient.split()) > 1:
+                    category = "Personen"
+                else:
+                    category = "Sonstige"
+            self._category_cache[recipient] = category
+        return category
+
+    def _keyword_category(self, canonical):
+        """Keyword category of a canonical name, or None.
+
+        The canonical name only drops whole words (legal forms, noise words,
+        store numbers) that contain none of the keywords, so the result is
+        the same as for the lowercased raw name.
+        """
+        if canonical not in self._keyword_category_cache:
+            self._keyword_category_cache[canonical] = self._match_keywords(canonical)
+        return self._keyword_category_cache[canonical]
+
+    def _match_keywords(self, recipient_lower):
 
         # Lebensmittel
         food_keywords = [
@@ -209,60 +185,183 @@ class CsvExporter:
         if any(keyword in recipient_lower for keyword in online_keywords):
             return "Online Shopping"
 
-        # Personen (Namen enthalten meist mehrere Wörter mit Groß-/Kleinschreibung)
-        if any(char.isupper() for char in recipient) and len(recipient.split()) > 1:
-            return "Personen"
-
-        return "Sonstige"
+        return None
 
     def _clean_recipient_name(self, recipient):
-        # Kürze lange Namen und entferne überflüssige Leerzeichen
-        if len(recipient) > 40:
-            return recipient[:40] + "..."
-        return recipient.strip()
+        name = self._clean_name_cache.get(recipient)
+        if name is None:
+            # Kürze lange Namen und entferne überflüssige Leerzeichen
+            name = recipient[:40] + "..." if len(recipient) > 40 else recipient.strip()
+            self._clean_name_cache[recipient] = name
+        return name
+
+
+class ExcelCsvSink(RecordSink):
+    """Semicolon CSV with German number formatting, meant for Excel.
+
+    Every section is a generator of rows handed to csv.writer.writerows, and
+    the records arrive in batches from MultiSinkWriter, so rows are never
+    collected beyond one batch and the file is written through a large
+    buffer.
+    """
+
+    extension = ".csv"
+
+    def __init__(self, exporter: CsvExporter):
+        self.exporter = exporter
+        self._ignored_started = False
+        self._descriptions = {}
+
+    def open(self, base_path, aggregates):
+        super().open(base_path, aggregates)
+        self._file = open(self.path, "w", newline="", encoding="utf-8", buffering=OUTPUT_BUFFER_BYTES)
+        self._writer = csv.writer(self._file, delimiter=";")
+
+        self._writer.writerows(self._header_rows(aggregates))
+        self._writer.writerows(self._summary_rows(aggregates.settlement_result))
+        self._writer.writerows(self._expense_analysis_rows(aggregates))
+
+        if SECTION_TRANSACTIONS in aggregates.sections:
+            self._writer.writerows([
+                ["ALLE BERÜCKSICHTIGTEN TRANSAKTIONEN"],
+                ["Datum", "Beschreibung", "Betrag", "Kategorie"],
+            ])
+
+    def write_transactions(self, records):
+        self._writer.writerows(map(self._transaction_row, records))
+
+    def write_ignored_records(self, records):
+        if not self._ignored_started:
+            self._ignored_started = True
+            self._writer.writerows([
+                [],
+                ["IGNORIERTE TRANSAKTIONEN"],
+                ["Datum", "Beschreibung", "Betrag", "Grund"],
+            ])
+        self._writer.writerows(map(self._ignored_row, records))
+
+    def write_transaction(self, record):
+        self.write_transactions([record])
+
+    def write_ignored(self, record):
+        self.write_ignored_records([record])
+
+    def close(self):
+        if not self._ignored_started:
+            self._writer.writerow([])
+        self._file.close()
+        return self.path
+
+    def _header_rows(self, aggregates):
+        yield ["MONATSABRECHNUNG - DETAILANALYSE"]
+        yield ["Erstellt am:", datetime.now().strftime("%d.%m.%Y")]
+        yield []
 
-    def _write_transaction_section(self, writer, transactions):
-        writer.writerow(["ALLE BERÜCKSICHTIGTEN TRANSAKTIONEN"])
-        writer.writerow(["Datum", "Beschreibung", "Betrag", "Kategorie"])
+        # Quick stats
+        yield ["STATISTIK"]
+        yield ["Transaktionen gesamt:", aggregates.total_count]
+        yield ["Berücksichtigt:", aggregates.processed_count]
+        yield ["Ignoriert:", aggregates.ignored_count]
+        if aggregates.zero_amount_count:
+            yield ["Ohne Betrag (0,00 €):", aggregates.zero_amount_count]
+        yield []
+
+    def _summary_rows(self, result):
+        yield ["ZUSAMMENFASSUNG"]
+        yield ["Gesamtausgaben:", format_euro(result['total_expenses'])]
+        yield ["Gesamteinnahmen:", format_euro(result['total_income'])]
+        yield ["Nettoausgaben:", format_euro(result['net_expenses'])]
+        yield ["Pro Person:", format_euro(result['amount_per_person'])]
+        yield []
+
+    def _expense_analysis_rows(self, aggregates):
+        if not aggregates.sections & ANALYSIS_SECTIONS:
+            return
+        yield ["AUSGABEN-ANALYSE"]
+        yield []
 
-        # Sortiere alle Transaktionen nach Datum
-        sorted_transactions = sorted(transactions, key=lambda x: x.date, reverse=True)
+        # Top 3 Ausgaben
+        if aggregates.top_expenses:
+            yield ["TOP 3 AUSGABEN"]
+            yield ["Rang", "Empfänger", "Betrag", "Datum"]
 
-        for transaction in sorted_transactions:
-            date_str = transaction.date.strftime("%d.%m.%Y")
+            for i, record in enumerate(aggregates.top_expenses, 1):
+                recipient = self.exporter._clean_recipient_name(record.counterparty)
+                yield [i, recipient, format_euro(abs(record.amount)), format_date(record.date)]
 
-            if transaction.is_income:
-                description = f"Eingang von {self._clean_recipient_name(transaction.sender)}"
-                amount_str = f"+{abs(transaction.amount):.2f} €".replace(".", ",")
-                category = "Einnahme"
-            else:
-                description = f"Ausgabe an {self._clean_recipient_name(transaction.recipient)}"
-                amount_str = f"-{abs(transaction.amount):.2f} €".replace(".", ",")
-                category = self._determine_expense_category(transaction.recipient)
+            yield []
 
-            writer.writerow([date_str, description, amount_str, category])
+        # Ausgaben nach Kategorien
+        if SECTION_CATEGORIES in aggregates.sections:
+            yield from self._expense_category_rows(aggregates.categories)
 
-        writer.writerow([])
+        # Tägliche Ausgaben-Übersicht
+        if SECTION_DAILY in aggregates.sections:
+            yield from self._daily_expense_rows(aggregates.daily_expenses)
 
-    def _write_ignored_transactions_section(self, writer, ignored_transactions):
-        if not ignored_transactions:
-            return
+        # Wiederkehrende Zahlungen (Abos, Miete, Versicherungen)
+        if aggregates.recurring:
+            yield from self._recurring_payment_rows(aggregates.recurring)
 
-        writer.writerow(["IGNORIERTE TRANSAKTIONEN"])
-        writer.writerow(["Datum", "Beschreibung", "Betrag", "Grund"])
+    def _expense_category_rows(self, sorted_categories):
+        yield ["AUSGABEN NACH KATEGORIEN"]
+        yield ["Kategorie", "Anzahl", "Gesamtbetrag"]
 
-        # Sortiere ignorierte Transaktionen nach Datum
-        sorted_ignored = sorted(ignored_transactions, key=lambda x: x.date, reverse=True)
+        for category, data in sorted_categories:
+            yield [category, data["count"], format_euro(data["total"])]
 
-        for transaction in sorted_ignored:
-            date_str = transaction.date.strftime("%d.%m.%Y")
+        yield []
 
-            if transaction.is_income:
-                description = f"Eingang von {self._clean_recipient_name(transaction.sender)}"
-                reason = "Nicht in Allowlist"
-            else:
-                description = f"Ausgabe an {self._clean_recipient_name(transaction.recipient)}"
-                reason = "In Blocklist"
+    def _daily_expense_rows(self, sorted_days):
+        yield ["TÄGLICHE AUSGABEN"]
+        yield ["Datum", "Anzahl Transaktionen", "Tagesbetrag"]
 
-            amount_str = f"{transaction.amount:.2f} €".replace(".", ",")
-            writer.writerow([date_str, description, amount_str, reason])
+        for date, data in sorted_days:
+            yield [format_date(date), data["count"], format_euro(data['total'])]
+
+        yield []
+
+    def _recurring_payment_rows(self, recurring):
+        yield ["WIEDERKEHRENDE ZAHLUNGEN"]
+        yield ["Gegenpartei", "Rhythmus", "Betrag", "Anzahl", "Zuletzt", "Nächste"]
+
+        for payment in recurring:
+            sign = "+" if payment.is_income else "-"
+            yield [
+                self.exporter._clean_recipient_name(payment.counterparty),
+                payment.period,
+                sign + format_euro(abs(payment.amount)),
+                payment.count,
+                format_date(payment.last_date),
+                format_date(payment.next_date),
+            ]
+
+        yield []
+
+    def _transaction_row(self, record):
+        # Kept amounts are never zero: expenses already carry their "-"
+        amount_str = format_euro(record.amount)
+        if record.is_income:
+            amount_str = "+" + amount_str
+        return (format_date(record.date), self._description(record), amount_str, record.category)
+
+    def _ignored_row(self, record):
+        return (format_date(record.date), self._description(record), format_euro(record.amount), record.reason)
+
+    def _description(self, record):
+        # Counterparties repeat a lot, so the description is built once per name and direction
+        key = (record.counterparty, record.is_income)
+        description = self._descriptions.get(key)
+        if description is None:
+            name = self.exporter._clean_recipient_name(record.counterparty)
+            description = f"Eingang von {name}" if record.is_income else f"Ausgabe an {name}"
+            self._descriptions[key] = description
+        return description
+
+
+SINK_TYPES = {
+    "csv": ExcelCsvSink,
+    "jsonl": lambda exporter: JsonLinesSink(),
+    "sqlite": lambda exporter: SqliteSink(),
+    "xlsx": lambda exporter: XlsxSink(),
+}
@@ -1,7 +1,12 @@
 import csv
-from decimal import Decimal
+import itertools
+import sys
 from datetime import datetime
 
+from modules.archives import open_text
+from modules.diagnostics import DiagnosticsCollector
+from modules.money import Money
+
 
 class Transaction:
     def __init__(self, date, sender, recipient, amount, transaction_type, description):
@@ -16,7 +21,7 @@ class Transaction:
 
 
 class BankStatementReader:
-    def __init__(self, delimiter: str):
+    def __init__(self, delimiter: str, diagnostics: DiagnosticsCollector = None):
         self.amount_column = "Betrag (€)"
         self.date_column = "Buchungsdatum"
         self.sender_column = "Zahlungspflichtige*r"
@@ -24,24 +29,44 @@ class BankStatementReader:
         self.type_column = "Umsatztyp"
         self.description_column = "Verwendungszweck"
         self.delimiter = delimiter
+        self.diagnostics = diagnostics or DiagnosticsCollector("bank")
 
     def read_csv(self, file_path):
-        transactions = []
-
-        with open(file_path, "r", encoding="utf-8") as file:
+        with open_text(file_path) as file:
             content = file.read()
 
+        return self.parse_content(content)
+
+    def parse_content(self, content):
         header_line_index = self._find_header_line(content)
         lines = content.split("\n")[header_line_index:]
 
+        return list(self._iter_transactions(lines, header_line_index))
+
+    def iter_csv(self, file_path):
+        """Yield transactions one by one without loading the whole file.
+
+        Compressed inputs are decompressed incrementally while parsing.
+        Line ends are removed as in read_csv(), so a quoted field spanning
+        lines is joined the same way on both paths.
+        """
+        with open_text(file_path) as file:
+            for header_line_index, line in enumerate(file):
+                if "Buchungsdatum" in line:
+                    break
+            else:
+                raise ValueError("Header-Zeile mit Buchungsdatum nicht gefunden")
+
+            lines = (line.rstrip("\n") for line in itertools.chain([line], file))
+            yield from self._iter_transactions(lines, header_line_index)
+
+    def _iter_transactions(self, lines, header_line_index):
         csv_reader = csv.DictReader(lines, delimiter=self.delimiter)
 
         for row in csv_reader:
-            if self._is_valid_transaction_row(row):
-                transaction = self._create_transaction_from_row(row)
-                transactions.append(transaction)
-
-        return transactions
+            line_number = header_line_index + csv_reader.line_num
+            if self._is_valid_transaction_row(row, line_number):
+                yield self._create_transaction_from_row(row)
 
     def _find_header_line(self, content):
         lines = content.split("\n")
@@ -50,7 +75,7 @@ class BankStatementReader:
                 return index
         raise ValueError("Header-Zeile mit Buchungsdatum nicht gefunden")
 
-    def _is_valid_transaction_row(self, row):
+    def _is_valid_transaction_row(self, row, line_number):
         missing_fields = []
 
         if not row.get(self.amount_column, "").strip():
@@ -68,28 +93,24 @@ class BankStatementReader:
             )
 
         if missing_fields:
-            print(
-                f"⚠️  Ungültige Transaktion übersprungen - Fehlende Felder: {', '.join(missing_fields)}"
+            self.diagnostics.record(
+                line_number, f"Fehlende Felder: {', '.join(missing_fields)}", row
             )
-            if row.get(self.date_column, "").strip():
-                print(f"   Datum: {row.get(self.date_column, 'Unbekannt')}")
-            if row.get(self.amount_column, "").strip():
-                print(f"   Betrag: {row.get(self.amount_column, 'Unbekannt')}")
-            print()
             return False
 
         return True
 
     def _create_transaction_from_row(self, row):
-        amount_str = row[self.amount_column].replace(",", ".")
-        amount = Decimal(amount_str)
+        amount = Money.parse(row[self.amount_column])
 
         date_str = row[self.date_column]
         date = self._parse_date(date_str)
 
-        sender = row.get(self.sender_column, "")
-        recipient = row.get(self.recipient_column, "")
-        transaction_type = row[self.type_column]
+        # Names and types repeat across rows; interning keeps one copy each
+        # and lets the per-name caches downstream hit on identity
+        sender = sys.intern(row.get(self.sender_column, ""))
+        recipient = sys.intern(row.get(self.recipient_column, ""))
+        transaction_type = sys.intern(row[self.type_column])
         description = row[self.description_column]
 
         return Transaction(date, sender, recipient, amount, transaction_type, description)
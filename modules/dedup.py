@@ -0,0 +1,73 @@
+def transaction_fingerprint(transaction) -> tuple:
+    """Build a hashable fingerprint for a transaction.
+
+    Args:
+        transaction: Transaction object
+
+    Returns:
+        Tuple of the normalized identifying fields
+    """
+    return (
+        transaction.date,
+        transaction.amount,
+        transaction.sender.strip().lower(),
+        transaction.recipient.strip().lower(),
+        transaction.description.strip().lower(),
+        transaction.transaction_type.strip().lower(),
+    )
+
+
+class TransactionDeduplicator:
+    """Drops transactions that already appeared in a previously read statement.
+
+    Identical rows inside one statement are legitimate (e.g. two equal purchases
+    on the same day), so each fingerprint is counted per statement. A row is only
+    a duplicate if an earlier statement already contained at least as many rows
+    with the same fingerprint. Lookups go through a dict, so each row costs O(1).
+    """
+
+    def __init__(self):
+        self._seen_counts = {}
+        self.duplicates = []
+
+    def add_statement(self, transactions: list) -> list:
+        """Register the transactions of one statement and return the new ones.
+
+        Args:
+            transactions: List of transaction objects from one statement
+
+        Returns:
+            List of transactions not contained in previously added statements
+        """
+        return list(self.iter_statement(transactions))
+
+    def iter_statement(self, transactions, remember: bool = True):
+        """Streaming variant of add_statement(): yields the new transactions.
+
+        Args:
+            transactions: Iterable of transaction objects from one statement
+            remember: Register the fingerprints for later statements. For the
+                last statement this can be skipped; if no statement was
+                registered before, the transactions then pass through without
+                any bookkeeping.
+        """
+        if not remember and not self._seen_counts:
+            yield from transactions
+            return
+
+        statement_counts = {}
+
+        for transaction in transactions:
+            fingerprint = transaction_fingerprint(transaction)
+            count = statement_counts.get(fingerprint, 0) + 1
+            statement_counts[fingerprint] = count
+
+            if count <= self._seen_counts.get(fingerprint, 0):
+                self.duplicates.append(transaction)
+            else:
+                yield transaction
+
+        if remember:
+            for fingerprint, count in statement_counts.items():
+                if count > self._seen_counts.get(fingerprint, 0):
+                    self._seen_counts[fingerprint] = count
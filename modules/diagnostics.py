@@ -0,0 +1,99 @@
+import csv
+import os
+
+
+class RowIssue:
+    def __init__(self, line_number: int, reason: str, fields: dict):
+        self.line_number = line_number
+        self.reason = reason
+        self.fields = fields
+
+
+class DiagnosticsCollector:
+    """Collects invalid input rows instead of printing each one to the console.
+
+    Readers record every rejected row with its line number, the reason and the
+    raw field values. The console only gets a short summary with the first few
+    entries, the full list goes to a side file in the output directory.
+    """
+
+    def __init__(self, source: str, console_limit: int = 5):
+        self.source = source
+        self.console_limit = console_limit
+        self.issues = []
+
+    def record(self, line_number: int, reason: str, fields: dict = None) -> None:
+        """Record an invalid row.
+
+        Args:
+            line_number: Line number in the input file (1-based)
+            reason: Human readable reason why the row was rejected
+            fields: Raw field values of the row
+        """
+        self.issues.append(RowIssue(line_number, reason, dict(fields or {})))
+
+    def has_issues(self) -> bool:
+        return bool(self.issues)
+
+    def summary_lines(self) -> list:
+        """Return the first entries as "Zeile N: reason" plus a truncation note.
+
+        Returns:
+            List of summary lines, limited to console_limit entries
+        """
+        lines = [
+            f"Zeile {issue.line_number}: {issue.reason}"
+            for issue in self.issues[:self.console_limit]
+        ]
+        remaining = len(self.issues) - self.console_limit
+        if remaining > 0:
+            lines.append(f"... und {remaining} weitere")
+        return lines
+
+    def write_details(self, output_directory: str, filename: str = None) -> str:
+        """Write all recorded issues to a CSV side file.
+
+        Args:
+            output_directory: Directory for the side file
+            filename: File name (default: "fehlerprotokoll_<source>.csv")
+
+        Returns:
+            Path to the written file, or None if nothing was recorded
+        """
+        if not self.issues:
+            return None
+
+        os.makedirs(output_directory, exist_ok=True)
+        filename = filename or f"fehlerprotokoll_{self.source}.csv"
+        filepath = os.path.join(output_directory, filename)
+
+        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile, delimiter=";")
+            writer.writerow(["Zeile", "Grund", "Rohdaten"])
+            for issue in self.issues:
+                raw = " | ".join(f"{key}={value}" for key, value in issue.fields.items())
+                writer.writerow([issue.line_number, issue.reason, raw])
+
+        return filepath
+
+    def report(self, output_directory: str) -> str:
+        """Write the side file and print a rate-limited summary to the console.
+
+        Args:
+            output_directory: Directory for the side file
+
+        Returns:
+            Path to the written side file, or None if nothing was recorded
+        """
+        if not self.issues:
+            return None
+
+        details_path = self.write_details(output_directory)
+
+        print(f"⚠️  {len(self.issues)} ungültige Zeilen übersprungen:")
+        for line in self.summary_lines():
+            print(f"   {line}")
+        print(f"   Details: {details_path}")
+        print()
+
+        return details_path
@@ -0,0 +1,228 @@
+import bisect
+import csv
+import os
+import re
+import struct
+import sys
+from array import array
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+from modules.money import Money
+
+BASE_CURRENCY = "EUR"
+
+# Binary copy of the parsed rate table, kept in the output folder
+CACHE_FILENAME = "wechselkurse.bin"
+CACHE_MAGIC = b"FXRT"
+CACHE_VERSION = 1
+_CACHE_HEADER = struct.Struct("<4sHcqq I")
+_CACHE_SERIES = struct.Struct("<8sI")
+
+# Rates are stored as integers with this many decimal places
+RATE_DECIMALS = 6
+_RATE_QUANTUM = Decimal(1).scaleb(-RATE_DECIMALS)
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y")
+
+_CURRENCY_CODE = re.compile(r"[A-Z]{3}")
+
+
+class ExchangeRateTable:
+    """Date-indexed exchange rates, one series per currency.
+
+    The rate file is a CSV like the ECB reference rate history: a date
+    column followed by one column per currency code, each value the units
+    of that currency per euro ("N/A" or empty for missing days). Each series
+    is held as two parallel arrays (date ordinals ascending, rates as
+    integers with RATE_DECIMALS places), so a lookup is a bisect over
+    compact memory. The arrays are written to a binary cache file and
+    loaded from there as long as the rate file is unchanged.
+    """
+
+    def __init__(self, series: dict, source: str = None, fingerprint: str = None):
+        self.series = series
+        self.source = source
+        self.fingerprint = fingerprint
+        self._rates = {}
+
+    @classmethod
+    def load(cls, path: str, cache_path: str = None) -> "ExchangeRateTable":
+        """Load the rate file, from the binary cache if it is still current.
+
+        Args:
+            path: Rate CSV file
+            cache_path: Binary cache file, None to always parse the CSV
+
+        Raises:
+            FileNotFoundError: If the rate file does not exist
+            ValueError: If the rate file is invalid
+        """
+        stat = os.stat(path)
+        fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+        if cache_path:
+            series = _read_cache(cache_path, stat)
+            if series is not None:
+                return cls(series, path, fingerprint)
+
+        series = _parse_rate_file(path)
+        if cache_path:
+            _write_cache(cache_path, stat, series)
+        return cls(series, path, fingerprint)
+
+    @property
+    def currencies(self) -> list:
+        return sorted(self.series)
+
+    def rate(self, currency: str, day: date) -> Decimal:
+        """Units of `currency` per euro valid on `day` (the latest rate on or before it).
+
+        Raises:
+            ValueError: If the currency is unknown or has no rate up to that day
+        """
+        return self._lookup(currency, day)[0]
+
+    def rate_date(self, currency: str, day: date) -> date:
+        """Date of the rate that rate() uses for `day`.
+
+        Raises:
+            ValueError: If the currency is unknown or has no rate up to that day
+        """
+        return self._lookup(currency, day)[1]
+
+    def _lookup(self, currency: str, day: date) -> tuple:
+        key = (currency, day)
+        found = self._rates.get(key)
+        if found is None:
+            series = self.series.get(currency)
+            if series is None:
+                raise ValueError(
+                    f"Unbekannte Währung '{currency}'. Kurstabelle enthält: {', '.join(self.currencies)}"
+                )
+            dates, rates = series
+            index = bisect.bisect_right(dates, day.toordinal()) - 1
+            if index < 0:
+                raise ValueError(f"Kein Wechselkurs für {currency} am oder vor dem {day:%d.%m.%Y}")
+            found = (Decimal(rates[index]).scaleb(-RATE_DECIMALS), date.fromordinal(dates[index]))
+            self._rates[key] = found
+        return found
+
+    def convert(self, amount: Money, currency: str, day: date) -> Money:
+        """Convert an amount in `currency` to euros with the rate of `day`, rounding half to even.
+
+        Raises:
+            ValueError: If no rate is available
+        """
+        if currency == BASE_CURRENCY:
+            return amount
+        return Money.from_decimal(amount.to_decimal() / self.rate(currency, day))
+
+
+def load_configured_rates(config: dict):
+    """Rate table named by `exchange_rates_file` in a paper config, or None if none is set.
+
+    The binary cache lives in the output folder of the config.
+    """
+    path = config.get("exchange_rates_file")
+    if not path:
+        return None
+    return ExchangeRateTable.load(path, os.path.join(config["output_folder"], CACHE_FILENAME))
+
+
+def _parse_rate_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        header_line = file.readline()
+        delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+        header = next(csv.reader([header_line], delimiter=delimiter), [])
+        # Column index -> currency code; empty columns (trailing delimiter) are skipped
+        columns = {
+            index: name.strip().upper() for index, name in enumerate(header) if index and name.strip()
+        }
+        if not columns:
+            raise ValueError(f"Kurstabelle {path} hat keine Währungsspalten")
+        for currency in columns.values():
+            if not _CURRENCY_CODE.fullmatch(currency):
+                raise ValueError(f"Ungültiger Währungscode '{currency}' in {path}. Erwarte z.B. CHF oder USD")
+
+        points = {currency: {} for currency in columns.values()}
+        for line_number, row in enumerate(csv.reader(file, delimiter=delimiter), start=2):
+            if not row or not row[0].strip():
+                continue
+            day = _parse_date(row[0].strip(), path, line_number).toordinal()
+            for index, currency in columns.items():
+                value = row[index].strip() if index < len(row) else ""
+                if not value or value.upper() == "N/A":
+                    continue
+                points[currency][day] = _parse_rate(value, path, line_number)
+
+    series = {}
+    for currency, rates_by_day in points.items():
+        if rates_by_day:
+            days = sorted(rates_by_day)
+            series[currency] = (array("i", days), array("q", (rates_by_day[day] for day in days)))
+    return series
+
+
+def _parse_date(text: str, path: str, line_number: int) -> date:
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Ungültiges Datum '{text}' in {path}, Zeile {line_number}. Erwarte JJJJ-MM-TT")
+
+
+def _parse_rate(text: str, path: str, line_number: int) -> int:
+    try:
+        rate = Decimal(text.replace(",", "."))
+    except InvalidOperation:
+        rate = None
+    if rate is None or not rate.is_finite() or rate <= 0:
+        raise ValueError(f"Ungültiger Kurs '{text}' in {path}, Zeile {line_number}")
+    return int(rate.quantize(_RATE_QUANTUM, rounding=ROUND_HALF_EVEN).scaleb(RATE_DECIMALS))
+
+
+def _read_cache(cache_path: str, stat) -> dict:
+    """Series from the cache file, or None if it is missing, stale or unreadable."""
+    try:
+        with open(cache_path, "rb") as file:
+            data = file.read()
+        magic, version, byteorder, size, mtime_ns, count = _CACHE_HEADER.unpack_from(data, 0)
+        if (magic, version, byteorder, size, mtime_ns) != (
+            CACHE_MAGIC, CACHE_VERSION, sys.byteorder[0].encode(), stat.st_size, stat.st_mtime_ns
+        ):
+            return None
+
+        series = {}
+        offset = _CACHE_HEADER.size
+        for _ in range(count):
+            code, length = _CACHE_SERIES.unpack_from(data, offset)
+            offset += _CACHE_SERIES.size
+            dates = array("i")
+            dates.frombytes(data[offset:offset + length * dates.itemsize])
+            offset += length * dates.itemsize
+            rates = array("q")
+            rates.frombytes(data[offset:offset + length * rates.itemsize])
+            offset += length * rates.itemsize
+            if len(dates) != length or len(rates) != length:
+                return None
+            series[code.rstrip(b"\0").decode("ascii")] = (dates, rates)
+        return series
+    except (OSError, ValueError, struct.error):
+        # A broken cache only costs parsing the rate file again
+        return None
+
+
+def _write_cache(cache_path: str, stat, series: dict) -> None:
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(_CACHE_HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, sys.byteorder[0].encode(), stat.st_size, stat.st_mtime_ns,
+            len(series)
+        ))
+        for currency, (dates, rates) in series.items():
+            file.write(_CACHE_SERIES.pack(currency.encode("ascii"), len(dates)))
+            file.write(dates.tobytes())
+            file.write(rates.tobytes())
+    os.replace(temp_path, cache_path)
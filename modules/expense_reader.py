@@ -1,27 +1,89 @@
+import calendar
 import csv
-from decimal import Decimal, InvalidOperation
+from datetime import date, datetime
+
+from modules.archives import open_text
+from modules.diagnostics import DiagnosticsCollector
+from modules.exchange_rates import BASE_CURRENCY
+from modules.money import Money
 
 
 class Expense:
-    def __init__(self, person: str, amount: Decimal, comment: str):
+    def __init__(self, person: str, amount: Money, comment: str, currency: str = BASE_CURRENCY,
+                 original_amount: Money = None, rate_date=None):
         self.person = person.lower()  # 'a' or 'm'
-        self.amount = amount
+        self.amount = amount  # in euros
         self.comment = comment
+        self.currency = currency
+        self.original_amount = amount if original_amount is None else original_amount
+        self.rate_date = rate_date  # date of the exchange rate used, None for euros
 
 
 class ExpenseReader:
-    def __init__(self, valid_persons: list = None, delimiter: str = ","):
+    def __init__(self, valid_persons: list = None, delimiter: str = ",",
+                 diagnostics: DiagnosticsCollector = None, exchange_rates=None):
         self.valid_persons = [p.lower() for p in (valid_persons or ['a', 'b'])]
         self.delimiter = delimiter
+        self.diagnostics = diagnostics or DiagnosticsCollector("paper", console_limit=20)
+        # Optional ExchangeRateTable for the 'currency' column
+        self.exchange_rates = exchange_rates
+        self.period_end = None
 
     def read_csv(self, file_path: str) -> tuple:
         """Returns (year, month, expenses)"""
-        expenses = []
-        errors = []
-
-        with open(file_path, "r", encoding="utf-8") as file:
+        with open_text(file_path) as file:
             lines = file.readlines()
 
+        return self.parse_lines(lines)
+
+    def parse_lines(self, lines: list) -> tuple:
+        """Returns (year, month, expenses) for already loaded lines"""
+        year, month = self._parse_period(lines)
+
+        # Parse CSV starting from line 3 (header)
+        csv_content = ''.join(lines[2:])
+        csv_reader = csv.DictReader(csv_content.splitlines(), delimiter=self.delimiter)
+        self._validate_header(csv_reader.fieldnames)
+
+        expenses, _ = self._parse_rows(csv_reader, 4)  # Start at 4 (year, month, header, data)
+        self._raise_for_issues()
+
+        if not expenses:
+            raise ValueError("Keine gültigen Ausgaben in der CSV-Datei gefunden")
+
+        return year, month, expenses
+
+    def parse_header(self, lines: list) -> tuple:
+        """Validate the first three lines (year, month, header).
+
+        Returns:
+            Tuple (year, month, fieldnames)
+        """
+        year, month = self._parse_period(lines)
+        fieldnames = next(csv.reader([lines[2]], delimiter=self.delimiter), None)
+        self._validate_header(fieldnames)
+        return year, month, fieldnames
+
+    def parse_rows(self, lines: list, fieldnames: list, first_row_number: int) -> tuple:
+        """Validate and parse data lines without a header (e.g. lines appended since the last run).
+
+        Args:
+            lines: Data lines
+            fieldnames: Header fields from parse_header()
+            first_row_number: Row number of the first line, used in error messages
+
+        Returns:
+            Tuple (expenses, next_row_number)
+
+        Raises:
+            ValueError: If any row is invalid
+        """
+        csv_reader = csv.DictReader(lines, fieldnames=fieldnames, delimiter=self.delimiter)
+        result = self._parse_rows(csv_reader, first_row_number)
+        self._raise_for_issues()
+        return result
+
+    def _parse_period(self, lines: list) -> tuple:
         # Validate minimum line count
         if len(lines) < 3:
             raise ValueError("CSV muss mindestens 3 Zeilen haben (Jahr, Monat, Header)")
@@ -50,93 +112,141 @@ class ExpenseReader:
                 f"Erwarte Zahl 1-12"
             )
 
-        # Parse CSV starting from line 3 (header)
-        csv_content = ''.join(lines[2:])
-        csv_reader = csv.DictReader(csv_content.splitlines(), delimiter=self.delimiter)
+        self.use_period(year, month)
+        return year, month
+
+    def use_period(self, year: str, month: str) -> None:
+        """Set the period used to complete expense dates (e.g. for rows appended since the last run).
 
-        if not csv_reader.fieldnames:
+        Expenses without a 'date' are converted with the rate of the last day of the month.
+        """
+        year, month = int(year), int(month)
+        self.period_end = date(year, month, calendar.monthrange(year, month)[1])
+
+    def _validate_header(self, fieldnames: list) -> None:
+        if not fieldnames:
             raise ValueError("CSV-Datei hat keine Header-Zeile")
 
-        # Validate header
         required_fields = ['person', 'amount']
-        missing_fields = [f for f in required_fields if f not in csv_reader.fieldnames]
+        missing_fields = [f for f in required_fields if f not in fieldnames]
         if missing_fields:
             raise ValueError(
                 f"CSV-Header fehlen Pflichtfelder: {', '.join(missing_fields)}\n"
-                f"Erwartet: person,amount,comment"
+                f"Erwartet: person,amount,comment (optional: currency,date)"
             )
 
-        for row_number, row in enumerate(csv_reader, start=4):  # Start at 4 (year, month, header, data)
-            validation_errors = self._validate_row(row, row_number)
+    def _parse_rows(self, csv_reader, first_row_number: int) -> tuple:
+        """Returns (expenses, next_row_number); invalid rows are recorded in diagnostics"""
+        expenses = []
+        next_row_number = first_row_number
+
+        for row_number, row in enumerate(csv_reader, start=first_row_number):
+            next_row_number = row_number + 1
+            validation_errors = self._validate_row(row)
 
             if validation_errors:
-                errors.extend(validation_errors)
+                for reason in validation_errors:
+                    self.diagnostics.record(row_number, reason, row)
                 continue
 
             try:
                 expense = self._create_expense_from_row(row)
                 expenses.append(expense)
             except Exception as e:
-                errors.append(f"Zeile {row_number}: Fehler beim Verarbeiten - {str(e)}")
-
-        # Report all errors if any
-        if errors:
-            error_message = "CSV-Validierung fehlgeschlagen\n" + "\n".join(errors)
-            raise ValueError(error_message)
+                self.diagnostics.record(row_number, f"Fehler beim Verarbeiten - {str(e)}", row)
 
-        if not expenses:
-            raise ValueError("Keine gültigen Ausgaben in der CSV-Datei gefunden")
+        return expenses, next_row_number
 
-        return year, month, expenses
+    def _raise_for_issues(self) -> None:
+        # Report errors (rate-limited, full list via diagnostics side file)
+        if self.diagnostics.has_issues():
+            error_message = "CSV-Validierung fehlgeschlagen\n" + "\n".join(self.diagnostics.summary_lines())
+            raise ValueError(error_message)
 
-    def _validate_row(self, row: dict, row_number: int) -> list:
+    def _validate_row(self, row: dict) -> list:
         errors = []
 
         # Validate person field
-        person = row.get('person', '').strip()
+        person = (row.get('person') or '').strip()
         if not person:
-            errors.append(f"Zeile {row_number}: Pflichtfeld 'person' fehlt")
+            errors.append("Pflichtfeld 'person' fehlt")
         elif person.lower() not in self.valid_persons:
             valid_list = ', '.join(self.valid_persons)
             errors.append(
-                f"Zeile {row_number}: Ungültige Person '{person}'. "
+                f"Ungültige Person '{person}'. "
                 f"Erlaubt sind nur: {valid_list}"
             )
 
         # Validate amount field
-        amount = row.get('amount', '').strip()
+        amount = (row.get('amount') or '').strip()
         if not amount:
-            errors.append(f"Zeile {row_number}: Pflichtfeld 'amount' fehlt")
+            errors.append("Pflichtfeld 'amount' fehlt")
         else:
             try:
                 self._parse_german_decimal(amount)
-            except (ValueError, InvalidOperation):
+            except ValueError:
                 errors.append(
-                    f"Zeile {row_number}: Ungültiger Betrag '{amount}'. "
+                    f"Ungültiger Betrag '{amount}'. "
                     f"Erwarte Zahl mit Komma oder Punkt (z.B. 12,50 oder 12.50)"
                 )
 
+        if not errors:
+            try:
+                self._convert(row, self._parse_german_decimal(amount))
+            except ValueError as e:
+                errors.append(str(e))
+
         return errors
 
     def _create_expense_from_row(self, row: dict) -> Expense:
         person = row['person'].strip()
         amount = self._parse_german_decimal(row['amount'].strip())
-        comment = row.get('comment', '').strip()
+        comment = (row.get('comment') or '').strip()
+
+        currency, converted, rate_date = self._convert(row, amount)
+        return Expense(person, converted, comment, currency, amount, rate_date)
+
+    def _convert(self, row: dict, amount: Money) -> tuple:
+        """Returns (currency, amount in euros, rate date) for the optional 'currency' and 'date' columns"""
+        currency = (row.get('currency') or '').strip().upper()
+        if currency in ('', '€', BASE_CURRENCY):
+            return BASE_CURRENCY, amount, None
+
+        if self.exchange_rates is None:
+            raise ValueError(
+                f"Währung '{currency}' angegeben, aber keine Kurstabelle konfiguriert (exchange_rates_file)"
+            )
+        day = self._parse_expense_date((row.get('date') or '').strip())
+        return (currency, self.exchange_rates.convert(amount, currency, day),
+                self.exchange_rates.rate_date(currency, day))
 
-        return Expense(person, amount, comment)
+    def _parse_expense_date(self, date_str: str) -> date:
+        if not date_str:
+            return self.period_end
+        try:
+            if date_str.count('.') == 2 and not date_str.endswith('.'):
+                return datetime.strptime(date_str, "%d.%m.%Y").date()
+            # "TT.MM." or "TT": year (and month) from the file header
+            parts = [int(part) for part in date_str.rstrip('.').split('.')]
+            if len(parts) > 2:
+                raise ValueError()
+            day = parts[0]
+            month = parts[1] if len(parts) > 1 else self.period_end.month
+            return date(self.period_end.year, month, day)
+        except (ValueError, IndexError):
+            raise ValueError(
+                f"Ungültiges Datum '{date_str}'. Erwarte TT.MM.JJJJ, TT.MM. oder TT"
+            ) from None
 
-    def _parse_german_decimal(self, amount_str: str) -> Decimal:
+    def _parse_german_decimal(self, amount_str: str) -> Money:
         # Handle both German (comma) and English (period) decimal formats
         # Remove whitespace and common currency symbols
         cleaned = amount_str.strip().replace('€', '').replace(' ', '')
 
-        # Replace comma with period for Decimal parsing
-        cleaned = cleaned.replace(',', '.')
-
         try:
-            amount = Decimal(cleaned)
+            amount = Money.parse(cleaned)
             if amount < 0:
                 raise ValueError("Negative Beträge sind nicht erlaubt")
             return amount
-        except (InvalidOperation, ValueError) as e:
+        except ValueError as e:
             raise ValueError(f"Kann '{amount_str}' nicht als Betrag interpretieren") from e
@@ -1,43 +1,96 @@
-def filter_transactions(transactions: list, income_allow_list: list, expense_block_list: list) -> list:
-    """Filter transactions based on allowlist and blocklist.
+from modules.rules import RuleEngine
+
+# Reason codes for ignored transactions
+REASON_NOT_IN_ALLOWLIST = "nicht_in_allowlist"
+REASON_IN_BLOCKLIST = "in_blocklist"
+REASON_RULE = "regel"
+
+
+class FilterResult:
+    """Partition of transactions produced by a single filtering pass.
+
+    Attributes:
+        kept: Transactions relevant for the settlement
+        ignored: List of (transaction, reason_code, rule) tuples; rule is None
+            if the transaction was ignored by default
+        zero_amount: Transactions with an amount of 0
+    """
+
+    def __init__(self):
+        self.kept = []
+        self.ignored = []
+        self.zero_amount = []
+
+    @property
+    def total(self) -> int:
+        return len(self.kept) + len(self.ignored) + len(self.zero_amount)
+
+
+def partition_transactions(transactions: list, income_allow_list: list, expense_block_list: list,
+                           rule_engine: RuleEngine = None) -> FilterResult:
+    """Split transactions into kept, ignored and zero-amount in one pass.
 
     Args:
         transactions: List of transaction objects
         income_allow_list: List of allowed income sender patterns
         expense_block_list: List of blocked expense recipient patterns
+        rule_engine: Pre-built rule engine (keeps hit counters across calls).
+            If omitted, one is built from the allowlist and blocklist.
 
     Returns:
-        List of filtered transactions
+        FilterResult with kept, ignored (including reason code) and zero-amount transactions
     """
-    filtered = []
+    if rule_engine is None:
+        rule_engine = RuleEngine(income_allow_list, expense_block_list)
+
+    result = FilterResult()
 
     for transaction in transactions:
-        if transaction.is_income:
-            # For income: check if sender matches allowlist
-            sender = getattr(transaction, "sender", "")
-            if _matches_any_pattern(sender, income_allow_list):
-                filtered.append(transaction)
+        if not transaction.is_income and not transaction.is_expense:
+            result.zero_amount.append(transaction)
+            continue
 
-        elif transaction.is_expense:
-            # For expenses: check if recipient is NOT in blocklist
-            if not _matches_any_pattern(transaction.recipient, expense_block_list):
-                filtered.append(transaction)
+        keep, rule = rule_engine.evaluate(transaction)
+        if keep:
+            result.kept.append(transaction)
+        else:
+            result.ignored.append((transaction, ignore_reason_code(rule), rule))
 
-    return filtered
+    return result
 
 
-def _matches_any_pattern(text: str, patterns: list) -> bool:
-    """Check if text matches any of the patterns (case-insensitive).
+def filter_transactions(transactions: list, income_allow_list: list, expense_block_list: list,
+                        rule_engine: RuleEngine = None) -> list:
+    """Filter transactions based on allowlist, blocklist and configured rules.
 
     Args:
-        text: Text to check
-        patterns: List of patterns to match against
+        transactions: List of transaction objects
+        income_allow_list: List of allowed income sender patterns
+        expense_block_list: List of blocked expense recipient patterns
+        rule_engine: Pre-built rule engine (keeps hit counters across calls).
+            If omitted, one is built from the allowlist and blocklist.
 
     Returns:
-        True if text matches any pattern, False otherwise
+        List of filtered transactions
     """
-    text_lower = text.lower()
-    for pattern in patterns:
-        if pattern.lower() in text_lower:
-            return True
-    return False
+    return partition_transactions(
+        transactions, income_allow_list, expense_block_list, rule_engine
+    ).kept
+
+
+def ignore_reason_code(rule) -> str:
+    """Map the decisive rule of an ignored transaction to a reason code."""
+    if rule is None:
+        return REASON_NOT_IN_ALLOWLIST
+    if rule.source == "blocklist":
+        return REASON_IN_BLOCKLIST
+    return REASON_RULE
+
+
+def describe_ignore_reason(reason_code: str, rule) -> str:
+    """Return the display text for an ignore reason code."""
+    if reason_code == REASON_NOT_IN_ALLOWLIST:
+        return "Nicht in Allowlist"
+    if reason_code == REASON_IN_BLOCKLIST:
+        return "In Blocklist"
+    return f"Regel: {rule.name}" if rule else "Regel"
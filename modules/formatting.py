@@ -0,0 +1,81 @@
+from functools import lru_cache
+
+from modules.money import Money
+
+CACHE_SIZE = 65536
+
+_SEPARATOR_SWAP = str.maketrans(",.", ".,")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_cents(cents: int, thousands_separator: bool = False) -> str:
+    """Format integer cents as German amount string.
+
+    Args:
+        cents: Amount in cents
+        thousands_separator: Group thousands with "." (e.g. "1.234,56")
+
+    Returns:
+        Formatted amount without currency symbol (e.g., "-1234,56")
+    """
+    sign = "-" if cents < 0 else ""
+    euros, rest = divmod(abs(cents), 100)
+    euros_str = f"{euros:,}".replace(",", ".") if thousands_separator else str(euros)
+    return f"{sign}{euros_str},{rest:02d}"
+
+
+def format_amount(amount, thousands_separator: bool = False) -> str:
+    """Format a Money/Decimal/float/int euro amount as German amount string.
+
+    Money goes straight to format_cents; other results are memoized per
+    value, amounts repeat a lot in reports.
+
+    Args:
+        amount: Amount in euros
+        thousands_separator: Group thousands with "." (e.g. "1.234,56")
+
+    Returns:
+        Formatted amount without currency symbol (e.g., "123,45")
+    """
+    if isinstance(amount, Money):
+        return format_cents(amount.cents, thousands_separator)
+    if not amount:
+        # 0 and -0 compare equal, keep them out of the cache to preserve the sign
+        return _format_amount_uncached(amount, thousands_separator)
+    return _format_amount_cached(amount, thousands_separator)
+
+
+def format_euro(amount, thousands_separator: bool = False) -> str:
+    """Format a euro amount with currency symbol (e.g., "123,45 €")."""
+    if isinstance(amount, Money):
+        return format_cents(amount.cents, thousands_separator) + " €"
+    if not amount:
+        return _format_amount_uncached(amount, thousands_separator) + " €"
+    return _format_euro_cached(amount, thousands_separator)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_date(value) -> str:
+    """Format a date as DD.MM.YYYY."""
+    return f"{value.day:02d}.{value.month:02d}.{value.year:04d}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_short_date(value) -> str:
+    """Format a date as DD.MM.YY."""
+    return f"{value.day:02d}.{value.month:02d}.{value.year % 100:02d}"
+
+
+def _format_amount_uncached(amount, thousands_separator: bool) -> str:
+    if thousands_separator:
+        # Swap English separators: "1,234.56" -> "1.234,56"
+        return f"{amount:,.2f}".translate(_SEPARATOR_SWAP)
+    return f"{amount:.2f}".replace(".", ",")
+
+
+_format_amount_cached = lru_cache(maxsize=CACHE_SIZE)(_format_amount_uncached)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _format_euro_cached(amount, thousands_separator: bool) -> str:
+    return _format_amount_uncached(amount, thousands_separator) + " €"
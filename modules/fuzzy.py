@@ -0,0 +1,82 @@
+from modules.counterparty import canonical_name
+
+DEFAULT_THRESHOLD = 0.8
+
+# Distinct counterparties whose decision is remembered
+DECISION_CACHE_SIZE = 65536
+
+
+def trigrams(text: str) -> frozenset:
+    """Trigrams of the canonical name, padded so word starts and ends count.
+
+    Canonical names drop casing, legal forms and store numbers, so
+    "PayPal (Europe) S.a.r.l." and "PAYPAL EUROPE" share all trigrams.
+    """
+    padded = f"  {canonical_name(text)} "
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """Fuzzy lookup of counterparty names among a fixed set of patterns.
+
+    An inverted index maps each trigram to the patterns containing it. A
+    lookup only counts shared trigrams for patterns reached through the
+    index whose size can still reach the threshold, drops candidates with
+    too few shared trigrams and scores the rest with the Dice coefficient
+    2 * |A & B| / (|A| + |B|). Decisions are cached per distinct name.
+    """
+
+    def __init__(self, patterns: list, threshold: float = DEFAULT_THRESHOLD):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Ungültiger Schwellwert {threshold} für unscharfen Abgleich. Erwarte 0 < Wert <= 1")
+        self.patterns = list(patterns)
+        self.threshold = threshold
+        self._sizes = []
+        self._postings = {}
+        self._decisions = {}
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            grams = trigrams(str(pattern))
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(pattern_id)
+
+    def best_match(self, name: str):
+        """Return (pattern_id, score) of the most similar pattern, or None below the threshold."""
+        if name in self._decisions:
+            return self._decisions[name]
+
+        decision = self._score(name)
+        if len(self._decisions) >= DECISION_CACHE_SIZE:
+            self._decisions.clear()
+        self._decisions[name] = decision
+        return decision
+
+    def _score(self, name: str):
+        grams = trigrams(name)
+        if not grams:
+            return None
+
+        # Dice >= t needs at least t * (|A| + |B|) / 2 shared trigrams, and at most
+        # min(|A|, |B|) can be shared: patterns outside this size window are skipped
+        size = len(grams)
+        threshold = self.threshold
+        min_size = threshold / (2 - threshold) * size
+        max_size = (2 - threshold) / threshold * size
+        sizes = self._sizes
+
+        shared = {}
+        for gram in grams:
+            for pattern_id in self._postings.get(gram, ()):
+                if min_size <= sizes[pattern_id] <= max_size:
+                    shared[pattern_id] = shared.get(pattern_id, 0) + 1
+
+        best = None
+        for pattern_id, count in shared.items():
+            pattern_size = sizes[pattern_id]
+            if count < threshold * (size + pattern_size) / 2:
+                continue
+            score = 2 * count / (size + pattern_size)
+            if best is None or score > best[1]:
+                best = (pattern_id, score)
+        return best
@@ -0,0 +1,284 @@
+import csv
+import glob
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from modules.counterparty import canonical_name
+from modules.money import Money
+
+HISTORY_FILENAME = "historie.sqlite"
+
+# Bumped whenever the schema or the counterparty normalization changes; an
+# index with another version is rebuilt from the exports
+SCHEMA_VERSION = 2
+
+# Month folders written by CsvExporter, e.g. output/bank/2025-10
+MONTH_FOLDER_PATTERN = "[0-9][0-9][0-9][0-9]-[0-9][0-9]"
+
+# Preferred source per export: jsonl and sqlite carry full names and cents,
+# the Excel CSV only shortened names
+SOURCE_EXTENSIONS = (".jsonl", ".sqlite", ".csv")
+
+GROUP_BY_COLUMNS = {
+    "category": "t.category",
+    "counterparty": "c.name",
+    "kind": "t.kind",
+    "day": "t.date",
+    "month": "substr(t.date, 1, 7)",
+    "year": "substr(t.date, 1, 4)",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS counterparties (id INTEGER PRIMARY KEY, name TEXT, normalized TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS transactions (
+    date TEXT, kind TEXT, counterparty_id INTEGER, amount_cents INTEGER, category TEXT,
+    occurrence INTEGER, source TEXT,
+    UNIQUE (date, kind, counterparty_id, amount_cents, occurrence)
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+CREATE INDEX IF NOT EXISTS idx_transactions_counterparty ON transactions (counterparty_id, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions (category, date);
+"""
+
+
+def normalize_counterparty(name: str) -> str:
+    """Normalize a counterparty name for grouping and matching.
+
+    Uses the canonical name, so spelling variants such as "REWE Markt GmbH"
+    and "REWE SAGT DANKE 1234" count as one counterparty.
+    """
+    return canonical_name(name)
+
+
+class HistoryIndex:
+    """Indexed SQLite view over all settled bank transactions in the output folder.
+
+    The index is built from the exports in the month folders (per export the
+    .jsonl, .sqlite or Excel .csv file, in that order of preference) and kept
+    up to date lazily: new exports are added, changed or deleted exports
+    trigger a rebuild. Transactions that appear in several overlapping exports
+    are stored once (same date, kind, counterparty and amount are counted per
+    export, the highest count wins).
+    """
+
+    def __init__(self, output_folder: str, categorize, db_path: str = None):
+        self.output_folder = output_folder
+        self.categorize = categorize
+        self.db_path = db_path or os.path.join(output_folder, HISTORY_FILENAME)
+        self._connection = sqlite3.connect(self.db_path)
+        if self._connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._connection.executescript(
+                "DROP TABLE IF EXISTS transactions; DROP TABLE IF EXISTS counterparties; "
+                "DROP TABLE IF EXISTS sources;"
+            )
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._connection.executescript(SCHEMA)
+        self._counterparty_ids = {}
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def refresh(self, rebuild: bool = False) -> int:
+        """Bring the index up to date with the exports on disk.
+
+        Returns:
+            Number of exports that were (re)read
+        """
+        current = {path: _file_signature(path) for path in self._find_sources()}
+        stored = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self._connection.execute("SELECT path, mtime_ns, size FROM sources")
+        }
+
+        if rebuild or any(current.get(path) != signature for path, signature in stored.items()):
+            with self._connection:
+                self._connection.execute("DELETE FROM transactions")
+                self._connection.execute("DELETE FROM sources")
+            stored = {}
+
+        new_paths = sorted(path for path in current if path not in stored)
+        with self._connection:
+            for path in new_paths:
+                self._ingest(path)
+                self._connection.execute(
+                    "INSERT INTO sources VALUES (?, ?, ?)", (path, *current[path])
+                )
+        return len(new_paths)
+
+    def query(self, date_from=None, date_to=None, counterparty: str = None, category: str = None,
+              min_amount: Money = None, max_amount: Money = None, kind: str = None,
+              group_by: str = None, limit: int = None) -> list:
+        """Run a query against the index.
+
+        Args:
+            date_from, date_to: Inclusive date range (datetime.date)
+            counterparty: Substring of the counterparty name (case-insensitive)
+            category: Exact category name
+            min_amount, max_amount: Inclusive bounds on the absolute amount
+            kind: "income" or "expense"
+            group_by: One of GROUP_BY_COLUMNS, returns (key, count, total_cents) rows
+            limit: Maximum number of rows
+
+        Returns:
+            List of (date, counterparty, amount_cents, category) tuples, newest
+            first, or grouped rows sorted by absolute total
+        """
+        conditions = []
+        parameters = []
+
+        if date_from is not None:
+            conditions.append("t.date >= ?")
+            parameters.append(date_from.isoformat())
+        if date_to is not None:
+            conditions.append("t.date <= ?")
+            parameters.append(date_to.isoformat())
+        if counterparty:
+            # Match against the (small) name table first, then use the index
+            ids = self._matching_counterparty_ids(counterparty)
+            conditions.append(f"t.counterparty_id IN ({','.join('?' * len(ids))})" if ids else "0")
+            parameters.extend(ids)
+        if category:
+            conditions.append("t.category = ?")
+            parameters.append(category)
+        if min_amount is not None:
+            conditions.append("abs(t.amount_cents) >= ?")
+            parameters.append(min_amount.cents)
+        if max_amount is not None:
+            conditions.append("abs(t.amount_cents) <= ?")
+            parameters.append(max_amount.cents)
+        if kind:
+            conditions.append("t.kind = ?")
+            parameters.append(kind)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if group_by:
+            if group_by not in GROUP_BY_COLUMNS:
+                raise ValueError(
+                    f"Unbekannte Gruppierung '{group_by}'. Erlaubt: {', '.join(GROUP_BY_COLUMNS)}"
+                )
+            key = GROUP_BY_COLUMNS[group_by]
+            sql = (
+                f"SELECT {key}, count(*), sum(t.amount_cents) FROM transactions t "
+                f"JOIN counterparties c ON c.id = t.counterparty_id {where} "
+                f"GROUP BY {key} ORDER BY abs(sum(t.amount_cents)) DESC"
+            )
+        else:
+            sql = (
+                f"SELECT t.date, c.name, t.amount_cents, t.category FROM transactions t "
+                f"JOIN counterparties c ON c.id = t.counterparty_id {where} "
+                f"ORDER BY t.date DESC"
+            )
+        if limit:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+
+        return self._connection.execute(sql, parameters).fetchall()
+
+    def _find_sources(self) -> list:
+        """Pick one source file per export, preferring the formats in SOURCE_EXTENSIONS."""
+        exports = {}
+        pattern = os.path.join(self.output_folder, MONTH_FOLDER_PATTERN, "monatsabrechnung_*")
+        for path in glob.glob(pattern):
+            base, extension = os.path.splitext(path)
+            if extension not in SOURCE_EXTENSIONS:
+                continue
+            known = exports.get(base)
+            if known is None or SOURCE_EXTENSIONS.index(extension) < SOURCE_EXTENSIONS.index(known):
+                exports[base] = extension
+        return [base + extension for base, extension in exports.items()]
+
+    def _ingest(self, path: str) -> None:
+        occurrences = {}
+        rows = []
+        for date, kind, counterparty, amount_cents in _read_source(path):
+            counterparty_id = self._counterparty_id(counterparty)
+            key = (date, kind, counterparty_id, amount_cents)
+            occurrence = occurrences.get(key, 0) + 1
+            occurrences[key] = occurrence
+            category = "Einnahme" if kind == "income" else self.categorize(counterparty)
+            rows.append((date, kind, counterparty_id, amount_cents, category, occurrence, path))
+
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def _counterparty_id(self, name: str) -> int:
+        normalized = normalize_counterparty(name)
+        counterparty_id = self._counterparty_ids.get(normalized)
+        if counterparty_id is None:
+            row = self._connection.execute(
+                "SELECT id FROM counterparties WHERE normalized = ?", (normalized,)
+            ).fetchone()
+            if row:
+                counterparty_id = row[0]
+            else:
+                counterparty_id = self._connection.execute(
+                    "INSERT INTO counterparties (name, normalized) VALUES (?, ?)", (name.strip(), normalized)
+                ).lastrowid
+            self._counterparty_ids[normalized] = counterparty_id
+        return counterparty_id
+
+    def _matching_counterparty_ids(self, text: str) -> list:
+        needle = normalize_counterparty(text)
+        return [
+            counterparty_id
+            for counterparty_id, normalized in self._connection.execute("SELECT id, normalized FROM counterparties")
+            if needle in normalized
+        ]
+
+
+def _file_signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_source(path: str):
+    """Yield (iso_date, kind, counterparty, amount_cents) for the kept transactions of an export."""
+    extension = os.path.splitext(path)[1]
+    if extension == ".jsonl":
+        yield from _read_jsonl(path)
+    elif extension == ".sqlite":
+        yield from _read_sqlite(path)
+    else:
+        yield from _read_excel_csv(path)
+
+
+def _read_jsonl(path: str):
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            data = json.loads(line)
+            if data.get("record") == "transaction":
+                yield data["date"], data["kind"], data["counterparty"], data["amount_cents"]
+
+
+def _read_sqlite(path: str):
+    connection = sqlite3.connect(path)
+    try:
+        yield from connection.execute(
+            "SELECT date, kind, counterparty, amount_cents FROM transactions WHERE record = 'transaction'"
+        )
+    finally:
+        connection.close()
+
+
+def _read_excel_csv(path: str):
+    """Read the "ALLE BERÜCKSICHTIGTEN TRANSAKTIONEN" section of an Excel CSV export."""
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        reader = csv.reader(file, delimiter=";")
+        for row in reader:
+            if row and row[0] == "ALLE BERÜCKSICHTIGTEN TRANSAKTIONEN":
+                next(reader, None)  # column header
+                break
+
+        for row in reader:
+            if not row or not row[0]:
+                return
+            date_str, description, amount_str = row[0], row[1], row[2]
+            kind = "income" if amount_str.startswith("+") else "expense"
+            counterparty = description.split(" ", 2)[2] if description.count(" ") >= 2 else description
+            amount = Money.parse(amount_str.replace("€", "").replace("+", ""))
+            date = datetime.strptime(date_str, "%d.%m.%Y").date()
+            yield date.isoformat(), kind, counterparty, amount.cents
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+from datetime import date
+
+from modules.archives import open_binary
+from modules.expense_reader import Expense, ExpenseReader
+from modules.money import Money, ZERO
+
+STATE_VERSION = 4
+
+# The processed prefix is hashed in chunks of this size, never loaded at once
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class IncrementalResult:
+    """Outcome of an incremental read.
+
+    Attributes:
+        year, month: Period from the file header
+        expenses: All expenses of the file (stored ones plus new ones), or None
+            if they were not requested and only the tail was read
+        person_totals: Running total per person (Money)
+        expense_count: Number of expenses in the whole file
+        new_count: Number of expenses parsed in this run
+        full_recompute: True if the whole file had to be read again
+    """
+
+    def __init__(self, year: str, month: str, expenses, person_totals: dict,
+                 expense_count: int, new_count: int, full_recompute: bool):
+        self.year = year
+        self.month = month
+        self.expenses = expenses
+        self.person_totals = person_totals
+        self.expense_count = expense_count
+        self.new_count = new_count
+        self.full_recompute = full_recompute
+
+
+class IncrementalExpenseReader:
+    """Append-aware reader for the paper CSV.
+
+    Remembers the byte offset of the last complete record, a SHA-256 checksum
+    of everything before it and the running per-person totals. The parsed
+    expenses are kept in an append-only file next to the state (one JSON
+    array per line), so the reports can list every expense without parsing
+    and validating the CSV again.
+
+    On the next run the processed part is hashed in chunks while reading up
+    to the offset; only the appended tail is validated, parsed, added to the
+    totals and appended to the expense file. If the file is a different one,
+    got shorter, or the checksum no longer matches (any edit before the
+    offset), the whole file is read again.
+
+    A trailing line without newline (or a quoted comment whose closing quote
+    is not written yet) is parsed every run but not stored, since it may
+    still be extended. Stored amounts are already converted to euros,
+    so a changed exchange rate table also forces a full read.
+    """
+
+    def __init__(self, reader: ExpenseReader, state_path: str):
+        self.reader = reader
+        self.state_path = state_path
+        self.expenses_path = os.path.splitext(state_path)[0] + "_ausgaben.jsonl"
+
+    def read(self, file_path: str, with_expenses: bool = True) -> IncrementalResult:
+        """Read new expenses from file_path and update the stored state.
+
+        Args:
+            file_path: Paper CSV file
+            with_expenses: Load the stored expenses after resuming (needed for the
+                reports); without, only the totals are returned
+
+        Raises:
+            ValueError: On validation errors (details in reader.diagnostics)
+        """
+        state = self._load_state()
+        with open_binary(file_path) as file:
+            digest = self._verified_prefix(state, file_path, file)
+            if digest is not None:
+                return self._read_tail(state, digest, file.read(), with_expenses)
+            file.seek(0)
+            return self._read_full(file_path, file.read())
+
+    def _verified_prefix(self, state: dict, file_path: str, file):
+        """Hash of the processed part if the state still fits the file, else None.
+
+        Reads the file up to the stored offset in chunks; on success the file
+        is positioned there.
+        """
+        if not state or state.get("version") != STATE_VERSION:
+            return None
+        if state.get("input_file") != os.path.abspath(file_path):
+            return None
+        if state.get("exchange_rates") != self._rates_fingerprint():
+            return None
+        try:
+            if os.path.getsize(self.expenses_path) < state["expenses_size"]:
+                return None
+        except OSError:
+            return None
+
+        digest = hashlib.sha256()
+        remaining = state["offset"]
+        while remaining:
+            chunk = file.read(min(HASH_CHUNK_BYTES, remaining))
+            if not chunk:
+                # The file got shorter than the processed part
+                return None
+            digest.update(chunk)
+            remaining -= len(chunk)
+        if digest.hexdigest() != state["checksum"]:
+            return None
+        return digest
+
+    def _read_full(self, file_path: str, data: bytes) -> IncrementalResult:
+        text = data.decode("utf-8")
+        header_lines = text.splitlines(keepends=True)[:3]
+        year, month, fieldnames = self.reader.parse_header(header_lines)
+
+        header_end = len("".join(header_lines).encode("utf-8"))
+        committed_end = max(_record_end(data, header_end), header_end)
+
+        expenses, next_row = self.reader.parse_rows(
+            _lines(data[header_end:committed_end]), fieldnames, 4
+        )
+        pending, _ = self.reader.parse_rows(_lines(data[committed_end:]), fieldnames, next_row)
+        if not expenses and not pending:
+            raise ValueError("Keine gültigen Ausgaben in der CSV-Datei gefunden")
+
+        person_totals = _add_to_totals({}, expenses)
+        if header_lines[-1].endswith("\n"):
+            # The old state must not survive next to the new expense file
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            expenses_size = self._write_expenses(expenses)
+            self._save_state({
+                "version": STATE_VERSION,
+                "input_file": os.path.abspath(file_path),
+                "exchange_rates": self._rates_fingerprint(),
+                "offset": committed_end,
+                "checksum": hashlib.sha256(data[:committed_end]).hexdigest(),
+                "year": year,
+                "month": month,
+                "fieldnames": fieldnames,
+                "next_row": next_row,
+                "expense_count": len(expenses),
+                "expenses_size": expenses_size,
+                "person_totals": {person: total.cents for person, total in person_totals.items()},
+            })
+
+        return IncrementalResult(
+            year, month, expenses + pending,
+            _add_to_totals(dict(person_totals), pending),
+            len(expenses) + len(pending), len(expenses) + len(pending), full_recompute=True
+        )
+
+    def _read_tail(self, state: dict, digest, tail: bytes, with_expenses: bool) -> IncrementalResult:
+        """Parse the bytes after the stored offset and add them to the stored totals and expenses."""
+        committed_end = _record_end(tail, 0)
+        fieldnames = state["fieldnames"]
+        self.reader.use_period(state["year"], state["month"])
+
+        new_expenses, next_row = self.reader.parse_rows(
+            _lines(tail[:committed_end]), fieldnames, state["next_row"]
+        )
+        pending, _ = self.reader.parse_rows(_lines(tail[committed_end:]), fieldnames, next_row)
+
+        person_totals = {person: Money(cents) for person, cents in state["person_totals"].items()}
+        person_totals = _add_to_totals(person_totals, new_expenses)
+        expense_count = state["expense_count"] + len(new_expenses)
+
+        if committed_end:
+            digest.update(tail[:committed_end])
+            state["offset"] += committed_end
+            state["checksum"] = digest.hexdigest()
+            state["next_row"] = next_row
+            state["expense_count"] = expense_count
+            state["expenses_size"] = self._append_expenses(new_expenses, state["expenses_size"])
+            state["person_totals"] = {person: total.cents for person, total in person_totals.items()}
+            self._save_state(state)
+
+        if not expense_count and not pending:
+            raise ValueError("Keine gültigen Ausgaben in der CSV-Datei gefunden")
+
+        expenses = None
+        if with_expenses:
+            expenses = self._load_expenses(state["expenses_size"]) + pending
+        return IncrementalResult(
+            state["year"], state["month"], expenses,
+            _add_to_totals(dict(person_totals), pending),
+            expense_count + len(pending), len(new_expenses) + len(pending), full_recompute=False
+        )
+
+    def _rates_fingerprint(self):
+        exchange_rates = self.reader.exchange_rates
+        return exchange_rates.fingerprint if exchange_rates is not None else None
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            # Unreadable state only costs a full recompute
+            return {}
+
+    def _save_state(self, state: dict) -> None:
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def _write_expenses(self, expenses: list) -> int:
+        """Replace the expense file; returns its size."""
+        os.makedirs(os.path.dirname(self.expenses_path) or ".", exist_ok=True)
+        temp_path = self.expenses_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.writelines(_stored_expense(expense) for expense in expenses)
+            size = file.tell()
+        os.replace(temp_path, self.expenses_path)
+        return size
+
+    def _append_expenses(self, expenses: list, size: int) -> int:
+        """Append to the expense file after its committed size; returns the new size.
+
+        Lines written by a run that ended before saving its state are cut off first.
+        """
+        with open(self.expenses_path, "r+b") as file:
+            file.truncate(size)
+            file.seek(size)
+            file.writelines(_stored_expense(expense) for expense in expenses)
+            return file.tell()
+
+    def _load_expenses(self, size: int) -> list:
+        with open(self.expenses_path, "rb") as file:
+            data = file.read(size)
+        # One JSON document for all lines is about twice as fast as one per line
+        rows = json.loads(b"[" + data.rstrip(b"\n").replace(b"\n", b",") + b"]")
+        return [_restored_expense(fields) for fields in rows]
+
+
+def _record_end(data: bytes, start: int) -> int:
+    """Offset after the last newline from start on that ends a CSV record (start if there is none).
+
+    A newline ends a record if the quotes before it are balanced; newlines
+    inside a quoted comment do not.
+    """
+    end = start
+    quotes = 0
+    position = start
+    while True:
+        newline = data.find(b"\n", position)
+        if newline < 0:
+            return end
+        quotes += data.count(b'"', position, newline)
+        if quotes % 2 == 0:
+            end = newline + 1
+        position = newline + 1
+
+
+def _lines(data: bytes) -> list:
+    return data.decode("utf-8").splitlines()
+
+
+def _stored_expense(expense: Expense) -> bytes:
+    rate_date = expense.rate_date.isoformat() if expense.rate_date else None
+    fields = [expense.person, expense.amount.cents, expense.comment, expense.currency,
+              expense.original_amount.cents, rate_date]
+    return json.dumps(fields, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def _restored_expense(fields: list) -> Expense:
+    person, cents, comment, currency, original_cents, rate_date = fields
+    return Expense(person, Money(cents), comment, currency, Money(original_cents),
+                   date.fromisoformat(rate_date) if rate_date else None)
+
+
+def _add_to_totals(person_totals: dict, expenses: list) -> dict:
+    for expense in expenses:
+        person_totals[expense.person] = person_totals.get(expense.person, ZERO) + expense.amount
+    return person_totals
@@ -0,0 +1,89 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks outside POSIX; runs are then only safe one at a time
+    fcntl = None
+
+LOCK_FILENAME = ".lock"
+ARCHIVE_DIRNAME = "archiv"
+
+
+@contextlib.contextmanager
+def directory_lock(directory: str):
+    """Hold an exclusive lock on a directory while the block runs.
+
+    The directory is created if needed. The lock is an fcntl.flock on a
+    lock file inside it, so it covers other processes (cron, batch
+    workers) as well as other threads opening it separately, and it is
+    released by the kernel if the process dies.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if fcntl is None:
+        yield directory
+        return
+
+    with open(os.path.join(directory, LOCK_FILENAME), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield directory
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def archive_file(path: str, archive_directory: str) -> str:
+    """Move a file into the archive directory without overwriting older archived files.
+
+    The move is a single os.replace (both directories are on the same
+    file system). If the name is taken, a counter is appended before the
+    extension. Call it with the directory lock held.
+
+    Returns:
+        Path of the archived file, or None if the file was already gone
+    """
+    os.makedirs(archive_directory, exist_ok=True)
+    filename = os.path.basename(path)
+    stem, extension = os.path.splitext(filename)
+    target = os.path.join(archive_directory, filename)
+    counter = 1
+    while os.path.exists(target):
+        target = os.path.join(archive_directory, f"{stem}_{counter}{extension}")
+        counter += 1
+
+    try:
+        os.replace(path, target)
+    except FileNotFoundError:
+        return None
+    return target
+
+
+def sweep_old_outputs(directory: str, patterns) -> list:
+    """Archive the files directly inside directory that match one of the patterns.
+
+    The sweep holds the directory lock, so overlapping runs do not move the
+    same file twice or overwrite each other's archived files. Files go to
+    the "archiv" folder inside the directory.
+
+    Args:
+        directory: Output directory; nothing happens if it does not exist
+        patterns: Iterable of (prefix, extensions) tuples
+
+    Returns:
+        Names of the archived files
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    archived = []
+    archive_directory = os.path.join(directory, ARCHIVE_DIRNAME)
+    with directory_lock(directory):
+        for filename in sorted(os.listdir(directory)):
+            if not any(filename.startswith(prefix) and filename.endswith(tuple(extensions))
+                       for prefix, extensions in patterns):
+                continue
+            old_file = os.path.join(directory, filename)
+            if os.path.isfile(old_file) and archive_file(old_file, archive_directory):
+                archived.append(filename)
+    return archived
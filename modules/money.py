@@ -0,0 +1,157 @@
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+CENT = Decimal("0.01")
+
+# "-45,50", "12.5", "+3" - the common shapes, parsed without Decimal
+_SIMPLE_AMOUNT = re.compile(r"\s*([+-]?)(\d+)(?:[.,](\d{1,2}))?\s*$")
+
+
+class Money:
+    """Exact euro amount stored as integer cents.
+
+    Supports addition, subtraction, negation, abs and comparisons with other
+    Money values (and with plain integers as whole euros, e.g. `amount < 0`).
+    Division is only available as split(), which distributes the remainder
+    cents deterministically.
+    """
+
+    __slots__ = ("cents",)
+
+    def __init__(self, cents: int = 0):
+        self.cents = cents
+
+    @classmethod
+    def from_decimal(cls, value) -> "Money":
+        """Create from a Decimal (or Decimal-compatible) euro amount, rounding half to even."""
+        value = Decimal(value)
+        return cls(int(value.quantize(CENT, rounding=ROUND_HALF_EVEN).scaleb(2)))
+
+    @classmethod
+    def parse(cls, text: str) -> "Money":
+        """Parse a euro amount with comma or period as decimal separator and at most two decimals.
+
+        Raises:
+            ValueError: If the text is not a valid amount
+        """
+        match = _SIMPLE_AMOUNT.match(text)
+        if match:
+            sign, euros, fraction = match.groups()
+            cents = int(euros) * 100 + int((fraction or "").ljust(2, "0"))
+            return cls(-cents if sign == "-" else cents)
+
+        try:
+            value = Decimal(text.strip().replace(",", "."))
+        except InvalidOperation:
+            value = None
+        # More than two decimals would have to be rounded, so they are rejected instead
+        if value is None or not value.is_finite() or value.as_tuple().exponent < -2:
+            raise ValueError(f"Kann '{text}' nicht als Betrag interpretieren")
+        return cls.from_decimal(value)
+
+    def split(self, parts: int = 2) -> tuple:
+        """Split into `parts` shares that add up exactly to this amount.
+
+        Remainder policy: the leftover cents go to the first shares, one cent
+        each, so the first share is the largest in magnitude. For a 50/50 split
+        of an odd amount the first share carries the odd cent.
+
+        Returns:
+            Tuple of Money shares
+        """
+        quotient, remainder = divmod(abs(self.cents), parts)
+        sign = -1 if self.cents < 0 else 1
+        return tuple(
+            Money(sign * (quotient + 1 if index < remainder else quotient))
+            for index in range(parts)
+        )
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.cents).scaleb(-2)
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        if other == 0 and isinstance(other, int):
+            return self
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return self if self.cents >= 0 else Money(-self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __eq__(self, other):
+        other_cents = _cents_of(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents == other_cents
+
+    def __lt__(self, other):
+        other_cents = _cents_of(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents < other_cents
+
+    def __le__(self, other):
+        other_cents = _cents_of(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents <= other_cents
+
+    def __gt__(self, other):
+        other_cents = _cents_of(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents > other_cents
+
+    def __ge__(self, other):
+        other_cents = _cents_of(other)
+        if other_cents is NotImplemented:
+            return NotImplemented
+        return self.cents >= other_cents
+
+    def __hash__(self):
+        # Whole euros hash like the equal int, consistent with __eq__
+        euros, rest = divmod(self.cents, 100)
+        return hash(euros) if rest == 0 else hash((Money, self.cents))
+
+    def __format__(self, format_spec: str) -> str:
+        if format_spec == ".2f":
+            euros, rest = divmod(abs(self.cents), 100)
+            return f"{'-' if self.cents < 0 else ''}{euros}.{rest:02d}"
+        return format(self.to_decimal(), format_spec)
+
+    def __str__(self):
+        return f"{self:.2f}"
+
+    def __repr__(self):
+        return f"Money('{self:.2f}')"
+
+
+ZERO = Money(0)
+
+
+def _cents_of(value):
+    if isinstance(value, Money):
+        return value.cents
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value * 100
+    return NotImplemented
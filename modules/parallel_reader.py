@@ -0,0 +1,212 @@
+import csv
+import multiprocessing
+import os
+import sys
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from modules.archives import is_compressed
+from modules.csv_reader import BankStatementReader, Transaction
+from modules.money import Money
+
+# Files below this size are parsed serially; starting the pool costs more than it saves
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024
+
+# Ranges per worker, so a slow range does not leave the other workers idle
+RANGES_PER_WORKER = 4
+
+# The parent scans for range boundaries in chunks of this size
+SCAN_CHUNK_BYTES = 1024 * 1024
+
+
+class ParallelStatementReader:
+    """Parses one large DKB export with several processes.
+
+    The header is located once, the bytes after it are split into ranges
+    that end at a newline outside of quoted fields, and each range is parsed
+    in a process pool. The parent never loads the file: it reads lines up
+    to the header and scans for the boundaries chunk by chunk. Workers
+    return compact columns (date ordinals and cents in arrays, names as a
+    per-range string table with indexes) instead of pickled Transaction
+    objects. The parent merges the ranges in file
+    order, so the result and the recorded row issues (with their line
+    numbers) are the same as with BankStatementReader.read_csv.
+
+    Compressed inputs cannot be split into byte ranges and are parsed
+    serially.
+    """
+
+    def __init__(self, reader: BankStatementReader, workers: int = None,
+                 min_parallel_bytes: int = MIN_PARALLEL_BYTES):
+        self.reader = reader
+        self.workers = workers or os.cpu_count() or 1
+        self.min_parallel_bytes = min_parallel_bytes
+
+    def read_csv(self, file_path):
+        if (self.workers < 2 or is_compressed(file_path)
+                or os.path.getsize(file_path) < self.min_parallel_bytes):
+            return self.reader.read_csv(file_path)
+
+        # Only the range boundaries are computed here; the workers read their own bytes
+        with open(file_path, "rb") as file:
+            header_line_index, header, data_start = _find_header(file)
+            ranges = _split_ranges(file, data_start, os.fstat(file.fileno()).st_size,
+                                   self.workers * RANGES_PER_WORKER)
+
+        fieldnames = next(csv.reader([header], delimiter=self.reader.delimiter))
+        tasks = [(file_path, start, end, fieldnames, self.reader.delimiter) for start, end in ranges]
+
+        transactions = []
+        dates = {}
+        # Workers number their lines from the start of their range
+        line_offset = header_line_index + 1
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks)), mp_context=_pool_context()) as pool:
+            for columns in pool.map(_parse_range, tasks):
+                self._merge(columns, transactions, dates, line_offset)
+                line_offset += columns["line_count"]
+        return transactions
+
+    def _merge(self, columns: dict, transactions: list, dates: dict, line_offset: int) -> None:
+        names = [sys.intern(name) for name in columns["names"]]
+        for ordinal, cents, sender, recipient, transaction_type, description in zip(
+            columns["dates"], columns["cents"], columns["senders"], columns["recipients"],
+            columns["types"], columns["descriptions"]
+        ):
+            booking_date = dates.get(ordinal)
+            if booking_date is None:
+                booking_date = dates[ordinal] = date.fromordinal(ordinal)
+            transactions.append(Transaction(
+                booking_date, names[sender], names[recipient], Money(cents), names[transaction_type],
+                description
+            ))
+
+        for line_number, reason, fields in columns["issues"]:
+            self.reader.diagnostics.record(line_offset + line_number, reason, fields)
+
+
+def _pool_context():
+    """Start method for the workers.
+
+    Forking copies locks that other threads of the parent hold at that
+    moment (run.py runs bank and paper in threads of one process), which
+    can leave a worker blocked forever. With other threads running, the
+    workers are started by a forkserver (spawn where there is none);
+    otherwise the platform default is used.
+    """
+    if threading.active_count() == 1:
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _find_header(file) -> tuple:
+    """Return (line index, decoded header line, offset after it) of the "Buchungsdatum" line.
+
+    Reads the binary file line by line from its start.
+    """
+    position = 0
+    for line_index, line in enumerate(file):
+        position += len(line)
+        if b"Buchungsdatum" in line:
+            return line_index, line.decode("utf-8").rstrip("\r\n"), position
+    raise ValueError("Header-Zeile mit Buchungsdatum nicht gefunden")
+
+
+def _split_ranges(file, start: int, size: int, count: int) -> list:
+    """Split the bytes from start to size into up to `count` ranges ending at a newline outside of quotes.
+
+    Returns:
+        List of (start, end) byte offsets
+    """
+    target_size = max(1, (size - start) // count)
+    ranges = []
+    range_start = start
+    while range_start < size:
+        end = _range_end(file, range_start, range_start + target_size, size)
+        ranges.append((range_start, end))
+        range_start = end
+    return ranges
+
+
+def _range_end(file, range_start: int, position: int, size: int) -> int:
+    """Offset after the first newline from position on that lies outside of quotes.
+
+    A newline is outside of quotes if the number of quote characters since
+    range_start is even (escaped quotes come in pairs). Returns size if there
+    is no such newline.
+    """
+    if position >= size:
+        return size
+    file.seek(range_start)
+    offset = range_start
+    quotes = 0
+    while True:
+        chunk = file.read(SCAN_CHUNK_BYTES)
+        if not chunk:
+            return size
+        scanned = 0
+        newline = chunk.find(b"\n", max(0, position - offset))
+        while newline != -1:
+            quotes += chunk.count(b'"', scanned, newline)
+            scanned = newline
+            if quotes % 2 == 0:
+                return offset + newline + 1
+            newline = chunk.find(b"\n", newline + 1)
+        quotes += chunk.count(b'"', scanned)
+        offset += len(chunk)
+
+
+def _parse_range(task: tuple) -> dict:
+    """Worker: parse one byte range into columns.
+
+    Line numbers of recorded issues and "line_count" (newlines in the range)
+    are relative to the start of the range; the parent adds the offset.
+    """
+    file_path, start, end, fieldnames, delimiter = task
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        raw = file.read(end - start)
+    line_count = raw.count(b"\n")
+    text = raw.decode("utf-8")
+    del raw
+    if "\r" in text:
+        # Same universal newline handling as reading the file in text mode
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if text.endswith("\n"):
+        text = text[:-1]
+
+    reader = BankStatementReader(delimiter=delimiter)
+    columns = {
+        "dates": array("l"), "cents": array("q"),
+        "senders": array("l"), "recipients": array("l"), "types": array("l"),
+        "descriptions": [], "names": [], "issues": [], "line_count": line_count,
+    }
+    name_ids = {}
+
+    def name_id(name):
+        index = name_ids.get(name)
+        if index is None:
+            index = name_ids[name] = len(columns["names"])
+            columns["names"].append(name)
+        return index
+
+    csv_reader = csv.DictReader(text.split("\n"), fieldnames=fieldnames, delimiter=delimiter)
+    for row in csv_reader:
+        # line_num counts the lines of this range; the header is not part of it
+        line_number = csv_reader.line_num
+        if not reader._is_valid_transaction_row(row, line_number):
+            continue
+        transaction = reader._create_transaction_from_row(row)
+        columns["dates"].append(transaction.date.toordinal())
+        columns["cents"].append(transaction.amount.cents)
+        columns["senders"].append(name_id(transaction.sender))
+        columns["recipients"].append(name_id(transaction.recipient))
+        columns["types"].append(name_id(transaction.transaction_type))
+        columns["descriptions"].append(transaction.description)
+
+    columns["issues"] = [
+        (issue.line_number, issue.reason, issue.fields) for issue in reader.diagnostics.issues
+    ]
+    return columns
@@ -0,0 +1,168 @@
+import sys
+import threading
+import tracemalloc
+
+from modules.archives import input_size
+
+MODE_AUTO = "auto"
+MODE_MEMORY = "memory"
+MODE_STREAMING = "streaming"
+MODES = (MODE_AUTO, MODE_MEMORY, MODE_STREAMING)
+
+DEFAULT_MEMORY_BUDGET_MB = 512
+
+# Peak memory of the in-memory path per byte of CSV input (file content,
+# Transaction objects, records and sort lists), measured on DKB exports
+MEMORY_PER_INPUT_BYTE = 10
+
+# Rough size of one buffered item in the streaming path's sort runs
+BYTES_PER_BUFFERED_ITEM = 1000
+
+
+class ExecutionPlan:
+    """Chosen execution path for one run.
+
+    Attributes:
+        mode: MODE_MEMORY or MODE_STREAMING
+        input_bytes: Total size of the input files
+        estimated_bytes: Estimated peak memory of the in-memory path
+        budget_bytes: Configured memory budget
+        forced: True if the mode was set in the configuration instead of chosen
+    """
+
+    def __init__(self, mode: str, input_bytes: int, estimated_bytes: int, budget_bytes: int,
+                 forced: bool = False):
+        self.mode = mode
+        self.input_bytes = input_bytes
+        self.estimated_bytes = estimated_bytes
+        self.budget_bytes = budget_bytes
+        self.forced = forced
+
+    @property
+    def run_size(self) -> int:
+        """Items per sorted run the streaming path keeps in memory before spilling to disk.
+
+        Four sorters share the budget (records, ignored records and the income
+        and expense rows of the text report).
+        """
+        return max(1000, self.budget_bytes // (4 * BYTES_PER_BUFFERED_ITEM))
+
+    def describe(self) -> str:
+        reason = "konfiguriert" if self.forced else (
+            f"geschätzt {format_bytes(self.estimated_bytes)} "
+            f"{'>' if self.mode == MODE_STREAMING else '<='} Budget {format_bytes(self.budget_bytes)}"
+        )
+        label = "Streaming" if self.mode == MODE_STREAMING else "im Speicher"
+        return f"Ausführungsplan: {label} (Eingabe {format_bytes(self.input_bytes)}, {reason})"
+
+
+def plan_execution(paths: list, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                   mode: str = MODE_AUTO) -> ExecutionPlan:
+    """Choose between the in-memory and the streaming path.
+
+    Args:
+        paths: Input files of the run (compressed ones count with their uncompressed size)
+        memory_budget_mb: Memory the run may use
+        mode: MODE_AUTO to decide by input size, or a fixed mode
+
+    Returns:
+        ExecutionPlan
+
+    Raises:
+        ValueError: If mode is unknown
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unbekannter Ausführungsmodus '{mode}'. Erlaubt: {', '.join(MODES)}")
+
+    input_bytes = sum(input_size(path) for path in paths)
+    estimated_bytes = input_bytes * MEMORY_PER_INPUT_BYTE
+    budget_bytes = int(memory_budget_mb * 1024 * 1024)
+
+    if mode != MODE_AUTO:
+        return ExecutionPlan(mode, input_bytes, estimated_bytes, budget_bytes, forced=True)
+
+    chosen = MODE_MEMORY if estimated_bytes <= budget_bytes else MODE_STREAMING
+    return ExecutionPlan(chosen, input_bytes, estimated_bytes, budget_bytes)
+
+
+class MemoryTracker:
+    """Measures the peak memory of a block.
+
+    With trace=True the Python heap is traced with tracemalloc (exact for the
+    block, but allocations get several times slower). Otherwise the peak
+    resident set size of the whole process so far is reported, which costs
+    nothing but is not limited to the block; describe() labels it as such.
+
+    Trackers may run at the same time in several threads (run.py). Tracing
+    is process-wide, so it is started by the first tracing block and stopped
+    by the last one, and the peak of overlapping blocks covers all of them;
+    describe() says so.
+    """
+
+    _lock = threading.Lock()
+    _active = set()
+    _started_tracing = False
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.peak_bytes = None
+        self.overlapped = False
+
+    def __enter__(self):
+        cls = MemoryTracker
+        with cls._lock:
+            if cls._active:
+                self.overlapped = True
+                for tracker in cls._active:
+                    tracker.overlapped = True
+            if self.trace:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    cls._started_tracing = True
+                elif not any(tracker.trace for tracker in cls._active):
+                    # Resetting while another block traces would lose its peak
+                    tracemalloc.reset_peak()
+            cls._active.add(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        cls = MemoryTracker
+        with cls._lock:
+            cls._active.discard(self)
+            if self.trace:
+                self.peak_bytes = tracemalloc.get_traced_memory()[1]
+                if cls._started_tracing and not any(tracker.trace for tracker in cls._active):
+                    tracemalloc.stop()
+                    cls._started_tracing = False
+            else:
+                self.peak_bytes = _peak_rss_bytes()
+        return False
+
+    def describe(self) -> str:
+        if self.peak_bytes is None:
+            return "Spitzenspeicher: unbekannt"
+        shared = ", mit gleichzeitig laufender Abrechnung" if self.overlapped else ""
+        if self.trace:
+            return f"Spitzenspeicher: {format_bytes(self.peak_bytes)} (tracemalloc{shared})"
+        return f"Prozess-Spitze: {format_bytes(self.peak_bytes)} (RSS seit Programmstart{shared})"
+
+
+def format_bytes(value: int) -> str:
+    """Format a byte count, e.g. "12,3 MB"."""
+    if value < 1024:
+        return f"{value} B"
+    for unit in ("KB", "MB", "GB"):
+        value /= 1024
+        if value < 1024 or unit == "GB":
+            return f"{value:.1f} {unit}".replace(".", ",")
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,213 @@
+import json
+import math
+import os
+from datetime import date, timedelta
+
+from modules.counterparty import canonical_name
+from modules.money import Money
+
+STATE_VERSION = 1
+STATE_FILENAME = "wiederkehrend.json"
+
+# Amounts within this relative distance belong to the same series
+AMOUNT_TOLERANCE = 0.1
+_BAND_BASE = math.log(1 + AMOUNT_TOLERANCE)
+
+# (label, days, tolerance in days, minimum occurrences)
+PERIODS = (
+    ("wöchentlich", 7, 1, 4),
+    ("monatlich", 30, 4, 3),
+    ("vierteljährlich", 91, 10, 3),
+    ("halbjährlich", 182, 14, 2),
+    ("jährlich", 365, 14, 2),
+)
+
+# Share of the gaps that must match the period (allows one missed or moved booking)
+MIN_MATCHING_GAPS = 0.75
+
+# Kept history per series, and how long a series may be silent before it is dropped
+MAX_OCCURRENCES = 36
+MAX_AGE_DAYS = 400
+
+
+class RecurringPayment:
+    """A detected recurring payment.
+
+    Attributes:
+        counterparty: Most recent spelling of the counterparty
+        is_income: True for recurring income (e.g. rent received)
+        period: Label of the detected period, e.g. "monatlich"
+        amount: Amount of the most recent booking (signed)
+        count: Number of bookings in the stored history
+        last_date: Date of the most recent booking
+        next_date: Expected date of the next booking
+    """
+
+    __slots__ = ("counterparty", "is_income", "period", "amount", "count", "last_date", "next_date")
+
+    def __init__(self, counterparty: str, is_income: bool, period: str, amount: Money, count: int,
+                 last_date: date, next_date: date):
+        self.counterparty = counterparty
+        self.is_income = is_income
+        self.period = period
+        self.amount = amount
+        self.count = count
+        self.last_date = last_date
+        self.next_date = next_date
+
+
+class _Series:
+    """Bookings of one counterparty in one amount band, keyed by date ordinal."""
+
+    __slots__ = ("counterparty", "kind", "reference_cents", "occurrences", "last_ordinal")
+
+    def __init__(self, counterparty: str, kind: str, reference_cents: int):
+        self.counterparty = counterparty
+        self.kind = kind
+        self.reference_cents = reference_cents
+        self.occurrences = {}
+        self.last_ordinal = 0
+
+    def add(self, ordinal: int, cents: int, counterparty: str) -> None:
+        if ordinal >= self.last_ordinal:
+            # The most recent booking names the series
+            self.last_ordinal = ordinal
+            self.counterparty = counterparty
+        self.occurrences[ordinal] = cents
+
+
+class RecurringDetector:
+    """Detects recurring payments across runs.
+
+    Bookings are grouped in a hash index by (canonical counterparty, kind,
+    amount band); the band is logarithmic, so a lookup only checks the band
+    itself and its two neighbours. Periodicity comes from the gaps between
+    the sorted booking dates of a series, no pairs of bookings are compared.
+    The series are kept in a state file in the output folder, so each run
+    only adds its new bookings and the history grows over the months.
+    Overlapping statements are harmless: a series stores one booking per date.
+    """
+
+    def __init__(self, state_path: str = None):
+        self.state_path = state_path
+        self._series = {}
+        if state_path:
+            self._load()
+
+    def add(self, transaction) -> None:
+        """Add a kept transaction."""
+        if transaction.is_income:
+            kind, counterparty = "income", transaction.sender
+        else:
+            kind, counterparty = "expense", transaction.recipient
+        cents = abs(transaction.amount.cents)
+        if not cents or not counterparty.strip():
+            return
+
+        counterparty = counterparty.strip()
+        series = self._find_series(canonical_name(counterparty), kind, cents, counterparty)
+        series.add(transaction.date.toordinal(), transaction.amount.cents, counterparty)
+
+    def detect(self) -> list:
+        """Return the active recurring payments, sorted by counterparty.
+
+        A series is active if its last booking is at most two periods older
+        than the newest booking of all series.
+        """
+        newest = max((series.last_ordinal for series in self._series.values()), default=0)
+        payments = []
+        for series in self._series.values():
+            payment = _detect_period(series, newest)
+            if payment is not None:
+                payments.append(payment)
+        payments.sort(key=lambda payment: (payment.counterparty.lower(), payment.is_income))
+        return payments
+
+    def save(self) -> None:
+        """Write the series to the state file, dropping long silent series and old bookings."""
+        if not self.state_path:
+            return
+        newest = max((series.last_ordinal for series in self._series.values()), default=0)
+        state_series = []
+        for (canonical, kind, band), series in self._series.items():
+            if newest - series.last_ordinal > MAX_AGE_DAYS:
+                continue
+            ordinals = sorted(series.occurrences)[-MAX_OCCURRENCES:]
+            state_series.append({
+                "canonical": canonical,
+                "kind": kind,
+                "band": band,
+                "counterparty": series.counterparty,
+                "reference_cents": series.reference_cents,
+                "occurrences": [
+                    [date.fromordinal(ordinal).isoformat(), series.occurrences[ordinal]]
+                    for ordinal in ordinals
+                ],
+            })
+
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": STATE_VERSION, "series": state_series}, file, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def _find_series(self, canonical: str, kind: str, cents: int, counterparty: str) -> _Series:
+        band = round(math.log(cents) / _BAND_BASE)
+        for candidate in (band, band - 1, band + 1):
+            series = self._series.get((canonical, kind, candidate))
+            if series is not None and abs(cents - series.reference_cents) <= series.reference_cents * AMOUNT_TOLERANCE:
+                return series
+
+        series = _Series(counterparty, kind, cents)
+        self._series[(canonical, kind, band)] = series
+        return series
+
+    def _load(self) -> None:
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            # Unreadable state only costs the history
+            return
+        if state.get("version") != STATE_VERSION:
+            return
+
+        for data in state.get("series", []):
+            series = _Series(data["counterparty"], data["kind"], data["reference_cents"])
+            for iso_date, cents in data["occurrences"]:
+                series.add(date.fromisoformat(iso_date).toordinal(), cents, data["counterparty"])
+            if series.occurrences:
+                self._series[(data["canonical"], data["kind"], data["band"])] = series
+
+
+def _detect_period(series: _Series, newest: int):
+    """Classify a series by the median gap between its booking dates, or return None."""
+    ordinals = sorted(series.occurrences)
+    if len(ordinals) < 2:
+        return None
+    gaps = [later - earlier for earlier, later in zip(ordinals, ordinals[1:])]
+    median_gap = sorted(gaps)[len(gaps) // 2]
+
+    for label, days, tolerance, min_occurrences in PERIODS:
+        if abs(median_gap - days) > tolerance:
+            continue
+        if len(ordinals) < min_occurrences:
+            return None
+        matching = sum(1 for gap in gaps if abs(gap - days) <= tolerance)
+        if matching < MIN_MATCHING_GAPS * len(gaps):
+            return None
+        last = ordinals[-1]
+        if newest - last > 2 * days + tolerance:
+            return None
+        return RecurringPayment(
+            series.counterparty,
+            series.kind == "income",
+            label,
+            Money(series.occurrences[last]),
+            len(ordinals),
+            date.fromordinal(last),
+            date.fromordinal(last) + timedelta(days=days),
+        )
+    return None
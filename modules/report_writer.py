@@ -1,15 +1,24 @@
 import csv
 import os
-import shutil
 from datetime import datetime
 
+from modules.exchange_rates import BASE_CURRENCY
+from modules.formatting import format_amount, format_date, format_euro, format_short_date
+from modules.locking import ARCHIVE_DIRNAME, directory_lock, sweep_old_outputs
+from modules.money import Money, ZERO
+from modules.sinks import OUTPUT_BUFFER_BYTES, SECTION_TRANSACTIONS, resolve_sections
+
+# Reports PersonReportWriter can write, each one file per month
+PERSON_REPORT_FORMATS = ("text", "csv")
+
 
 class BaseReportWriter:
     """Base class for all report writers with common functionality."""
 
-    def __init__(self, output_directory: str):
+    def __init__(self, output_directory: str, archive_old_files: bool = True):
         self.output_directory = output_directory
-        self.archive_directory = os.path.join(self.output_directory, "archiv")
+        self.archive_old_files = archive_old_files
+        self.archive_directory = os.path.join(self.output_directory, ARCHIVE_DIRNAME)
 
     def _create_output_directory(self, year: str, month: str) -> str:
         """Create output directory with YYYY-MM format.
@@ -29,26 +38,20 @@ class BaseReportWriter:
     def _archive_old_files(self, file_prefix: str, extensions: list):
         """Archive old files matching prefix and extensions.
 
+        See modules.locking.sweep_old_outputs. Nothing is moved if the writer was created with archive_old_files=False.
+
         Args:
             file_prefix: Prefix of files to archive (e.g., "monatsabrechnung_")
             extensions: List of file extensions to archive (e.g., [".txt", ".csv"])
         """
-        if not os.path.exists(self.output_directory):
+        if not self.archive_old_files:
             return
 
-        os.makedirs(self.archive_directory, exist_ok=True)
-
-        for filename in os.listdir(self.output_directory):
-            if filename.startswith(file_prefix) and any(filename.endswith(ext) for ext in extensions):
-                old_file = os.path.join(self.output_directory, filename)
-                archive_file = os.path.join(self.archive_directory, filename)
-
-                if os.path.isfile(old_file):
-                    shutil.move(old_file, archive_file)
-                    print(f"Archiviert: {filename}")
+        for filename in sweep_old_outputs(self.output_directory, [(file_prefix, extensions)]):
+            print(f"Archiviert: {filename}")
 
     def _generate_filename(self, prefix: str, suffix: str, extension: str) -> str:
-        """Generate filename with timestamp.
+        """Generate filename from prefix and suffix.
 
         Args:
             prefix: File prefix (e.g., "monatsabrechnung")
@@ -60,7 +63,7 @@ class BaseReportWriter:
         """
         return f"{prefix}_{suffix}{extension}"
 
-    def _format_currency(self, amount: float) -> str:
+    def _format_currency(self, amount: Money) -> str:
         """Format amount with German currency formatting (comma as decimal separator).
 
         Args:
@@ -69,29 +72,68 @@ class BaseReportWriter:
         Returns:
             Formatted currency string
         """
-        return f"{amount:.2f} €".replace(".", ",")
+        return format_euro(amount)
 
 
 class BankReportWriter(BaseReportWriter):
     """Report writer for bank statement processing."""
 
-    def generate_report(self, settlement_result: dict, transactions: list) -> str:
+    # Old reports in the output directory that are archived before writing
+    ARCHIVE_PATTERN = ("monatsabrechnung_", [".txt"])
+
+    def generate_report(self, settlement_result: dict, transactions: list, recurring: list = None,
+                        sections=None) -> str:
         """Generate bank statement report.
 
         Args:
             settlement_result: Dictionary with settlement results
             transactions: List of transaction objects
+            recurring: List of detected RecurringPayment objects
+            sections: Report sections (see modules.sinks), None for all
 
         Returns:
             Path to the generated report file
         """
-        # Archive old files first
-        self._archive_old_files("monatsabrechnung_", [".txt"])
+        sections = resolve_sections(sections)
 
-        # Determine date range and folder
+        # Determine date range
         start_date = min(t.date for t in transactions)
         end_date = max(t.date for t in transactions)
 
+        # The transaction list is the only section that needs the rows sorted
+        income_rows = expense_rows = ()
+        if SECTION_TRANSACTIONS in sections:
+            income_transactions = sorted((t for t in transactions if t.is_income), key=lambda x: x.date)
+            expense_transactions = sorted((t for t in transactions if t.is_expense), key=lambda x: x.date)
+            income_rows = ((t.date, t.sender, t.amount) for t in income_transactions)
+            expense_rows = ((t.date, t.recipient, t.amount) for t in expense_transactions)
+
+        return self.generate_report_from_rows(
+            settlement_result, start_date, end_date, income_rows, expense_rows, recurring, sections
+        )
+
+    def generate_report_from_rows(self, settlement_result: dict, start_date, end_date,
+                                  income_rows, expense_rows, recurring: list = None,
+                                  sections=None) -> str:
+        """Generate bank statement report from already sorted rows.
+
+        Args:
+            settlement_result: Dictionary with settlement results
+            start_date: First transaction date
+            end_date: Last transaction date
+            income_rows: Iterable of (date, sender, amount), sorted by date
+            expense_rows: Iterable of (date, recipient, amount), sorted by date
+            recurring: List of detected RecurringPayment objects
+            sections: Report sections (see modules.sinks), None for all
+
+        Returns:
+            Path to the generated report file
+        """
+        sections = resolve_sections(sections)
+
+        # Archive old files first
+        self._archive_old_files(*self.ARCHIVE_PATTERN)
+
         year = start_date.strftime("%Y")
         month = start_date.strftime("%m")
         folder_path = self._create_output_directory(year, month)
@@ -104,11 +146,14 @@ class BankReportWriter(BaseReportWriter):
         )
         filepath = os.path.join(folder_path, filename)
 
-        # Write report
-        with open(filepath, "w", encoding="utf-8") as file:
+        # Write report (the month lock keeps overlapping runs from interleaving)
+        with directory_lock(folder_path), open(filepath, "w", encoding="utf-8") as file:
             self._write_header(file)
             self._write_summary(file, settlement_result)
-            self._write_transaction_details(file, transactions)
+            if SECTION_TRANSACTIONS in sections:
+                self._write_transaction_details(file, income_rows, expense_rows)
+            if recurring:
+                self._write_recurring_payments(file, recurring)
             self._write_settlement_instruction(file, settlement_result)
 
         return filepath
@@ -130,40 +175,43 @@ class BankReportWriter(BaseReportWriter):
         file.write(f"Pro Person:         {result['amount_per_person']:>10.2f} €\n")
         file.write("\n")
 
-    def _write_transaction_details(self, file, transactions):
+    def _write_transaction_details(self, file, income_rows, expense_rows):
         """Write transaction details section."""
         file.write("ALLE RELEVANTEN TRANSAKTIONEN:\n")
         file.write("-" * 60 + "\n")
 
         # Income transactions
-        income_transactions = [t for t in transactions if t.is_income]
-        if income_transactions:
-            file.write("EINNAHMEN:\n")
-            income_transactions.sort(key=lambda x: x.date)
-            for transaction in income_transactions:
-                file.write(
-                    f"{transaction.date.strftime('%d.%m.%y')} | "
-                    f"{transaction.sender:<30} | "
-                    f"+{abs(transaction.amount):>7.2f} €\n"
-                )
-            file.write(
-                f"\nSumme Einnahmen: +{sum(abs(t.amount) for t in income_transactions):>7.2f} €\n\n"
-            )
+        self._write_transaction_rows(file, income_rows, "EINNAHMEN", "Summe Einnahmen", "+")
 
         # Expense transactions
-        expense_transactions = [t for t in transactions if t.is_expense]
-        if expense_transactions:
-            file.write("AUSGABEN:\n")
-            expense_transactions.sort(key=lambda x: x.date)
-            for transaction in expense_transactions:
-                file.write(
-                    f"{transaction.date.strftime('%d.%m.%y')} | "
-                    f"{transaction.recipient:<30} | "
-                    f"-{abs(transaction.amount):>7.2f} €\n"
-                )
+        self._write_transaction_rows(file, expense_rows, "AUSGABEN", "Summe Ausgaben", "-")
+
+    def _write_transaction_rows(self, file, rows, title, total_label, sign):
+        """Write one block of (date, counterparty, amount) rows; nothing if there are none."""
+        total = None
+        for date, counterparty, amount in rows:
+            if total is None:
+                file.write(f"{title}:\n")
+                total = ZERO
+            amount = abs(amount)
+            total += amount
+            file.write(f"{format_short_date(date)} | {counterparty:<30} | {sign}{amount:>7.2f} €\n")
+
+        if total is not None:
+            file.write(f"\n{total_label}: {sign}{total:>7.2f} €\n\n")
+
+    def _write_recurring_payments(self, file, recurring):
+        """Write recurring payments section."""
+        file.write("WIEDERKEHRENDE ZAHLUNGEN:\n")
+        file.write("-" * 60 + "\n")
+        for payment in recurring:
+            sign = "+" if payment.is_income else "-"
             file.write(
-                f"\nSumme Ausgaben: -{sum(abs(t.amount) for t in expense_transactions):>7.2f} €\n\n"
+                f"{payment.counterparty[:30]:<30} | {payment.period:<15} | "
+                f"{sign}{abs(payment.amount):>7.2f} € | {payment.count:>2}x | "
+                f"nächste ca. {format_short_date(payment.next_date)}\n"
             )
+        file.write("\n")
 
     def _write_settlement_instruction(self, file, result):
         """Write settlement instruction section."""
@@ -176,41 +224,65 @@ class BankReportWriter(BaseReportWriter):
 class PersonReportWriter(BaseReportWriter):
     """Report writer for personal expense settlement."""
 
-    def __init__(self, output_directory: str):
-        super().__init__(output_directory)
+    ARCHIVE_PREFIX = "ausgleich_"
+    EXTENSIONS = {"text": ".txt", "csv": ".csv"}
+
+    def __init__(self, output_directory: str, archive_old_files: bool = True):
+        super().__init__(output_directory, archive_old_files)
         self.delimiter = ";"
 
-    def generate_reports(self, settlement_result: dict, expenses: list, year: str, month: str) -> dict:
-        """Generate personal expense settlement reports (text and CSV).
+    @classmethod
+    def archive_pattern(cls, formats) -> tuple:
+        """(prefix, extensions) of the old reports archived before writing the given formats."""
+        return cls.ARCHIVE_PREFIX, [cls.EXTENSIONS[report] for report in PERSON_REPORT_FORMATS if report in formats]
+
+    def generate_reports(self, settlement_result: dict, expenses: list, year: str, month: str,
+                         formats=PERSON_REPORT_FORMATS) -> dict:
+        """Generate personal expense settlement reports.
 
         Args:
             settlement_result: Dictionary with settlement results
             expenses: List of expense objects
             year: Year string
             month: Month string
+            formats: Reports to write, any of "text" and "csv"
 
         Returns:
-            Dictionary with paths to generated reports
+            Dictionary with paths to generated reports (only the requested ones)
+
+        Raises:
+            ValueError: If a format is unknown
         """
-        # Archive old files first
-        self._archive_old_files("ausgleich_", [".txt", ".csv"])
+        unknown = [report for report in formats if report not in PERSON_REPORT_FORMATS]
+        if unknown:
+            raise ValueError(
+                f"Unbekannter Report '{unknown[0]}'. Erlaubt: {', '.join(PERSON_REPORT_FORMATS)}"
+            )
+        generators = {
+            "text": self._generate_text_report,
+            "csv": self._generate_csv_report,
+        }
+        requested = [report for report in PERSON_REPORT_FORMATS if report in formats]
+
+        # Archive old files first (only the kinds written again)
+        self._archive_old_files(*self.archive_pattern(requested))
 
         # Create output folder
         folder_path = self._create_output_directory(year, month)
 
-        # Generate both text and CSV reports
-        text_path = self._generate_text_report(settlement_result, expenses, folder_path)
-        csv_path = self._generate_csv_report(settlement_result, expenses, folder_path)
+        # One file per report and month, a rerun replaces it
+        suffix = f"{year}-{month}"
+        report_paths = {}
+        with directory_lock(folder_path):
+            for report in requested:
+                report_paths[report] = generators[report](settlement_result, expenses, folder_path, suffix)
 
-        return {
-            'text': text_path,
-            'csv': csv_path
-        }
+        return report_paths
 
-    def _generate_text_report(self, settlement_result: dict, expenses: list, folder_path: str) -> str:
+    def _generate_text_report(self, settlement_result: dict, expenses: list, folder_path: str,
+                              suffix: str) -> str:
         """Generate text report for personal expenses."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self._generate_filename("ausgleich", timestamp, ".txt")
+        filename = self._generate_filename("ausgleich", suffix, ".txt")
         filepath = os.path.join(folder_path, filename)
 
         with open(filepath, "w", encoding="utf-8") as file:
@@ -239,7 +311,7 @@ class PersonReportWriter(BaseReportWriter):
                 file.write("PERSON A:\n")
                 for expense in a_expenses:
                     comment = expense.comment if expense.comment else "Keine Beschreibung"
-                    file.write(f"{comment:<40} | {float(expense.amount):>7.2f} €\n")
+                    file.write(f"{comment:<40} | {expense.amount:>7.2f} €{self._original_amount_note(expense)}\n")
                 file.write(f"\nSumme Person A: {settlement_result['person_a_total']:>7.2f} €\n\n")
 
             # Person M's expenses
@@ -248,7 +320,7 @@ class PersonReportWriter(BaseReportWriter):
                 file.write("PERSON M:\n")
                 for expense in m_expenses:
                     comment = expense.comment if expense.comment else "Keine Beschreibung"
-                    file.write(f"{comment:<40} | {float(expense.amount):>7.2f} €\n")
+                    file.write(f"{comment:<40} | {expense.amount:>7.2f} €{self._original_amount_note(expense)}\n")
                 file.write(f"\nSumme Person M: {settlement_result['person_m_total']:>7.2f} €\n\n")
 
             # Reimbursement section
@@ -267,59 +339,84 @@ class PersonReportWriter(BaseReportWriter):
 
         return filepath
 
-    def _generate_csv_report(self, settlement_result: dict, expenses: list, folder_path: str) -> str:
-        """Generate CSV report for personal expenses."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self._generate_filename("ausgleich", timestamp, ".csv")
-        filepath = os.path.join(folder_path, filename)
+    def _original_amount_note(self, expense) -> str:
+        """Text report suffix with original amount, currency and rate date ("" for euro expenses)."""
+        if expense.currency == BASE_CURRENCY:
+            return ""
+        return f" ({expense.original_amount:.2f} {expense.currency}, Kurs vom {format_date(expense.rate_date)})"
 
-        with open(filepath, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile, delimiter=self.delimiter)
+    def _generate_csv_report(self, settlement_result: dict, expenses: list, folder_path: str,
+                             suffix: str) -> str:
+        """Generate CSV report for personal expenses.
 
-            # Header
-            writer.writerow(["SETTLEMENT PRIVATAUSGABEN - DETAILANALYSE"])
-            writer.writerow(["Erstellt am:", datetime.now().strftime("%d.%m.%Y")])
-            writer.writerow([])
+        The sections are row generators written with one writerows call each,
+        so the expense list is never copied per person. If any expense was
+        converted from another currency, the expense rows get columns for
+        original amount, currency and rate date.
+        """
+        filename = self._generate_filename("ausgleich", suffix, ".csv")
+        filepath = os.path.join(folder_path, filename)
 
-            # Summary section
-            writer.writerow(["ZUSAMMENFASSUNG"])
-            writer.writerow(["Person A:", self._format_currency(settlement_result['person_a_total'])])
-            writer.writerow(["Person M:", self._format_currency(settlement_result['person_m_total'])])
-            writer.writerow(["Gesamtausgaben:", self._format_currency(settlement_result['grand_total'])])
-            writer.writerow(["Pro Person (50/50):", self._format_currency(settlement_result['amount_per_person'])])
-            writer.writerow([])
+        with open(filepath, "w", newline="", encoding="utf-8", buffering=OUTPUT_BUFFER_BYTES) as csvfile:
+            writer = csv.writer(csvfile, delimiter=self.delimiter)
+            writer.writerows(self._csv_summary_rows(settlement_result))
 
             # Detailed expenses by person
-            writer.writerow(["AUSGABEN NACH PERSON"])
-            writer.writerow([])
+            writer.writerows([["AUSGABEN NACH PERSON"], []])
+            foreign = any(expense.currency != BASE_CURRENCY for expense in expenses)
+            writer.writerows(self._csv_person_rows(expenses, 'a', foreign))
+            writer.writerows(self._csv_person_rows(expenses, 'm', foreign))
 
-            # Person A
-            a_expenses = [e for e in expenses if e.person == 'a']
-            if a_expenses:
-                writer.writerow(["PERSON A"])
-                writer.writerow(["Beschreibung", "Betrag"])
-                for expense in a_expenses:
-                    comment = expense.comment if expense.comment else "Keine Beschreibung"
-                    writer.writerow([comment, self._format_currency(float(expense.amount))])
-                writer.writerow([])
+            writer.writerows(self._csv_reimbursement_rows(settlement_result['reimbursement']))
 
-            # Person M
-            m_expenses = [e for e in expenses if e.person == 'm']
-            if m_expenses:
-                writer.writerow(["PERSON M"])
-                writer.writerow(["Beschreibung", "Betrag"])
-                for expense in m_expenses:
-                    comment = expense.comment if expense.comment else "Keine Beschreibung"
-                    writer.writerow([comment, self._format_currency(float(expense.amount))])
-                writer.writerow([])
+        return filepath
 
-            # Reimbursement section
-            writer.writerow(["AUSGLEICHSZAHLUNG"])
-            reimbursement = settlement_result['reimbursement']
-            if reimbursement['amount'] > 0 and reimbursement['payer']:
-                writer.writerow([f"Person {reimbursement['payer'].upper()} zahlt an Person {reimbursement['recipient'].upper()}:", self._format_currency(reimbursement['amount'])])
+    def _csv_summary_rows(self, settlement_result: dict):
+        # Header
+        yield ["SETTLEMENT PRIVATAUSGABEN - DETAILANALYSE"]
+        yield ["Erstellt am:", datetime.now().strftime("%d.%m.%Y")]
+        yield []
+
+        # Summary section
+        yield ["ZUSAMMENFASSUNG"]
+        yield ["Person A:", self._format_currency(settlement_result['person_a_total'])]
+        yield ["Person M:", self._format_currency(settlement_result['person_m_total'])]
+        yield ["Gesamtausgaben:", self._format_currency(settlement_result['grand_total'])]
+        yield ["Pro Person (50/50):", self._format_currency(settlement_result['amount_per_person'])]
+        yield []
+
+    def _csv_person_rows(self, expenses: list, person: str, foreign: bool = False):
+        """Rows of one person's expenses; nothing if the person has none.
+
+        With foreign set, each row also has original amount, currency and
+        rate date (empty for euro expenses).
+        """
+        started = False
+        for expense in expenses:
+            if expense.person != person:
+                continue
+            if not started:
+                started = True
+                yield [f"PERSON {person.upper()}"]
+                if foreign:
+                    yield ["Beschreibung", "Betrag", "Originalbetrag", "Währung", "Kursdatum"]
+                else:
+                    yield ["Beschreibung", "Betrag"]
+            comment = expense.comment if expense.comment else "Keine Beschreibung"
+            if not foreign:
+                yield (comment, self._format_currency(expense.amount))
+            elif expense.currency == BASE_CURRENCY:
+                yield (comment, self._format_currency(expense.amount), "", "", "")
             else:
-                writer.writerow(["Jede Person zahlt:", "0,00 €"])
-            writer.writerow(["Ausgleichsbetrag:", self._format_currency(reimbursement['amount'])])
-
-        return filepath
+                yield (comment, self._format_currency(expense.amount), format_amount(expense.original_amount),
+                       expense.currency, format_date(expense.rate_date))
+        if started:
+            yield []
+
+    def _csv_reimbursement_rows(self, reimbursement: dict):
+        yield ["AUSGLEICHSZAHLUNG"]
+        if reimbursement['amount'] > 0 and reimbursement['payer']:
+            yield [f"Person {reimbursement['payer'].upper()} zahlt an Person {reimbursement['recipient'].upper()}:", self._format_currency(reimbursement['amount'])]
+        else:
+            yield ["Jede Person zahlt:", "0,00 €"]
+        yield ["Ausgleichsbetrag:", self._format_currency(reimbursement['amount'])]
@@ -0,0 +1,330 @@
+import re
+from datetime import date
+
+from modules.counterparty import canonical_name
+from modules.fuzzy import TrigramIndex
+from modules.money import Money
+
+INCLUDE = "include"
+IGNORE = "ignore"
+
+ACTIONS = (INCLUDE, IGNORE)
+APPLIES_TO = ("income", "expense", "all")
+TEXT_FIELDS = ("counterparty", "description", "transaction_type")
+
+
+class Rule:
+    """A single filter rule.
+
+    All given conditions must match (AND). Text conditions are regular
+    expressions (case-insensitive, searched anywhere in the field), amount
+    conditions compare against the absolute amount, date conditions are
+    inclusive. The counterparty condition also matches if canonical_pattern
+    (by default the counterparty pattern itself) occurs in the canonical
+    name of the counterparty.
+    """
+
+    def __init__(self, name: str, action: str, applies_to: str = "all", patterns: dict = None,
+                 amount_min: Money = None, amount_max: Money = None,
+                 date_from: date = None, date_to: date = None, source: str = "rules",
+                 canonical_pattern: str = None):
+        self.name = name
+        self.action = action
+        self.applies_to = applies_to
+        self.patterns = patterns or {}
+        self.canonical_pattern = canonical_pattern or self.patterns.get("counterparty")
+        self.amount_min = amount_min
+        self.amount_max = amount_max
+        self.date_from = date_from
+        self.date_to = date_to
+        self.source = source
+        self.hits = 0
+
+    def applies(self, kind: str) -> bool:
+        return self.applies_to in ("all", kind)
+
+    def matches_predicates(self, transaction) -> bool:
+        """Check the numeric and date conditions of the rule."""
+        if self.amount_min is not None or self.amount_max is not None:
+            amount = abs(transaction.amount)
+            if self.amount_min is not None and amount < self.amount_min:
+                return False
+            if self.amount_max is not None and amount > self.amount_max:
+                return False
+        if self.date_from is not None and transaction.date < self.date_from:
+            return False
+        if self.date_to is not None and transaction.date > self.date_to:
+            return False
+        return True
+
+
+# Fields whose values repeat across transactions; their regex hits are cached
+# per distinct value. Descriptions are mostly unique and not cached.
+# "canonical" is the canonical counterparty name, matched in addition to the raw one.
+CACHED_FIELDS = ("counterparty", "canonical", "transaction_type")
+HIT_CACHE_SIZE = 65536
+
+# Escapes and constructs that refer to other groups by number or name;
+# escaped backslashes are skipped, so r"\\1" (a literal backslash, then 1) is allowed
+_BACK_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?P=|\(\?\()")
+
+
+class _CompiledRuleSet:
+    """Rules for one transaction kind, with one combined regex per text field."""
+
+    def __init__(self, rules: list):
+        self.rules = rules
+        self.unconditional = [rule for rule in rules if not rule.patterns]
+        self.field_matchers = {}
+        self._hit_cache = {}
+
+        for field in TEXT_FIELDS:
+            self._add_matcher(field, {
+                index: rule.patterns[field] for index, rule in enumerate(rules) if field in rule.patterns
+            })
+        self._add_matcher("canonical", {
+            index: rule.canonical_pattern for index, rule in enumerate(rules) if "counterparty" in rule.patterns
+        })
+
+    def _add_matcher(self, field: str, patterns: dict) -> None:
+        """Combine the patterns (by rule index) of one field into a single regex."""
+        parts = []
+        group_map = {}
+        for index, pattern in patterns.items():
+            group_name = f"r{index}"
+            group_map[group_name] = self.rules[index]
+            # Optional lookahead: records the rule if the pattern occurs
+            # anywhere, never makes the combined match fail.
+            parts.append(f"(?:(?=.*?(?P<{group_name}>{pattern}))|)")
+        if parts:
+            regex = re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+            self.field_matchers[field] = (regex, group_map)
+
+    def matching_rules(self, transaction, counterparty: str) -> list:
+        """Return all rules matching the transaction, in definition order."""
+        counterparty = counterparty or ""
+        values = {
+            "counterparty": counterparty,
+            "canonical": canonical_name(counterparty) if counterparty else "",
+            "description": transaction.description,
+            "transaction_type": transaction.transaction_type,
+        }
+
+        text_hits = {}
+        counterparty_hits = set()
+        for field, (regex, group_map) in self.field_matchers.items():
+            hits = self._field_hits(field, values[field] or "", regex, group_map)
+            if field in ("counterparty", "canonical"):
+                # One condition: the raw or the canonical name may match
+                counterparty_hits.update(hits)
+                continue
+            for rule in hits:
+                text_hits[rule] = text_hits.get(rule, 0) + 1
+        for rule in counterparty_hits:
+            text_hits[rule] = text_hits.get(rule, 0) + 1
+
+        candidates = [rule for rule, count in text_hits.items() if count == len(rule.patterns)]
+        candidates.extend(self.unconditional)
+
+        return [rule for rule in candidates if rule.matches_predicates(transaction)]
+
+    def _field_hits(self, field: str, value: str, regex, group_map: dict) -> tuple:
+        """Rules whose pattern for the field occurs in the value.
+
+        Counterparties are matched twice: on the raw text, because patterns
+        may refer to parts the canonicalizer drops (legal forms, store
+        numbers), and on the canonical name, whose hits are cached once for
+        all spellings of a counterparty.
+        """
+        key = (field, value)
+        hits = self._hit_cache.get(key)
+        if hits is None:
+            groups = regex.match(value).groupdict()
+            hits = tuple(group_map[name] for name, matched in groups.items() if matched is not None)
+            if field in CACHED_FIELDS:
+                if len(self._hit_cache) >= HIT_CACHE_SIZE:
+                    self._hit_cache.clear()
+                self._hit_cache[key] = hits
+        return hits
+
+
+class RuleEngine:
+    """Evaluates allowlist, blocklist and configured rules in a single pass per transaction.
+
+    Allowlist entries become include rules on the income sender, blocklist
+    entries become ignore rules on the expense recipient. An entry matches
+    the raw name or, in canonical form, the canonical name, so "REWE Markt
+    GmbH" also covers "REWE SAGT DANKE 1234". Ignore rules take
+    precedence over include rules. Without a matching rule, income is ignored
+    and expenses are included. Every rule keeps a hit counter.
+
+    With a fuzzy_threshold, a counterparty that matches no list entry
+    exactly is also compared by trigram similarity against the allowlist
+    (income) or blocklist (expense); a close enough entry counts as a hit
+    of that entry's rule.
+    """
+
+    def __init__(self, income_allow_list: list, expense_block_list: list, rules: list = None,
+                 fuzzy_threshold: float = None):
+        self.rules = []
+
+        for pattern in income_allow_list or []:
+            self.rules.append(Rule(
+                f"Allowlist: {pattern}", INCLUDE, "income",
+                {"counterparty": re.escape(str(pattern))}, source="allowlist",
+                canonical_pattern=re.escape(canonical_name(str(pattern)))
+            ))
+
+        for pattern in expense_block_list or []:
+            self.rules.append(Rule(
+                f"Blocklist: {pattern}", IGNORE, "expense",
+                {"counterparty": re.escape(str(pattern))}, source="blocklist",
+                canonical_pattern=re.escape(canonical_name(str(pattern)))
+            ))
+
+        for index, rule_config in enumerate(rules or [], start=1):
+            self.rules.append(_rule_from_config(index, rule_config))
+
+        self._rule_sets = {
+            "income": _CompiledRuleSet([r for r in self.rules if r.applies("income")]),
+            "expense": _CompiledRuleSet([r for r in self.rules if r.applies("expense")]),
+        }
+
+        self._fuzzy = {}
+        if fuzzy_threshold:
+            self._positions = {rule: position for position, rule in enumerate(self.rules)}
+            lists = (("income", "allowlist", income_allow_list), ("expense", "blocklist", expense_block_list))
+            for kind, source, patterns in lists:
+                if patterns:
+                    list_rules = [rule for rule in self.rules if rule.source == source]
+                    self._fuzzy[kind] = (TrigramIndex(patterns, fuzzy_threshold), list_rules, source)
+
+    def evaluate(self, transaction) -> tuple:
+        """Decide whether a transaction is kept.
+
+        Args:
+            transaction: Transaction object
+
+        Returns:
+            Tuple (keep, rule) with the decisive rule or None for the default
+        """
+        if transaction.is_income:
+            kind, counterparty, default = "income", getattr(transaction, "sender", ""), False
+        elif transaction.is_expense:
+            kind, counterparty, default = "expense", transaction.recipient, True
+        else:
+            return False, None
+
+        matched = self._rule_sets[kind].matching_rules(transaction, counterparty)
+        if kind in self._fuzzy:
+            matched = self._add_fuzzy_match(kind, counterparty, matched)
+
+        decisive_include = None
+        for rule in matched:
+            rule.hits += 1
+            if rule.action == IGNORE:
+                return False, rule
+            if decisive_include is None:
+                decisive_include = rule
+
+        if decisive_include is not None:
+            return True, decisive_include
+        return default, None
+
+    def _add_fuzzy_match(self, kind: str, counterparty: str, matched: list) -> list:
+        """Add the closest list rule if no list rule matched exactly."""
+        index, list_rules, source = self._fuzzy[kind]
+        if not counterparty or any(rule.source == source for rule in matched):
+            return matched
+        match = index.best_match(counterparty)
+        if match is None:
+            return matched
+        return sorted(matched + [list_rules[match[0]]], key=self._positions.__getitem__)
+
+    def unused_rules(self) -> list:
+        """Return all rules without a single hit."""
+        return [rule for rule in self.rules if rule.hits == 0]
+
+
+def _rule_from_config(index: int, data: dict) -> Rule:
+    """Build a rule from a YAML mapping.
+
+    Args:
+        index: Position of the rule in the config (1-based, for messages)
+        data: Rule mapping from config/rules.yaml
+
+    Returns:
+        Rule object
+
+    Raises:
+        ValueError: If the rule definition is invalid
+    """
+    name = data.get("name") or f"Regel {index}"
+
+    action = data.get("action", IGNORE)
+    if action not in ACTIONS:
+        raise ValueError(f"{name}: Ungültige Aktion '{action}'. Erlaubt: {', '.join(ACTIONS)}")
+
+    applies_to = data.get("applies_to", "all")
+    if applies_to not in APPLIES_TO:
+        raise ValueError(f"{name}: Ungültiges applies_to '{applies_to}'. Erlaubt: {', '.join(APPLIES_TO)}")
+
+    patterns = {}
+    for field in TEXT_FIELDS:
+        pattern = data.get(field)
+        if pattern is None:
+            continue
+        _check_pattern(name, field, pattern)
+        patterns[field] = pattern
+
+    return Rule(
+        name, action, applies_to, patterns,
+        amount_min=_parse_amount(name, data.get("amount_min")),
+        amount_max=_parse_amount(name, data.get("amount_max")),
+        date_from=_parse_date(name, data.get("date_from")),
+        date_to=_parse_date(name, data.get("date_to")),
+    )
+
+
+def _check_pattern(name: str, field: str, pattern: str) -> None:
+    """Validate a pattern as it is used inside the combined regex of _CompiledRuleSet.
+
+    Raises:
+        ValueError: If the pattern is invalid or uses features that do not work
+            once it is one group among others (back references, named groups,
+            global flags not at the start of the whole expression)
+    """
+    message = f"{name}: Ungültiger regulärer Ausdruck für {field}"
+    try:
+        compiled = re.compile(pattern)
+    except re.error as error:
+        raise ValueError(f"{message}: {error}") from error
+    if _BACK_REFERENCE.search(pattern):
+        raise ValueError(f"{message}: Rückverweise (\\1, (?P=name), (?(1)...)) werden nicht unterstützt")
+    if compiled.groupindex:
+        raise ValueError(f"{message}: Benannte Gruppen (?P<name>...) werden nicht unterstützt, (...) verwenden")
+    try:
+        re.compile(f"(?:(?=.*?(?P<r0>{pattern}))|)", re.IGNORECASE | re.DOTALL)
+    except re.error as error:
+        raise ValueError(
+            f"{message}: {error.msg} (globale Flags wie (?i) sind nicht erlaubt, Groß-/Kleinschreibung "
+            f"wird ohnehin ignoriert; lokal geht (?i:...))"
+        ) from error
+
+
+def _parse_amount(name: str, value) -> Money:
+    if value is None:
+        return None
+    try:
+        return Money.parse(str(value))
+    except ValueError as error:
+        raise ValueError(f"{name}: Ungültiger Betrag '{value}'") from error
+
+
+def _parse_date(name: str, value) -> date:
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError as error:
+        raise ValueError(f"{name}: Ungültiges Datum '{value}'. Erwarte JJJJ-MM-TT") from error
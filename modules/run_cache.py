@@ -0,0 +1,125 @@
+import glob
+import hashlib
+import json
+import os
+
+from modules.archives import split_member
+
+CACHE_VERSION = 1
+CACHE_FILENAME = "lauf_cache.json"
+
+# Sources whose content defines the code version of a run
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE_PATTERNS = ("*.py", os.path.join("modules", "*.py"), os.path.join("config", "*.py"))
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class RunCache:
+    """Content-addressed cache of the last run of a pipeline.
+
+    The key is a SHA-256 over the input files, the configuration, the
+    filter lists and rules, and the code version (the program's own source
+    files). The outputs of the last run are recorded with their sizes in
+    CACHE_FILENAME in the output folder. A run with the same key whose
+    outputs are still in place can reuse them instead of running again.
+    """
+
+    def __init__(self, output_folder: str, pipeline: str):
+        self.path = os.path.join(output_folder, CACHE_FILENAME)
+        self.pipeline = pipeline
+
+    def key(self, input_paths: list, *settings) -> str:
+        """Compute the cache key.
+
+        Args:
+            input_paths: Input files in processing order
+            *settings: JSON-serializable configuration values (config, lists, rules)
+
+        Returns:
+            Hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_VERSION}:{self.pipeline}:{code_version()}\n".encode())
+        for path in input_paths:
+            digest.update(f"{os.path.basename(path)}:{file_digest(split_member(path)[0])}\n".encode())
+        for value in settings:
+            digest.update(json.dumps(value, sort_keys=True, default=str, ensure_ascii=False).encode())
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def lookup(self, key: str):
+        """Return the cached entry for the key, or None if it is missing or its outputs changed.
+
+        Returns:
+            Dictionary with "outputs" (label -> path) and "summary" (lines), or None
+        """
+        entry = self._load().get(self.pipeline)
+        if not entry or entry.get("key") != key:
+            return None
+        for path, size in entry["sizes"].items():
+            if not os.path.isfile(path) or os.path.getsize(path) != size:
+                return None
+        return entry
+
+    def store(self, key: str, outputs: dict, summary: list) -> None:
+        """Record the outputs of a finished run.
+
+        Args:
+            key: Cache key of the run
+            outputs: Dictionary mapping labels to output file paths
+            summary: Console lines shown again when the run is reused
+        """
+        entries = self._load()
+        entries[self.pipeline] = {
+            "key": key,
+            "outputs": outputs,
+            "sizes": {path: os.path.getsize(path) for path in outputs.values()},
+            "summary": summary,
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": CACHE_VERSION, "entries": entries}, file, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            # An unreadable cache only costs a full run
+            return {}
+        if data.get("version") != CACHE_VERSION:
+            return {}
+        return data.get("entries", {})
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_code_version = None
+
+
+def code_version() -> str:
+    """SHA-256 over the program's source files, computed once per process."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        paths = set()
+        for pattern in CODE_PATTERNS:
+            paths.update(glob.glob(os.path.join(_PACKAGE_DIR, pattern)))
+        for path in sorted(paths):
+            digest.update(os.path.relpath(path, _PACKAGE_DIR).encode())
+            digest.update(b"\0")
+            with open(path, "rb") as file:
+                digest.update(file.read())
+        _code_version = digest.hexdigest()
+    return _code_version
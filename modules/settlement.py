@@ -1,4 +1,4 @@
-from decimal import Decimal
+from modules.money import Money, ZERO
 
 
 def calculate_bank_settlement(transactions: list) -> dict:
@@ -8,35 +8,52 @@ def calculate_bank_settlement(transactions: list) -> dict:
         transactions: List of transaction objects with is_expense, is_income, and amount attributes
 
     Returns:
-        Dictionary with settlement results including total_expenses, total_income,
-        net_expenses, amount_per_person, and settlement_amount
+        Dictionary with settlement results (Money values) including total_expenses,
+        total_income, net_expenses, amount_per_person, and settlement_amount.
+        An odd cent of the net expenses is rounded into amount_per_person.
     """
     total_expenses = _calculate_total_expenses(transactions)
     total_income = _calculate_total_income(transactions)
+
+    return calculate_bank_settlement_from_totals(total_expenses, total_income)
+
+
+def calculate_bank_settlement_from_totals(total_expenses: Money, total_income: Money) -> dict:
+    """Calculate bank statement settlement from already summed totals.
+
+    Used by the streaming path, which sums while reading.
+
+    Args:
+        total_expenses: Sum of all expense amounts (positive)
+        total_income: Sum of all income amounts (positive)
+
+    Returns:
+        Same dictionary as calculate_bank_settlement()
+    """
     net_expenses = total_expenses - total_income
-    amount_per_person = net_expenses / 2
+    amount_per_person = net_expenses.split(2)[0]
 
     return {
-        "total_expenses": float(total_expenses),
-        "total_income": float(total_income),
-        "net_expenses": float(net_expenses),
-        "amount_per_person": float(amount_per_person),
-        "settlement_amount": float(amount_per_person),
+        "total_expenses": total_expenses,
+        "total_income": total_income,
+        "net_expenses": net_expenses,
+        "amount_per_person": amount_per_person,
+        "settlement_amount": amount_per_person,
     }
 
 
-def _calculate_total_expenses(transactions: list) -> Decimal:
+def _calculate_total_expenses(transactions: list) -> Money:
     """Calculate total expenses from transactions."""
-    total = Decimal("0")
+    total = ZERO
     for transaction in transactions:
         if transaction.is_expense:
             total += abs(transaction.amount)
     return total
 
 
-def _calculate_total_income(transactions: list) -> Decimal:
+def _calculate_total_income(transactions: list) -> Money:
     """Calculate total income from transactions."""
-    total = Decimal("0")
+    total = ZERO
     for transaction in transactions:
         if transaction.is_income:
             total += abs(transaction.amount)
@@ -50,8 +67,10 @@ def calculate_person_settlement(expenses: list) -> dict:
         expenses: List of expense objects with person and amount attributes
 
     Returns:
-        Dictionary with settlement results including person totals, grand_total,
-        amount_per_person, and reimbursement details
+        Dictionary with settlement results (Money values) including person totals,
+        grand_total, amount_per_person, and reimbursement details. For an odd
+        grand total amount_per_person carries the extra cent, so the person who
+        pays the reimbursement also pays the odd cent.
 
     Raises:
         ValueError: If no expenses are provided
@@ -62,18 +81,33 @@ def calculate_person_settlement(expenses: list) -> dict:
     # Calculate totals per person
     person_totals = _calculate_person_totals(expenses)
 
+    return calculate_person_settlement_from_totals(person_totals)
+
+
+def calculate_person_settlement_from_totals(person_totals: dict) -> dict:
+    """Calculate personal expense settlement from already summed per-person totals.
+
+    Used by the incremental mode, which keeps running totals instead of
+    re-reading every expense.
+
+    Args:
+        person_totals: Dictionary mapping person to Money total
+
+    Returns:
+        Same dictionary as calculate_person_settlement()
+    """
     # Calculate 50/50 split
-    grand_total = sum(person_totals.values())
-    per_person = grand_total / 2
+    grand_total = sum(person_totals.values(), ZERO)
+    per_person = grand_total.split(2)[0]
 
     # Determine reimbursement
     reimbursement = _calculate_reimbursement(person_totals, per_person)
 
     return {
-        'person_a_total': float(person_totals.get('a', Decimal('0'))),
-        'person_m_total': float(person_totals.get('m', Decimal('0'))),
-        'grand_total': float(grand_total),
-        'amount_per_person': float(per_person),
+        'person_a_total': person_totals.get('a', ZERO),
+        'person_m_total': person_totals.get('m', ZERO),
+        'grand_total': grand_total,
+        'amount_per_person': per_person,
         'reimbursement': reimbursement
     }
 
@@ -85,13 +119,13 @@ def _calculate_person_totals(expenses: list) -> dict:
     for expense in expenses:
         person = expense.person
         if person not in person_totals:
-            person_totals[person] = Decimal('0')
+            person_totals[person] = ZERO
         person_totals[person] += expense.amount
 
     return person_totals
 
 
-def _calculate_reimbursement(person_totals: dict, per_person: Decimal) -> dict:
+def _calculate_reimbursement(person_totals: dict, per_person: Money) -> dict:
     """Calculate reimbursement details based on person totals and per-person amount.
 
     Args:
@@ -116,7 +150,7 @@ def _calculate_reimbursement(person_totals: dict, per_person: Decimal) -> dict:
         return {
             'payer': None,
             'recipient': None,
-            'amount': 0.0
+            'amount': ZERO
         }
 
     # Handle single person case
@@ -127,7 +161,7 @@ def _calculate_reimbursement(person_totals: dict, per_person: Decimal) -> dict:
         return {
             'payer': other_person,
             'recipient': single_person,
-            'amount': float(per_person)
+            'amount': per_person
         }
 
     # For 2-person case: determine payer and recipient
@@ -153,5 +187,5 @@ def _calculate_reimbursement(person_totals: dict, per_person: Decimal) -> dict:
     return {
         'payer': payer,
         'recipient': recipient,
-        'amount': float(amount)
+        'amount': amount
     }
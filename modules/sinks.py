@@ -0,0 +1,460 @@
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+
+from modules.money import ZERO
+
+# Report sections that can be selected independently; summary and statistics are always written
+SECTION_TOP_EXPENSES = "top_expenses"
+SECTION_CATEGORIES = "categories"
+SECTION_DAILY = "daily"
+SECTION_RECURRING = "recurring"
+SECTION_TRANSACTIONS = "transactions"
+SECTION_IGNORED = "ignored"
+SECTIONS = (
+    SECTION_TOP_EXPENSES, SECTION_CATEGORIES, SECTION_DAILY, SECTION_RECURRING,
+    SECTION_TRANSACTIONS, SECTION_IGNORED,
+)
+# Sections shown under the expense analysis heading
+ANALYSIS_SECTIONS = frozenset((SECTION_TOP_EXPENSES, SECTION_CATEGORIES, SECTION_DAILY, SECTION_RECURRING))
+
+# Records handed to the sinks (and rows to csv.writer.writerows) at a time
+WRITE_BATCH_ROWS = 1000
+
+# Buffer size of report files written row by row
+OUTPUT_BUFFER_BYTES = 1024 * 1024
+
+
+def batched(items, size: int = WRITE_BATCH_ROWS):
+    """Yield lists of up to `size` items, consuming `items` lazily."""
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def resolve_sections(sections=None) -> frozenset:
+    """Validate a section selection.
+
+    Args:
+        sections: Iterable of section names (or a single name), None for all sections
+
+    Raises:
+        ValueError: If a section is unknown
+    """
+    if sections is None:
+        return frozenset(SECTIONS)
+    if isinstance(sections, str):
+        sections = [sections]
+    unknown = [section for section in sections if section not in SECTIONS]
+    if unknown:
+        raise ValueError(
+            f"Unbekannter Berichtsabschnitt '{unknown[0]}'. Erlaubt: {', '.join(SECTIONS)}"
+        )
+    return frozenset(sections)
+
+
+class TransactionRecord:
+    """Flat, pre-classified view of a transaction that is handed to every sink."""
+
+    __slots__ = (
+        "date", "is_income", "counterparty", "amount", "category",
+        "description", "transaction_type", "reason",
+    )
+
+    def __init__(self, transaction, counterparty: str, category: str = None, reason: str = None):
+        self.date = transaction.date
+        self.is_income = transaction.is_income
+        self.counterparty = counterparty
+        self.amount = transaction.amount
+        self.category = category
+        self.description = transaction.description
+        self.transaction_type = transaction.transaction_type
+        self.reason = reason
+
+    @property
+    def amount_cents(self) -> int:
+        return self.amount.cents
+
+
+class SettlementAggregates:
+    """Aggregates collected while building the records, passed to sinks before the rows.
+
+    Only the aggregates of the selected sections are filled; sinks leave out
+    the sections that are not in `sections`.
+    """
+
+    def __init__(self, settlement_result: dict, sections: frozenset = frozenset(SECTIONS)):
+        self.settlement_result = settlement_result
+        self.sections = sections
+        self.start_date = None
+        self.end_date = None
+        self.total_count = 0
+        self.processed_count = 0
+        self.ignored_count = 0
+        self.zero_amount_count = 0
+        self.top_expenses = []
+        self.categories = []
+        self.daily_expenses = []
+        self.recurring = []
+
+
+class RecordSink:
+    """Base class for output sinks.
+
+    The writer calls open() once with the aggregates, then write_transactions()
+    with batches of the kept records and write_ignored_records() with batches
+    of the ignored records (both already sorted by date, newest first), then
+    close(). By default a batch is passed on record by record to
+    write_transaction() and write_ignored().
+    """
+
+    extension = ""
+
+    def open(self, base_path: str, aggregates: SettlementAggregates) -> None:
+        self.path = base_path + self.extension
+
+    def write_transactions(self, records: list) -> None:
+        for record in records:
+            self.write_transaction(record)
+
+    def write_ignored_records(self, records: list) -> None:
+        for record in records:
+            self.write_ignored(record)
+
+    def write_transaction(self, record: TransactionRecord) -> None:
+        pass
+
+    def write_ignored(self, record: TransactionRecord) -> None:
+        pass
+
+    def close(self) -> str:
+        return self.path
+
+
+class JsonLinesSink(RecordSink):
+    """Machine-readable output: one JSON object per line, amounts in cents, ISO dates."""
+
+    extension = ".jsonl"
+
+    def open(self, base_path: str, aggregates: SettlementAggregates) -> None:
+        super().open(base_path, aggregates)
+        self._file = open(self.path, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_BYTES)
+
+        result = aggregates.settlement_result
+        self._write({
+            "record": "summary",
+            "start_date": aggregates.start_date.isoformat(),
+            "end_date": aggregates.end_date.isoformat(),
+            "total_count": aggregates.total_count,
+            "processed_count": aggregates.processed_count,
+            "ignored_count": aggregates.ignored_count,
+            "zero_amount_count": aggregates.zero_amount_count,
+            "total_expenses_cents": result["total_expenses"].cents,
+            "total_income_cents": result["total_income"].cents,
+            "net_expenses_cents": result["net_expenses"].cents,
+            "amount_per_person_cents": result["amount_per_person"].cents,
+        })
+        for category, data in aggregates.categories:
+            self._write({
+                "record": "category", "category": category,
+                "count": data["count"], "total_cents": data["total"].cents,
+            })
+        for date, data in aggregates.daily_expenses:
+            self._write({
+                "record": "day", "date": date.isoformat(),
+                "count": data["count"], "total_cents": data["total"].cents,
+            })
+        for payment in aggregates.recurring:
+            self._write({
+                "record": "recurring", "counterparty": payment.counterparty,
+                "kind": "income" if payment.is_income else "expense", "period": payment.period,
+                "amount_cents": payment.amount.cents, "count": payment.count,
+                "last_date": payment.last_date.isoformat(), "next_date": payment.next_date.isoformat(),
+            })
+
+    def write_transactions(self, records: list) -> None:
+        self._file.writelines(self._line(self._record_fields("transaction", record)) for record in records)
+
+    def write_ignored_records(self, records: list) -> None:
+        self._file.writelines(self._line(self._record_fields("ignored", record)) for record in records)
+
+    def write_transaction(self, record: TransactionRecord) -> None:
+        self._write(self._record_fields("transaction", record))
+
+    def write_ignored(self, record: TransactionRecord) -> None:
+        self._write(self._record_fields("ignored", record))
+
+    def close(self) -> str:
+        self._file.close()
+        return self.path
+
+    def _record_fields(self, record_type: str, record: TransactionRecord) -> dict:
+        return {
+            "record": record_type,
+            "date": record.date.isoformat(),
+            "kind": "income" if record.is_income else "expense",
+            "counterparty": record.counterparty,
+            "amount_cents": record.amount_cents,
+            "category": record.category,
+            "description": record.description,
+            "transaction_type": record.transaction_type,
+            "reason": record.reason,
+        }
+
+    def _write(self, data: dict) -> None:
+        self._file.write(self._line(data))
+
+    @staticmethod
+    def _line(data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+class SqliteSink(RecordSink):
+    """SQLite output with transactions, aggregates and recurring tables, inserted in batches."""
+
+    extension = ".sqlite"
+    batch_size = 1000
+
+    def open(self, base_path: str, aggregates: SettlementAggregates) -> None:
+        super().open(base_path, aggregates)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute(
+            "CREATE TABLE transactions ("
+            "record TEXT, date TEXT, kind TEXT, counterparty TEXT, amount_cents INTEGER, "
+            "category TEXT, description TEXT, transaction_type TEXT, reason TEXT)"
+        )
+        self._connection.execute(
+            "CREATE TABLE aggregates (record TEXT, key TEXT, count INTEGER, amount_cents INTEGER)"
+        )
+        self._pending = []
+
+        result = aggregates.settlement_result
+        rows = [
+            ("summary", name, None, result[name].cents)
+            for name in ("total_expenses", "total_income", "net_expenses", "amount_per_person")
+        ]
+        rows.extend(
+            ("category", category, data["count"], data["total"].cents)
+            for category, data in aggregates.categories
+        )
+        rows.extend(
+            ("day", date.isoformat(), data["count"], data["total"].cents)
+            for date, data in aggregates.daily_expenses
+        )
+        self._connection.executemany("INSERT INTO aggregates VALUES (?, ?, ?, ?)", rows)
+
+        if SECTION_RECURRING in aggregates.sections:
+            self._create_recurring_table(aggregates.recurring)
+
+    def _create_recurring_table(self, recurring: list) -> None:
+        self._connection.execute(
+            "CREATE TABLE recurring (counterparty TEXT, kind TEXT, period TEXT, amount_cents INTEGER, "
+            "count INTEGER, last_date TEXT, next_date TEXT)"
+        )
+        self._connection.executemany(
+            "INSERT INTO recurring VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (payment.counterparty, "income" if payment.is_income else "expense", payment.period,
+                 payment.amount.cents, payment.count, payment.last_date.isoformat(),
+                 payment.next_date.isoformat())
+                for payment in recurring
+            ]
+        )
+
+    def write_transaction(self, record: TransactionRecord) -> None:
+        self._add_row("transaction", record)
+
+    def write_ignored(self, record: TransactionRecord) -> None:
+        self._add_row("ignored", record)
+
+    def close(self) -> str:
+        self._flush()
+        self._connection.commit()
+        self._connection.close()
+        return self.path
+
+    def _add_row(self, record_type: str, record: TransactionRecord) -> None:
+        self._pending.append((
+            record_type,
+            record.date.isoformat(),
+            "income" if record.is_income else "expense",
+            record.counterparty,
+            record.amount_cents,
+            record.category,
+            record.description,
+            record.transaction_type,
+            record.reason,
+        ))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._connection.executemany(
+                "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending
+            )
+            self._pending = []
+
+
+class MultiSinkWriter:
+    """Builds the records once and streams them to several sinks at the same time.
+
+    Classification, aggregation and sorting happen exactly once here; sinks
+    only receive the finished records in output order. Work for sections
+    that are not selected (categorizing, sorting the transaction lists,
+    collecting top expenses or daily totals) is skipped.
+    """
+
+    def __init__(self, sinks: dict, categorize, describe_ignore_reason, sections: frozenset = None):
+        self.sinks = sinks
+        self.categorize = categorize
+        self.describe_ignore_reason = describe_ignore_reason
+        self.sections = resolve_sections(sections)
+
+    def build(self, settlement_result: dict, transactions: list, all_transactions: list = None,
+              ignored_transactions: list = None, zero_amount_transactions: list = None) -> tuple:
+        """Classify and aggregate all transactions in a single pass.
+
+        All records are kept in memory and sorted here; for bounded memory
+        use StreamingBankRun, which feeds the sinks from ExternalSorters.
+
+        Returns:
+            Tuple (aggregates, records, ignored_records), records sorted by date (newest first)
+        """
+        aggregates = SettlementAggregates(settlement_result, self.sections)
+        aggregates.total_count = len(all_transactions) if all_transactions else len(transactions)
+        aggregates.processed_count = len(transactions)
+        aggregates.ignored_count = len(ignored_transactions) if ignored_transactions else 0
+        aggregates.zero_amount_count = len(zero_amount_transactions) if zero_amount_transactions else 0
+
+        accumulator = self.accumulator()
+        if SECTION_TRANSACTIONS in self.sections:
+            records = [accumulator.add(transaction) for transaction in transactions]
+            records.sort(key=lambda record: record.date, reverse=True)
+        else:
+            records = []
+            for transaction in transactions:
+                accumulator.add(transaction)
+        accumulator.finish(aggregates)
+
+        ignored_records = []
+        if SECTION_IGNORED in self.sections:
+            ignored_records = [
+                self.ignored_record(transaction, reason_code, rule)
+                for transaction, reason_code, rule in ignored_transactions or []
+            ]
+            ignored_records.sort(key=lambda record: record.date, reverse=True)
+
+        return aggregates, records, ignored_records
+
+    def accumulator(self) -> "AggregateAccumulator":
+        """Return an accumulator for callers that feed transactions one by one."""
+        return AggregateAccumulator(self.categorize, self.sections)
+
+    def ignored_record(self, transaction, reason_code: str, rule) -> TransactionRecord:
+        counterparty = transaction.sender if transaction.is_income else transaction.recipient
+        reason = self.describe_ignore_reason(reason_code, rule)
+        return TransactionRecord(transaction, counterparty, reason=reason)
+
+    def write(self, base_path: str, aggregates: SettlementAggregates, records: list,
+              ignored_records: list) -> dict:
+        """Stream the records once to all sinks, in batches of WRITE_BATCH_ROWS.
+
+        Returns:
+            Dictionary mapping sink names to the written file paths
+        """
+        sinks = list(self.sinks.values())
+
+        for sink in sinks:
+            sink.open(base_path, aggregates)
+        for batch in batched(records):
+            for sink in sinks:
+                sink.write_transactions(batch)
+        for batch in batched(ignored_records):
+            for sink in sinks:
+                sink.write_ignored_records(batch)
+
+        return {name: sink.close() for name, sink in self.sinks.items()}
+
+
+class AggregateAccumulator:
+    """Classifies kept transactions one at a time and collects the aggregates.
+
+    Memory use is bounded by the number of categories and days, not by the
+    number of transactions. Only the aggregates of the selected sections are
+    collected, and transactions are only categorized if the categories or
+    the transaction list are selected.
+    """
+
+    def __init__(self, categorize, sections: frozenset = frozenset(SECTIONS)):
+        self.categorize = categorize
+        self._keep_records = SECTION_TRANSACTIONS in sections
+        self._collect_top_expenses = SECTION_TOP_EXPENSES in sections
+        self._collect_categories = SECTION_CATEGORIES in sections
+        self._collect_daily = SECTION_DAILY in sections
+        self._needs_category = self._keep_records or self._collect_categories
+        self.start_date = None
+        self.end_date = None
+        self._index = 0
+        self._top_heap = []
+        self._categories = {}
+        self._daily = {}
+
+    def add(self, transaction) -> TransactionRecord:
+        """Classify one kept transaction and return its record (None without the transactions section)."""
+        index = self._index
+        self._index += 1
+
+        if self.start_date is None or transaction.date < self.start_date:
+            self.start_date = transaction.date
+        if self.end_date is None or transaction.date > self.end_date:
+            self.end_date = transaction.date
+
+        if transaction.is_income:
+            if not self._keep_records:
+                return None
+            return TransactionRecord(transaction, transaction.sender, "Einnahme")
+
+        category = self.categorize(transaction.recipient) if self._needs_category else None
+        record = None
+        if self._keep_records or self._collect_top_expenses:
+            record = TransactionRecord(transaction, transaction.recipient, category)
+
+        if transaction.is_expense:
+            amount = abs(transaction.amount)
+            if self._collect_top_expenses:
+                _push_top_expense(self._top_heap, transaction.amount, index, record)
+
+            if self._collect_categories:
+                data = self._categories.setdefault(category, {"count": 0, "total": ZERO})
+                data["count"] += 1
+                data["total"] += amount
+
+            if self._collect_daily:
+                data = self._daily.setdefault(transaction.date, {"count": 0, "total": ZERO})
+                data["count"] += 1
+                data["total"] += amount
+
+        return record if self._keep_records else None
+
+    def finish(self, aggregates: SettlementAggregates) -> None:
+        """Store date range, top expenses, categories and daily totals in aggregates."""
+        aggregates.start_date = self.start_date
+        aggregates.end_date = self.end_date
+        aggregates.top_expenses = [entry[2] for entry in sorted(self._top_heap, reverse=True)]
+        aggregates.categories = sorted(self._categories.items(), key=lambda x: x[1]["total"], reverse=True)
+        aggregates.daily_expenses = sorted(self._daily.items(), key=lambda x: x[0], reverse=True)
+
+
+def _push_top_expense(heap: list, amount, index: int, record: TransactionRecord, size: int = 3):
+    """Keep the `size` largest expenses (most negative amounts, earliest first on ties)."""
+    entry = (-amount, -index, record)
+    if len(heap) < size:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
@@ -0,0 +1,167 @@
+import heapq
+import os
+import pickle
+import tempfile
+
+from modules.filters import ignore_reason_code
+from modules.money import ZERO
+from modules.settlement import calculate_bank_settlement_from_totals
+from modules.sinks import SECTION_IGNORED, SettlementAggregates
+
+# Items per pickle.dump call when a run is written to disk
+SPILL_CHUNK_SIZE = 1000
+
+
+class ExternalSorter:
+    """Sorts items with bounded memory.
+
+    Items are buffered until `run_size` is reached, then the buffer is sorted
+    and spilled to a temporary file as one run. Iterating merges all runs (and
+    the remaining buffer) with heapq.merge, reading each run chunk by chunk.
+    The sort is stable: items with equal keys come out in insertion order.
+    """
+
+    def __init__(self, key, run_size: int, directory: str = None):
+        self.key = key
+        self.run_size = run_size
+        self.directory = directory
+        self.run_paths = []
+        self._buffer = []
+        self._count = 0
+
+    def add(self, item) -> None:
+        # The insertion counter keeps equal keys stable across runs
+        self._buffer.append((self.key(item), self._count, item))
+        self._count += 1
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        self._buffer.sort(key=_sort_key)
+        runs = [_read_run(path) for path in self.run_paths]
+        for _, _, item in heapq.merge(*runs, self._buffer, key=_sort_key):
+            yield item
+
+    def close(self) -> None:
+        """Delete the spilled runs."""
+        for path in self.run_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.run_paths = []
+        self._buffer = []
+
+    def _spill(self) -> None:
+        self._buffer.sort(key=_sort_key)
+        handle, path = tempfile.mkstemp(prefix="lauf_", suffix=".tmp", dir=self.directory)
+        with os.fdopen(handle, "wb") as file:
+            for start in range(0, len(self._buffer), SPILL_CHUNK_SIZE):
+                pickle.dump(self._buffer[start:start + SPILL_CHUNK_SIZE], file, pickle.HIGHEST_PROTOCOL)
+        self.run_paths.append(path)
+        self._buffer = []
+
+
+class StreamingBankRun:
+    """Bank pipeline in bounded memory.
+
+    Consumes the transactions once: filters them, sums the settlement,
+    collects the aggregates and feeds the date-sorted sections (records for
+    the export sinks, ignored records, income and expense rows for the text
+    report) into ExternalSorters that spill to disk. Kept transactions are
+    also passed to the optional recurring payment detector.
+
+    Sections the writer does not select are neither built nor sorted; the
+    income and expense rows are only collected with `report_rows`.
+    """
+
+    def __init__(self, writer, rule_engine, run_size: int, directory: str = None,
+                 recurring_detector=None, report_rows: bool = True):
+        self.writer = writer
+        self.rule_engine = rule_engine
+        self.recurring_detector = recurring_detector
+        self.report_rows = report_rows
+        self.keep_ignored = SECTION_IGNORED in writer.sections
+        self.accumulator = writer.accumulator()
+        self.total_count = 0
+        self.kept_count = 0
+        self.ignored_count = 0
+        self.zero_amount_count = 0
+        self.total_expenses = ZERO
+        self.total_income = ZERO
+
+        newest_first = lambda record: -record.date.toordinal()
+        oldest_first = lambda row: row[0].toordinal()
+        self.records = ExternalSorter(newest_first, run_size, directory)
+        self.ignored_records = ExternalSorter(newest_first, run_size, directory)
+        self.income_rows = ExternalSorter(oldest_first, run_size, directory)
+        self.expense_rows = ExternalSorter(oldest_first, run_size, directory)
+
+    def consume(self, transactions) -> None:
+        for transaction in transactions:
+            self.total_count += 1
+            if not transaction.is_income and not transaction.is_expense:
+                self.zero_amount_count += 1
+                continue
+
+            keep, rule = self.rule_engine.evaluate(transaction)
+            if not keep:
+                self.ignored_count += 1
+                if self.keep_ignored:
+                    reason_code = ignore_reason_code(rule)
+                    self.ignored_records.add(self.writer.ignored_record(transaction, reason_code, rule))
+                continue
+
+            self.kept_count += 1
+            record = self.accumulator.add(transaction)
+            if record is not None:
+                self.records.add(record)
+            if self.recurring_detector is not None:
+                self.recurring_detector.add(transaction)
+            amount = abs(transaction.amount)
+            if transaction.is_income:
+                self.total_income += amount
+                if self.report_rows:
+                    self.income_rows.add((transaction.date, transaction.sender, transaction.amount))
+            else:
+                self.total_expenses += amount
+                if self.report_rows:
+                    self.expense_rows.add((transaction.date, transaction.recipient, transaction.amount))
+
+    def settlement_result(self) -> dict:
+        return calculate_bank_settlement_from_totals(self.total_expenses, self.total_income)
+
+    def aggregates(self, settlement_result: dict) -> SettlementAggregates:
+        aggregates = SettlementAggregates(settlement_result, self.writer.sections)
+        aggregates.total_count = self.total_count
+        aggregates.processed_count = self.kept_count
+        aggregates.ignored_count = self.ignored_count
+        aggregates.zero_amount_count = self.zero_amount_count
+        self.accumulator.finish(aggregates)
+        return aggregates
+
+    @property
+    def spilled_runs(self) -> int:
+        return sum(len(sorter.run_paths) for sorter in self._sorters())
+
+    def close(self) -> None:
+        for sorter in self._sorters():
+            sorter.close()
+
+    def _sorters(self) -> tuple:
+        return self.records, self.ignored_records, self.income_rows, self.expense_rows
+
+
+def _sort_key(entry) -> tuple:
+    return entry[0], entry[1]
+
+
+def _read_run(path: str):
+    with open(path, "rb") as file:
+        while True:
+            try:
+                chunk = pickle.load(file)
+            except EOFError:
+                return
+            yield from chunk
@@ -0,0 +1,144 @@
+import csv
+import io
+from datetime import date, timedelta
+
+# Lists the generated statements are filtered with; names match some counterparties below
+ALLOW_LIST = ["Arbeitgeber", "Oma"]
+BLOCK_LIST = ["Hausverwaltung", "Sparplan"]
+
+ACCOUNT_HOLDER = "Max Muster"
+INCOME_SENDERS = [
+    "Arbeitgeber GmbH", "ARBEITGEBER GMBH", "Oma Erna", "Finanzamt", "Kindergeldkasse",
+    "Max Mustermann Langername mit sehr vielen Zeichen im Namen",
+]
+EXPENSE_RECIPIENTS = [
+    "REWE Markt GmbH", "REWE Markt 1234", "Aldi Süd", "Shell", "Stadtwerke München",
+    "Hausverwaltung Meier", "Sparplan Depot", "amazon", "PayPal (Europe) S.a.r.l.", "Bar Celona",
+    "Erika Musterfrau", "netto", "DKB Kreditkarte",
+]
+PURPOSES = ["Miete", "Einkauf", "Gehalt", "", "Rechnung 4711; Kunde 12", 'Sagte "danke"', "Zeile 1\nZeile 2"]
+
+STATEMENT_HEADER = [
+    "Buchungsdatum", "Wertstellung", "Status", "Zahlungspflichtige*r", "Zahlungsempfänger*in",
+    "Verwendungszweck", "Umsatztyp", "IBAN", "Betrag (€)", "Gläubiger-ID", "Mandatsreferenz",
+    "Kundenreferenz",
+]
+
+VALID_PERSONS = ["a", "b", "m"]
+EXPENSE_COMMENTS = ["Supermarkt", "Tankstelle", "", "Apotheke; Rezept", "Geschenk \"Oma\"", "Zeile 1\nZeile 2"]
+
+
+def generate_statement(rng, rows: int, keep_none: bool = False) -> str:
+    """Random DKB export with edge cases.
+
+    Covers empty sender or recipient, rows missing both or the amount,
+    zero and single-cent amounts, two- and four-digit years, quoted
+    delimiters and line breaks, repeated rows and CRLF line ends. At least
+    one expense is always kept, so every statement produces a report.
+
+    Args:
+        rng: random.Random instance
+        rows: Number of transaction rows
+        keep_none: Instead, only write rows the lists filter out or that are
+            invalid, so no transaction is kept and every path has to fail
+
+    Returns:
+        CSV text
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(
+        buffer, delimiter=";", quoting=csv.QUOTE_ALL,
+        lineterminator="\r\n" if rng.random() < 0.2 else "\n"
+    )
+    first_day = date(rng.choice([2024, 2025]), rng.randint(1, 12), 1)
+    writer.writerow(["Girokonto", "DE00 1234 5678"])
+    writer.writerow([f"Kontostand vom {first_day:%d.%m.%Y}:", "1.000,00 €"])
+    writer.writerow([""])
+    writer.writerow(STATEMENT_HEADER)
+
+    writer.writerow(_statement_row(rng, first_day, is_income=False, plain=True, keep_none=keep_none))
+    previous = None
+    for _ in range(rows - 1):
+        if previous is not None and rng.random() < 0.03:
+            row = previous
+        else:
+            row = _statement_row(rng, first_day, is_income=rng.random() < 0.3, keep_none=keep_none)
+        writer.writerow(row)
+        previous = row
+    return buffer.getvalue()
+
+
+def generate_expenses(rng, rows: int) -> str:
+    """Random paper expense file (year, month, header, rows).
+
+    Covers payers that are only 'a', comma and point decimals, odd cents,
+    one- and two-digit months and quoted comments.
+
+    Args:
+        rng: random.Random instance
+        rows: Number of expense rows
+
+    Returns:
+        CSV text
+    """
+    persons = ["a"] if rng.random() < 0.2 else VALID_PERSONS
+    month = rng.randint(1, 12)
+    buffer = io.StringIO()
+    buffer.write(f"{rng.randint(20, 29)}\n")
+    buffer.write(f"{month:02d}\n" if rng.random() < 0.5 else f"{month}\n")
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    writer.writerow(["person", "amount", "comment"])
+    for _ in range(rows):
+        cents = rng.choice([1, 5, 99, 100, rng.randint(1, 50000)])
+        separator = "," if rng.random() < 0.7 else "."
+        amount = f"{cents // 100}{separator}{cents % 100:02d}"
+        writer.writerow([rng.choice(persons), amount, rng.choice(EXPENSE_COMMENTS)])
+    return buffer.getvalue()
+
+
+def _statement_row(rng, first_day: date, is_income: bool, plain: bool = False, keep_none: bool = False) -> list:
+    """One statement row; plain rows are valid expenses that are always kept.
+
+    With keep_none, income comes from senders outside the allowlist and
+    expenses go to blocklisted recipients (a plain row is a valid blocked
+    expense), so the row is never kept.
+    """
+    booking_date = first_day + timedelta(days=rng.randint(0, 30))
+    date_format = "%d.%m.%y" if rng.random() < 0.7 else "%d.%m.%Y"
+    cents = rng.choice([0, 1, 5, 99, rng.randint(1, 500000), rng.randint(1, 5000)])
+    if plain:
+        cents = rng.randint(1, 5000)
+    amount = f"{cents // 100},{cents % 100:02d}" if is_income else f"-{cents // 100},{cents % 100:02d}"
+    if keep_none:
+        senders = [sender for sender in INCOME_SENDERS if not _listed(sender, ALLOW_LIST)]
+        recipients = [recipient for recipient in EXPENSE_RECIPIENTS if _listed(recipient, BLOCK_LIST)]
+    else:
+        senders, recipients = INCOME_SENDERS, EXPENSE_RECIPIENTS
+    if is_income:
+        sender, recipient = rng.choice(senders), ACCOUNT_HOLDER
+    elif plain and not keep_none:
+        sender, recipient = ACCOUNT_HOLDER, "REWE Markt GmbH"
+    else:
+        sender, recipient = ACCOUNT_HOLDER, rng.choice(recipients)
+
+    roll = 1 if plain else rng.random()
+    if roll < 0.05:
+        sender = ""
+    elif roll < 0.08 and not keep_none:
+        # An expense without recipient matches no blocklist entry and is kept
+        recipient = ""
+    elif roll < 0.1:
+        sender = recipient = ""
+    elif roll < 0.12:
+        amount = ""
+
+    return [
+        booking_date.strftime(date_format), booking_date.strftime(date_format), "Gebucht",
+        sender, recipient, rng.choice(PURPOSES), "Eingang" if is_income else "Ausgang",
+        "DE02120300000000202051", amount, "", "", "",
+    ]
+
+
+
+def _listed(name: str, entries: list) -> bool:
+    return any(entry.lower() in name.lower() for entry in entries)
@@ -2,13 +2,16 @@ import os
 import glob
 import yaml
 
+from modules.archives import INPUT_PATTERNS
+from modules.formatting import format_amount
 
-def find_latest_file(folder: str, pattern: str = "*.csv") -> str:
+
+def find_latest_file(folder: str, pattern=INPUT_PATTERNS) -> str:
     """Find the most recently created file matching the pattern in the folder.
 
     Args:
         folder: Directory to search in
-        pattern: Glob pattern for file matching (default: "*.csv")
+        pattern: Glob pattern or tuple of patterns (default: CSV files, plain or compressed)
 
     Returns:
         Path to the most recent file
@@ -16,18 +19,52 @@ def find_latest_file(folder: str, pattern: str = "*.csv") -> str:
     Raises:
         FileNotFoundError: If no files matching pattern are found
     """
-    file_pattern = os.path.join(folder, pattern)
-    files = glob.glob(file_pattern)
+    files = _glob_patterns(folder, pattern)
 
     if not files:
         raise FileNotFoundError(
-            f"Keine Dateien mit Muster '{pattern}' im Ordner {folder} gefunden"
+            f"Keine Dateien mit Muster '{_describe_patterns(pattern)}' im Ordner {folder} gefunden"
         )
 
     latest_file = max(files, key=os.path.getctime)
     return latest_file
 
 
+def find_files(folder: str, pattern=INPUT_PATTERNS) -> list:
+    """Find all files matching the pattern in the folder, oldest first.
+
+    Args:
+        folder: Directory to search in
+        pattern: Glob pattern or tuple of patterns (default: CSV files, plain or compressed)
+
+    Returns:
+        List of file paths sorted by creation time
+
+    Raises:
+        FileNotFoundError: If no files matching pattern are found
+    """
+    files = _glob_patterns(folder, pattern)
+
+    if not files:
+        raise FileNotFoundError(
+            f"Keine Dateien mit Muster '{_describe_patterns(pattern)}' im Ordner {folder} gefunden"
+        )
+
+    return sorted(files, key=os.path.getctime)
+
+
+def _glob_patterns(folder: str, pattern) -> list:
+    patterns = (pattern,) if isinstance(pattern, str) else pattern
+    files = {}
+    for single_pattern in patterns:
+        files.update(dict.fromkeys(glob.glob(os.path.join(folder, single_pattern))))
+    return list(files)
+
+
+def _describe_patterns(pattern) -> str:
+    return pattern if isinstance(pattern, str) else ", ".join(pattern)
+
+
 def read_config(file_path: str) -> dict:
     """Read and parse a YAML configuration file.
 
@@ -72,6 +109,9 @@ def format_currency(amount: float, decimal_places: int = 2) -> str:
     Returns:
         Formatted currency string (e.g., "123,45")
     """
+    if decimal_places == 2:
+        return format_amount(amount)
+
     formatted = f"{amount:.{decimal_places}f}"
     # Replace dot with comma for German formatting
     formatted = formatted.replace(".", ",")
@@ -0,0 +1,309 @@
+import re
+import zipfile
+from datetime import date
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from modules.sinks import (
+    SECTION_CATEGORIES, SECTION_DAILY, SECTION_IGNORED, SECTION_TOP_EXPENSES, SECTION_TRANSACTIONS,
+    RecordSink,
+)
+
+EXCEL_EPOCH = date(1899, 12, 30)
+
+# Cell styles (index into cellXfs of styles.xml)
+STYLE_DEFAULT = 0
+STYLE_DATE = 1
+STYLE_CURRENCY = 2
+STYLE_HEADER = 3
+
+COLUMN_LETTERS = "ABCDEFGHIJ"
+FLUSH_ROWS = 2000
+
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_STYLES_XML = (
+    _XML_HEADER
+    + f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="DD.MM.YYYY"/>'
+    '<numFmt numFmtId="165" formatCode="#,##0.00 &quot;€&quot;"/>'
+    '</numFmts>'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font>'
+    '</fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class XlsxSink(RecordSink):
+    """Native XLSX output without third-party dependencies.
+
+    The workbook is a zip of XML parts. Summary, categories and daily overview
+    are small and written completely in open(); the transaction sheet (and the
+    optional sheet with ignored transactions) is streamed row by row into its
+    zip member, so the sink itself holds no rows. The memory of a whole run
+    depends on the path feeding it: MultiSinkWriter.build() in the in-memory
+    path keeps and sorts every record, only StreamingBankRun feeds the sink
+    from sorted runs on disk. Amounts are numeric cells, dates are real date
+    cells.
+    """
+
+    extension = ".xlsx"
+
+    def open(self, base_path, aggregates):
+        super().open(base_path, aggregates)
+
+        sections = aggregates.sections
+        self._sheet_names = ["Zusammenfassung"]
+        small_sheets = [self._summary_rows(aggregates)]
+        if SECTION_CATEGORIES in sections:
+            self._sheet_names.append("Kategorien")
+            small_sheets.append(self._category_rows(aggregates))
+        if SECTION_DAILY in sections:
+            self._sheet_names.append("Tagesübersicht")
+            small_sheets.append(self._daily_rows(aggregates))
+
+        self._transaction_sheet = None
+        if SECTION_TRANSACTIONS in sections:
+            self._sheet_names.append("Transaktionen")
+            self._transaction_sheet = len(self._sheet_names)
+        self._ignored_sheet = None
+        if SECTION_IGNORED in sections and aggregates.ignored_count:
+            self._sheet_names.append("Ignoriert")
+            self._ignored_sheet = len(self._sheet_names)
+
+        self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        self._write_package_parts()
+
+        for index, rows in enumerate(small_sheets, 1):
+            self._write_sheet(index, rows)
+
+        self._stream = None
+        self._stream_sheet = None
+        if self._transaction_sheet:
+            self._open_stream(self._transaction_sheet,
+                              ["Datum", "Art", "Gegenpartei", "Betrag", "Kategorie", "Verwendungszweck"])
+
+    def write_transaction(self, record):
+        self._add_record_row(record, record.category)
+
+    def write_ignored(self, record):
+        if self._stream_sheet != self._ignored_sheet:
+            self._close_stream()
+            self._open_stream(self._ignored_sheet,
+                              ["Datum", "Art", "Gegenpartei", "Betrag", "Grund", "Verwendungszweck"])
+        self._add_record_row(record, record.reason)
+
+    def close(self):
+        self._close_stream()
+        # Announced but empty sheet (no ignored rows streamed)
+        if self._ignored_sheet and self._stream_sheet != self._ignored_sheet:
+            self._write_sheet(self._ignored_sheet, [])
+        self._zip.close()
+        return self.path
+
+    def _summary_rows(self, aggregates):
+        result = aggregates.settlement_result
+        rows = [
+            [("STATISTIK", STYLE_HEADER)],
+            ["Transaktionen gesamt", aggregates.total_count],
+            ["Berücksichtigt", aggregates.processed_count],
+            ["Ignoriert", aggregates.ignored_count],
+            ["Ohne Betrag", aggregates.zero_amount_count],
+            [],
+            [("ZUSAMMENFASSUNG", STYLE_HEADER)],
+            ["Zeitraum von", (aggregates.start_date, STYLE_DATE)],
+            ["Zeitraum bis", (aggregates.end_date, STYLE_DATE)],
+            ["Gesamtausgaben", (result["total_expenses"], STYLE_CURRENCY)],
+            ["Gesamteinnahmen", (result["total_income"], STYLE_CURRENCY)],
+            ["Nettoausgaben", (result["net_expenses"], STYLE_CURRENCY)],
+            ["Pro Person", (result["amount_per_person"], STYLE_CURRENCY)],
+        ]
+        if SECTION_TOP_EXPENSES in aggregates.sections:
+            rows.append([])
+            rows.append([("TOP 3 AUSGABEN", STYLE_HEADER)])
+            rows.append([("Rang", STYLE_HEADER), ("Empfänger", STYLE_HEADER),
+                         ("Betrag", STYLE_HEADER), ("Datum", STYLE_HEADER)])
+            for rank, record in enumerate(aggregates.top_expenses, 1):
+                rows.append([
+                    rank, record.counterparty,
+                    (abs(record.amount), STYLE_CURRENCY), (record.date, STYLE_DATE),
+                ])
+
+        if aggregates.recurring:
+            rows.append([])
+            rows.append([("WIEDERKEHRENDE ZAHLUNGEN", STYLE_HEADER)])
+            rows.append([(title, STYLE_HEADER) for title in
+                         ("Gegenpartei", "Rhythmus", "Betrag", "Anzahl", "Zuletzt", "Nächste")])
+            for payment in aggregates.recurring:
+                rows.append([
+                    payment.counterparty, payment.period, (payment.amount, STYLE_CURRENCY),
+                    payment.count, (payment.last_date, STYLE_DATE), (payment.next_date, STYLE_DATE),
+                ])
+        return rows
+
+    def _category_rows(self, aggregates):
+        rows = [[("Kategorie", STYLE_HEADER), ("Anzahl", STYLE_HEADER), ("Gesamtbetrag", STYLE_HEADER)]]
+        for category, data in aggregates.categories:
+            rows.append([category, data["count"], (data["total"], STYLE_CURRENCY)])
+        return rows
+
+    def _daily_rows(self, aggregates):
+        rows = [[("Datum", STYLE_HEADER), ("Anzahl Transaktionen", STYLE_HEADER),
+                 ("Tagesbetrag", STYLE_HEADER)]]
+        for day, data in aggregates.daily_expenses:
+            rows.append([(day, STYLE_DATE), data["count"], (data["total"], STYLE_CURRENCY)])
+        return rows
+
+    def _write_package_parts(self):
+        sheet_count = len(self._sheet_names)
+
+        overrides = "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, sheet_count + 1)
+        )
+        self._zip.writestr("[Content_Types].xml", (
+            _XML_HEADER
+            + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" '
+            'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            + overrides + '</Types>'
+        ))
+
+        self._zip.writestr("_rels/.rels", (
+            _XML_HEADER
+            + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+
+        sheets = "".join(
+            f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(self._sheet_names, 1)
+        )
+        self._zip.writestr("xl/workbook.xml", (
+            _XML_HEADER
+            + f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}"><sheets>{sheets}</sheets></workbook>'
+        ))
+
+        relationships = "".join(
+            f'<Relationship Id="rId{i}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, sheet_count + 1)
+        )
+        self._zip.writestr("xl/_rels/workbook.xml.rels", (
+            _XML_HEADER
+            + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + relationships
+            + f'<Relationship Id="rId{sheet_count + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>'
+        ))
+
+        self._zip.writestr("xl/styles.xml", _STYLES_XML)
+
+    def _write_sheet(self, index, rows):
+        body = "".join(_row_xml(number, row) for number, row in enumerate(rows, 1))
+        self._zip.writestr(
+            f"xl/worksheets/sheet{index}.xml",
+            _XML_HEADER + f'<worksheet xmlns="{_MAIN_NS}"><sheetData>{body}</sheetData></worksheet>'
+        )
+
+    def _open_stream(self, index, header):
+        self._stream = self._zip.open(f"xl/worksheets/sheet{index}.xml", "w", force_zip64=True)
+        self._stream_sheet = index
+        self._row_number = 0
+        self._buffer = [_XML_HEADER, f'<worksheet xmlns="{_MAIN_NS}"><sheetData>']
+        self._add_row([(name, STYLE_HEADER) for name in header])
+
+    def _add_row(self, row):
+        self._row_number += 1
+        self._buffer.append(_row_xml(self._row_number, row))
+        if len(self._buffer) >= FLUSH_ROWS:
+            self._flush()
+
+    def _add_record_row(self, record, label):
+        # Hot path: fixed column layout, no per-cell type dispatch
+        self._row_number += 1
+        n = self._row_number
+        self._buffer.append(
+            f'<row r="{n}">'
+            f'<c r="A{n}" s="{STYLE_DATE}"><v>{_date_serial(record.date)}</v></c>'
+            f'<c r="B{n}" t="inlineStr"><is><t>{"Einnahme" if record.is_income else "Ausgabe"}</t></is></c>'
+            f'<c r="C{n}" t="inlineStr"><is><t xml:space="preserve">{_xml_text(record.counterparty)}</t></is></c>'
+            f'<c r="D{n}" s="{STYLE_CURRENCY}"><v>{record.amount:.2f}</v></c>'
+            f'<c r="E{n}" t="inlineStr"><is><t xml:space="preserve">{_xml_text(label or "")}</t></is></c>'
+            f'<c r="F{n}" t="inlineStr"><is><t xml:space="preserve">{_xml_text(record.description)}</t></is></c>'
+            '</row>'
+        )
+        if len(self._buffer) >= FLUSH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        self._stream.write("".join(self._buffer).encode("utf-8"))
+        self._buffer = []
+
+    def _close_stream(self):
+        if self._stream is None:
+            return
+        self._buffer.append("</sheetData></worksheet>")
+        self._flush()
+        self._stream.close()
+        self._stream = None
+
+
+def _row_xml(number, row) -> str:
+    cells = "".join(
+        _cell_xml(f"{COLUMN_LETTERS[column]}{number}", value)
+        for column, value in enumerate(row)
+        if value is not None
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+
+def _cell_xml(reference, value) -> str:
+    style = STYLE_DEFAULT
+    if isinstance(value, tuple):
+        value, style = value
+
+    if isinstance(value, date):
+        return f'<c r="{reference}" s="{style}"><v>{_date_serial(value)}</v></c>'
+    if isinstance(value, str):
+        text = _xml_text(value)
+        return f'<c r="{reference}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+    if style == STYLE_CURRENCY:
+        return f'<c r="{reference}" s="{style}"><v>{value:.2f}</v></c>'
+    return f'<c r="{reference}" s="{style}"><v>{value}</v></c>'
+
+
+@lru_cache(maxsize=4096)
+def _date_serial(value) -> int:
+    """Excel serial day number of a date."""
+    return (value - EXCEL_EPOCH).days
+
+
+@lru_cache(maxsize=65536)
+def _xml_text(value: str) -> str:
+    """Escape text for XML and drop characters XML 1.0 does not allow."""
+    return escape(_ILLEGAL_XML_CHARS.sub("", value))
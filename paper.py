@@ -13,79 +13,231 @@ except ImportError:
     sys.exit(1)
 
 try:
+    from modules.archives import expand_inputs
+    from modules.exchange_rates import load_configured_rates
     from modules.expense_reader import ExpenseReader
-    from modules.settlement import calculate_person_settlement
+    from modules.incremental import IncrementalExpenseReader
+    from modules.planner import DEFAULT_MEMORY_BUDGET_MB, MODE_AUTO, MODE_STREAMING, MemoryTracker, plan_execution
+    from modules.settlement import calculate_person_settlement, calculate_person_settlement_from_totals
     from modules.report_writer import PersonReportWriter
+    from modules.run_cache import RunCache
     from modules.utils import find_latest_file, read_config
 except ImportError as e:
     print(f"Import-Fehler: {e}")
     print("Stelle sicher, dass alle Dateien im richtigen Verzeichnis sind:")
+    print("- modules/archives.py")
+    print("- modules/exchange_rates.py")
     print("- modules/expense_reader.py")
+    print("- modules/incremental.py")
+    print("- modules/planner.py")
     print("- modules/settlement.py")
     print("- modules/report_writer.py")
+    print("- modules/run_cache.py")
+    print("- modules/diagnostics.py")
     print("- modules/utils.py")
     sys.exit(1)
 
 
-def main():
+REPORT_LABELS = {"text": "Text", "csv": "CSV"}
+
+CONFIG_FILE = "config_paper.yaml"
+# Input and output folders come from the configuration and are not created up front
+DIRECTORIES = ()
+
+
+def report_formats(config):
+    """Reports enabled in the configuration, in PersonReportWriter order."""
+    return [
+        report for report, enabled in (
+            ("text", config.get("generate_text_report", True)),
+            ("csv", config.get("generate_csv_report", True)),
+        ) if enabled
+    ]
+
+
+def archive_patterns(config):
+    """Old outputs in the output folder that a run archives, as (prefix, extensions) tuples."""
+    formats = report_formats(config)
+    return [PersonReportWriter.archive_pattern(formats)] if formats else []
+
+
+def main(config=None):
+    """Run the paper settlement.
+
+    Args:
+        config: Configuration already loaded by the caller (run.py), which then
+            has also archived old outputs; None to load it here
+    """
     print("=" * 60)
     print("PERSONAL EXPENSE SETTLEMENT")
     print("=" * 60)
     print()
 
     # Load configuration
-    config_file = "config_paper.yaml"
-    try:
-        config = read_config(config_file)
-        print(f"✓ Konfiguration geladen: {config_file}")
-    except FileNotFoundError as e:
-        print(f"✗ {e}")
-        return
+    prepared = config is not None
+    if not prepared:
+        try:
+            config = read_config(CONFIG_FILE)
+        except FileNotFoundError as e:
+            print(f"✗ {e}")
+            return False
+    print(f"✓ Konfiguration geladen: {CONFIG_FILE}")
 
     # Find input file (always use most recent)
     try:
-        input_file = find_latest_file(config["input_folder"])
+        input_file = expand_inputs([find_latest_file(config["input_folder"])], latest_only=True)[0]
         print(f"✓ Verwende neueste Datei: {os.path.basename(input_file)}")
-    except FileNotFoundError as e:
+    except (FileNotFoundError, ValueError) as e:
         print(f"✗ {e}")
-        return
+        return False
+
+    # Paper files are maintained by hand and always processed in memory;
+    # the plan is still reported so oversized inputs stand out
+    try:
+        plan = plan_execution(
+            [input_file],
+            memory_budget_mb=config.get("memory_budget_mb", DEFAULT_MEMORY_BUDGET_MB),
+            mode=config.get("execution_mode", MODE_AUTO)
+        )
+    except ValueError as e:
+        print(f"✗ {e}")
+        return False
+    print(f"✓ {plan.describe()}")
+    if plan.mode == MODE_STREAMING:
+        print("  Hinweis: Die Paper-Abrechnung hat keinen Streaming-Pfad und läuft im Speicher.")
+
+    # Unchanged input, config and code: the reports of the last run are still valid
+    run_cache = None
+    if config.get("run_cache", True):
+        run_cache = RunCache(config["output_folder"], "paper")
+        # The rate table is an input too: new rates change converted amounts
+        cache_inputs = [input_file]
+        if config.get("exchange_rates_file") and os.path.isfile(config["exchange_rates_file"]):
+            cache_inputs.append(config["exchange_rates_file"])
+        cache_key = run_cache.key(cache_inputs, config)
+        cached = run_cache.lookup(cache_key)
+        if cached:
+            print_cached_run(cached)
+            return True
+
+    with MemoryTracker(trace=config.get("trace_memory", False)) as memory:
+        outcome = run_settlement(config, input_file, archive_old_files=not prepared)
+    print(memory.describe())
+    if outcome and run_cache:
+        run_cache.store(cache_key, *outcome)
+    return outcome is not None
+
+
+def print_cached_run(cached):
+    print("✓ Keine Änderungen seit dem letzten Lauf, vorhandene Berichte bleiben gültig")
+    print()
+    for line in cached["summary"]:
+        print(line)
+    print()
+    for label, path in cached["outputs"].items():
+        print(f"{REPORT_LABELS.get(label, label) + ':':<6} {path}")
 
+
+def result_lines(settlement_result):
+    """Console lines with the totals and the reimbursement."""
+    lines = [
+        f"Person A:        {settlement_result['person_a_total']:>10.2f} €",
+        f"Person M:        {settlement_result['person_m_total']:>10.2f} €",
+        "-" * 60,
+        f"Gesamt:          {settlement_result['grand_total']:>10.2f} €",
+        f"Pro Person:      {settlement_result['amount_per_person']:>10.2f} €",
+        "",
+    ]
+    reimbursement = settlement_result['reimbursement']
+    if reimbursement['amount'] > 0 and reimbursement['payer']:
+        lines.append("AUSGLEICHSZAHLUNG:")
+        lines.append(f"  {reimbursement['payer'].upper()} zahlt an {reimbursement['recipient'].upper()}: {reimbursement['amount']:.2f} €")
+    else:
+        lines.append("✓ Keine Ausgleichszahlung nötig - beide haben gleich viel ausgegeben!")
+    return lines
+
+
+def run_settlement(config, input_file, archive_old_files=True):
+    """Read, settle and report the expenses of one input file.
+
+    Args:
+        config: Paper configuration
+        input_file: Expense CSV
+        archive_old_files: False if the caller has archived old reports already
+
+    Returns:
+        Tuple (report_paths, result_lines) on success, None on failure
+    """
     # Initialize components
+    try:
+        exchange_rates = load_configured_rates(config)
+    except (OSError, ValueError) as e:
+        print(f"✗ Fehler beim Laden der Kurstabelle: {e}")
+        return None
+    if exchange_rates is not None:
+        print(f"✓ Kurstabelle geladen: {', '.join(exchange_rates.currencies)}")
+
     reader = ExpenseReader(
         valid_persons=config.get("valid_persons", ["a", "b"]),
-        delimiter=config.get("csv_delimiter", ",")
+        delimiter=config.get("csv_delimiter", ","),
+        exchange_rates=exchange_rates
     )
-    writer = PersonReportWriter(config["output_folder"])
+    writer = PersonReportWriter(
+        config["output_folder"], archive_old_files=archive_old_files and config.get("archive_old_files", True)
+    )
+    formats = report_formats(config)
 
-    # Read and validate expenses
+    # Read and validate expenses (incremental mode: only lines appended since the last run)
+    person_totals = None
     try:
-        year, month, expenses = reader.read_csv(input_file)
-        print(f"✓ Gefunden: {len(expenses)} Ausgaben für {year}-{month}")
+        if config.get("incremental", False):
+            state_path = os.path.join(config["output_folder"], "paper_state.json")
+            # The reports list every expense; without reports the stored totals are enough
+            result = IncrementalExpenseReader(reader, state_path).read(input_file, with_expenses=bool(formats))
+            year, month, expenses = result.year, result.month, result.expenses
+            if expenses is None:
+                person_totals = result.person_totals
+            if result.full_recompute:
+                print(f"✓ Vollständig eingelesen: {result.expense_count} Ausgaben für {year}-{month}")
+            else:
+                print(f"✓ Inkrementell: {result.new_count} neue, {result.expense_count} Ausgaben für {year}-{month}")
+        else:
+            year, month, expenses = reader.read_csv(input_file)
+            print(f"✓ Gefunden: {len(expenses)} Ausgaben für {year}-{month}")
     except ValueError as e:
         print(f"✗ Validierungsfehler:\n{e}")
-        return
+        details_path = reader.diagnostics.write_details(config["output_folder"])
+        if details_path:
+            print(f"  Details: {details_path}")
+        return None
     except Exception as e:
         print(f"✗ Fehler beim Lesen der CSV-Datei: {e}")
-        return
+        return None
 
     # Calculate settlement
     try:
-        settlement_result = calculate_person_settlement(expenses)
+        if person_totals is not None:
+            settlement_result = calculate_person_settlement_from_totals(person_totals)
+        else:
+            settlement_result = calculate_person_settlement(expenses)
         print(f"✓ Abrechnung berechnet")
     except ValueError as e:
         print(f"✗ Berechnungsfehler: {e}")
-        return
+        return None
     except Exception as e:
         print(f"✗ Fehler bei der Berechnung: {e}")
-        return
+        return None
 
     # Generate reports
     try:
-        report_paths = writer.generate_reports(settlement_result, expenses, year, month)
-        print(f"✓ Berichte erstellt")
+        report_paths = writer.generate_reports(settlement_result, expenses, year, month, formats)
+        if report_paths:
+            print(f"✓ Berichte erstellt")
+        else:
+            print("✓ Keine Berichte angefordert (generate_text_report und generate_csv_report aus)")
     except Exception as e:
         print(f"✗ Fehler beim Erstellen der Berichte: {e}")
-        return
+        return None
 
     # Display results
     print()
@@ -93,32 +245,25 @@ def main():
     print("ERGEBNIS")
     print("=" * 60)
     print()
-    print(f"Person A:        {settlement_result['person_a_total']:>10.2f} €")
-    print(f"Person M:        {settlement_result['person_m_total']:>10.2f} €")
-    print("-" * 60)
-    print(f"Gesamt:          {settlement_result['grand_total']:>10.2f} €")
-    print(f"Pro Person:      {settlement_result['amount_per_person']:>10.2f} €")
-    print()
-
-    reimbursement = settlement_result['reimbursement']
-    if reimbursement['amount'] > 0 and reimbursement['payer']:
-        print("AUSGLEICHSZAHLUNG:")
-        print(f"  {reimbursement['payer'].upper()} zahlt an {reimbursement['recipient'].upper()}: {reimbursement['amount']:.2f} €")
-    else:
-        print("✓ Keine Ausgleichszahlung nötig - beide haben gleich viel ausgegeben!")
+    lines = result_lines(settlement_result)
+    for line in lines:
+        print(line)
 
+    if report_paths:
+        print()
+        print("=" * 60)
+        print("AUSGABEDATEIEN")
+        print("=" * 60)
+        for label, path in report_paths.items():
+            print(f"{REPORT_LABELS.get(label, label) + ':':<6} {path}")
     print()
-    print("=" * 60)
-    print("AUSGABEDATEIEN")
-    print("=" * 60)
-    print(f"Text:  {report_paths.get('text')}")
-    print(f"CSV:   {report_paths.get('csv')}")
-    print()
+
+    return report_paths, lines
 
 
 if __name__ == "__main__":
     try:
-        main()
+        success = main()
     except KeyboardInterrupt:
         print("\n\nAbgebrochen durch Benutzer.")
         sys.exit(0)
@@ -127,3 +272,4 @@ if __name__ == "__main__":
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    sys.exit(0 if success else 1)
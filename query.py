@@ -0,0 +1,137 @@
+import argparse
+import calendar
+import os
+import sys
+import time
+from datetime import date, datetime
+
+# Stelle sicher, dass alle Module gefunden werden
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from modules.csv_exporter import CsvExporter
+from modules.formatting import format_cents, format_date
+from modules.history import GROUP_BY_COLUMNS, HistoryIndex
+from modules.money import Money
+
+GROUP_LABELS = {
+    "category": "Kategorie",
+    "counterparty": "Gegenpartei",
+    "kind": "Art",
+    "day": "Tag",
+    "month": "Monat",
+    "year": "Jahr",
+}
+KIND_LABELS = {"income": "Einnahmen", "expense": "Ausgaben"}
+
+
+def parse_date_argument(value: str, end_of_period: bool = False) -> date:
+    """Parse YYYY-MM-DD, DD.MM.YYYY, YYYY-MM or YYYY.
+
+    Months and years resolve to their first day, or to their last day if
+    end_of_period is set, so "--from 2025-03 --to 2025-06" covers March to June.
+    """
+    for date_format in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+
+    try:
+        if len(value) == 7:
+            year, month = int(value[:4]), int(value[5:])
+        else:
+            year, month = int(value), 12 if end_of_period else 1
+        day = calendar.monthrange(year, month)[1] if end_of_period else 1
+        return date(year, month, day)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Ungültiges Datum '{value}'. Erwarte YYYY-MM-DD, DD.MM.YYYY, YYYY-MM oder YYYY"
+        )
+
+
+def parse_amount_argument(value: str) -> Money:
+    try:
+        return Money.parse(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def default_output_folder() -> str:
+    """Output folder from config_bank.yaml if present, else output/bank."""
+    if os.path.exists("config_bank.yaml"):
+        from modules.utils import read_config
+        return read_config("config_bank.yaml").get("output_folder", "output/bank")
+    return "output/bank"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Abfragen über alle abgerechneten Bank-Transaktionen")
+    parser.add_argument("--from", dest="date_from", type=parse_date_argument,
+                        help="Ab Datum (YYYY-MM-DD, DD.MM.YYYY, YYYY-MM oder YYYY)")
+    parser.add_argument("--to", dest="date_to", type=lambda value: parse_date_argument(value, True),
+                        help="Bis Datum einschließlich (Monat/Jahr: bis zum letzten Tag)")
+    parser.add_argument("--counterparty", help="Teil des Namens von Empfänger/Absender")
+    parser.add_argument("--category", help="Kategorie, z.B. Lebensmittel")
+    parser.add_argument("--min-amount", type=parse_amount_argument, help="Mindestbetrag (Betrag ohne Vorzeichen)")
+    parser.add_argument("--max-amount", type=parse_amount_argument, help="Höchstbetrag (Betrag ohne Vorzeichen)")
+    parser.add_argument("--kind", choices=["income", "expense"], help="Nur Einnahmen oder nur Ausgaben")
+    parser.add_argument("--group-by", choices=list(GROUP_BY_COLUMNS), help="Summen pro Gruppe")
+    parser.add_argument("--sum", action="store_true", help="Nur Anzahl und Summe ausgeben")
+    parser.add_argument("--limit", type=int, help="Maximale Anzahl Zeilen")
+    parser.add_argument("--output-folder", default=None, help="Bank-Ausgabeordner (Standard: aus config_bank.yaml)")
+    parser.add_argument("--rebuild", action="store_true", help="Index komplett neu aufbauen")
+    args = parser.parse_args()
+
+    output_folder = args.output_folder or default_output_folder()
+    if not os.path.isdir(output_folder):
+        print(f"Fehler: Ausgabeordner {output_folder} nicht gefunden")
+        return 1
+
+    start = time.perf_counter()
+    exporter = CsvExporter(output_folder)
+    index = HistoryIndex(output_folder, exporter._determine_expense_category)
+    try:
+        ingested = index.refresh(rebuild=args.rebuild)
+        if ingested:
+            print(f"Index aktualisiert: {ingested} Abrechnung(en) eingelesen\n")
+
+        rows = index.query(
+            date_from=args.date_from,
+            date_to=args.date_to,
+            counterparty=args.counterparty,
+            category=args.category,
+            min_amount=args.min_amount,
+            max_amount=args.max_amount,
+            kind=args.kind,
+            group_by=args.group_by or ("kind" if args.sum else None),
+            limit=None if args.sum else args.limit,
+        )
+    finally:
+        index.close()
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    if args.group_by or args.sum:
+        count = sum(row[1] for row in rows)
+        total = sum(row[2] for row in rows)
+        if args.group_by:
+            print(f"{GROUP_LABELS[args.group_by]:<40} {'Anzahl':>8} {'Summe':>14}")
+            for key, group_count, group_total in rows:
+                label = KIND_LABELS.get(key, key) if args.group_by == "kind" else str(key)
+                print(f"{label[:40]:<40} {group_count:>8} {format_cents(group_total, True) + ' €':>14}")
+            print("-" * 64)
+        print(f"{'Gesamt':<40} {count:>8} {format_cents(total, True) + ' €':>14}")
+    else:
+        for iso_date, counterparty, amount_cents, category in rows:
+            print(
+                f"{format_date(date.fromisoformat(iso_date))}  {counterparty[:40]:<40} "
+                f"{format_cents(amount_cents, True) + ' €':>14}  {category}"
+            )
+        print(f"\n{len(rows)} Transaktion(en)")
+
+    print(f"({duration_ms:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
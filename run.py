@@ -0,0 +1,191 @@
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Stelle sicher, dass alle Module gefunden werden
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+try:
+    import yaml
+except ImportError:
+    print("Fehler: PyYAML ist nicht installiert.")
+    print("Installiere es mit: pip install pyyaml")
+    sys.exit(1)
+
+import bank
+import paper
+from modules.locking import sweep_old_outputs
+from modules.utils import create_directories, read_config
+
+PIPELINES = {
+    "bank": ("Bank-Abrechnung", bank),
+    "paper": ("Paper-Abrechnung", paper),
+}
+
+
+class ThreadOutput(io.TextIOBase):
+    """sys.stdout replacement that sends each thread's prints to its own buffer.
+
+    contextlib.redirect_stdout swaps the process-wide stdout, which does not
+    work for two pipelines printing at the same time. Threads without a
+    buffer write to the original stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self) -> io.StringIO:
+        self._local.buffer = io.StringIO()
+        return self._local.buffer
+
+    def release(self) -> None:
+        self._local.buffer = None
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def prepare(names: list) -> tuple:
+    """Do the setup the pipelines share once, before they start.
+
+    Creates the directories of all pipelines, loads each configuration and
+    archives old outputs with one sweep per output folder. The pipelines
+    then skip these steps.
+
+    Returns:
+        Tuple (configs, errors): configuration per pipeline, and an error
+        message per pipeline whose configuration could not be loaded
+    """
+    create_directories(*dict.fromkeys(
+        directory for name in names for directory in PIPELINES[name][1].DIRECTORIES
+    ))
+
+    configs = {}
+    errors = {}
+    sweeps = {}
+    for name in names:
+        module = PIPELINES[name][1]
+        try:
+            config = read_config(module.CONFIG_FILE)
+        except (OSError, yaml.YAMLError) as error:
+            errors[name] = f"{type(error).__name__}: {str(error).splitlines()[0]}"
+            continue
+        configs[name] = config
+        if config.get("archive_old_files", True) and config.get("output_folder"):
+            sweeps.setdefault(config["output_folder"], []).extend(module.archive_patterns(config))
+
+    for directory, patterns in sweeps.items():
+        for filename in sweep_old_outputs(directory, patterns):
+            print(f"Archiviert: {filename}")
+    return configs, errors
+
+
+def run_pipeline(output: ThreadOutput, name: str, config: dict) -> dict:
+    """Run one pipeline with its console output captured.
+
+    Returns:
+        Dictionary with name, success, duration, error and the captured log
+    """
+    label, module = PIPELINES[name]
+    buffer = output.capture()
+    start = time.perf_counter()
+    error = ""
+    try:
+        success = bool(module.main(config))
+    except Exception as exception:
+        success = False
+        error = f"{type(exception).__name__}: {exception}"
+    finally:
+        output.release()
+
+    log = buffer.getvalue()
+    if not success and not error:
+        error = _first_error_line(log)
+    return {
+        "name": name,
+        "label": label,
+        "success": success,
+        "duration": time.perf_counter() - start,
+        "error": error,
+        "log": log,
+    }
+
+
+def _failed_result(name: str, error: str) -> dict:
+    """Result of a pipeline that could not be started."""
+    return {
+        "name": name,
+        "label": PIPELINES[name][0],
+        "success": False,
+        "duration": 0.0,
+        "error": error,
+        "log": "",
+    }
+
+
+def _first_error_line(log: str) -> str:
+    for line in log.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(("Fehler", "✗")):
+            return stripped.lstrip("✗ ").strip()
+    return "Pipeline fehlgeschlagen"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bank- und Paper-Abrechnung in einem Prozess ausführen")
+    parser.add_argument("pipelines", nargs="*", metavar="{bank,paper}",
+                        help="Auszuführende Abrechnungen (Standard: alle)")
+    parser.add_argument("--sequential", action="store_true", help="Nacheinander statt gleichzeitig ausführen")
+    args = parser.parse_args()
+    unknown = [name for name in args.pipelines if name not in PIPELINES]
+    if unknown:
+        parser.error(f"Unbekannte Abrechnung: {', '.join(unknown)}. Erlaubt: {', '.join(PIPELINES)}")
+    names = list(dict.fromkeys(args.pipelines)) or list(PIPELINES)
+
+    start = time.perf_counter()
+    configs, errors = prepare(names)
+    runnable = [name for name in names if name in configs]
+
+    output = ThreadOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=1 if args.sequential else max(len(runnable), 1)) as executor:
+            finished = executor.map(lambda name: run_pipeline(output, name, configs[name]), runnable)
+            results = {result["name"]: result for result in finished}
+    finally:
+        sys.stdout = output.stream
+    results = [results.get(name) or _failed_result(name, errors[name]) for name in names]
+
+    for result in results:
+        if not result["log"]:
+            continue
+        print(result["log"], end="" if result["log"].endswith("\n") else "\n")
+        print()
+
+    print("=" * 60)
+    print("ZUSAMMENFASSUNG")
+    print("=" * 60)
+    for result in results:
+        symbol = "✓" if result["success"] else "✗"
+        line = f"{symbol} {result['label']:<18} {result['duration']:>6.2f}s"
+        if result["error"]:
+            line += f"  {result['error']}"
+        print(line)
+    print(f"Gesamtdauer: {time.perf_counter() - start:.2f}s")
+
+    failed = [result for result in results if not result["success"]]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stelle sicher, dass alle Module gefunden werden
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+try:
+    import yaml  # noqa: F401
+except ImportError:
+    print("Fehler: PyYAML ist nicht installiert.")
+    print("Installiere es mit: pip install pyyaml")
+    sys.exit(1)
+
+from modules.csv_reader import BankStatementReader
+from modules.exchange_rates import load_configured_rates
+from modules.expense_reader import ExpenseReader
+from modules.filters import partition_transactions
+from modules.money import Money
+from modules.rules import RuleEngine
+from modules.settlement import calculate_bank_settlement, calculate_person_settlement
+from modules.utils import read_config
+from config.settings import Settings
+
+MAX_BODY_BYTES = 50 * 1024 * 1024
+
+
+class ServiceMetrics:
+    """Thread-safe request counters and timings per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.endpoints = {}
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, endpoint: str, duration_ms: float, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+            stats = self.endpoints.setdefault(
+                endpoint, {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["requests"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if failed:
+                stats["errors"] += 1
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self.endpoints.items():
+                endpoints[endpoint] = dict(stats)
+                endpoints[endpoint]["avg_ms"] = round(stats["total_ms"] / stats["requests"], 3)
+                endpoints[endpoint]["total_ms"] = round(stats["total_ms"], 3)
+                endpoints[endpoint]["max_ms"] = round(stats["max_ms"], 3)
+            return {"in_flight": self.in_flight, "rejected": self.rejected, "endpoints": endpoints}
+
+
+class SettlementService:
+    """Keeps configuration, settings and compiled filter rules in memory."""
+
+    def __init__(self, bank_config_file: str, paper_config_file: str, max_concurrent: int,
+                 queue_timeout: float):
+        self.bank_config = self._load_optional_config(bank_config_file)
+        self.paper_config = self._load_optional_config(paper_config_file)
+        self.settings = Settings()
+        # Loaded once; the service has to be restarted to pick up new rates
+        self.exchange_rates = load_configured_rates(self.paper_config) if self.paper_config else None
+        self.rule_engine = RuleEngine(
+            self.settings.income_allow_list,
+            self.settings.expense_block_list,
+            self.settings.filter_rules,
+            fuzzy_threshold=(self.bank_config or {}).get("fuzzy_match_threshold")
+        )
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.queue_timeout = queue_timeout
+        self.metrics = ServiceMetrics()
+
+    def _load_optional_config(self, config_file: str) -> dict:
+        try:
+            config = read_config(config_file)
+            print(f"Konfiguration geladen: {config_file}")
+            return config
+        except FileNotFoundError:
+            print(f"Warnung: {config_file} nicht gefunden - Endpunkt deaktiviert")
+            return None
+
+    def settle_bank(self, content: str) -> tuple:
+        """Settle an uploaded DKB statement. Returns (status, payload)."""
+        if self.bank_config is None:
+            return 503, {"error": "Bank-Abrechnung nicht konfiguriert"}
+
+        reader = BankStatementReader(delimiter=self.bank_config.get("csv_delimiter"))
+        transactions = reader.parse_content(content)
+        filter_result = partition_transactions(
+            transactions,
+            self.settings.income_allow_list,
+            self.settings.expense_block_list,
+            rule_engine=self.rule_engine
+        )
+        if not filter_result.kept:
+            return 422, {"error": "Keine relevanten Transaktionen gefunden"}
+
+        return 200, {
+            "settlement": calculate_bank_settlement(filter_result.kept),
+            "transactions": len(transactions),
+            "relevant": len(filter_result.kept),
+            "ignored": len(filter_result.ignored),
+            "zero_amount": len(filter_result.zero_amount),
+            "invalid_rows": reader.diagnostics.summary_lines(),
+        }
+
+    def settle_paper(self, content: str) -> tuple:
+        """Settle an uploaded personal expense CSV. Returns (status, payload)."""
+        if self.paper_config is None:
+            return 503, {"error": "Paper-Abrechnung nicht konfiguriert"}
+
+        reader = ExpenseReader(
+            valid_persons=self.paper_config.get("valid_persons", ["a", "b"]),
+            delimiter=self.paper_config.get("csv_delimiter", ","),
+            exchange_rates=self.exchange_rates
+        )
+        try:
+            year, month, expenses = reader.parse_lines(content.splitlines(keepends=True))
+        except ValueError as error:
+            return 422, {"error": str(error)}
+
+        return 200, {
+            "year": year,
+            "month": month,
+            "expenses": len(expenses),
+            "settlement": calculate_person_settlement(expenses),
+        }
+
+
+class SettlementRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send_json(200, self.service.metrics.snapshot())
+        else:
+            self._send_json(404, {"error": f"Unbekannter Pfad: {self.path}"})
+
+    def do_POST(self):
+        handlers = {"/bank": self.service.settle_bank, "/paper": self.service.settle_paper}
+        handler = handlers.get(self.path)
+        if handler is None:
+            self._send_json(404, {"error": f"Unbekannter Pfad: {self.path}"})
+            return
+
+        length = _content_length(self.headers.get("Content-Length"))
+        if length is None:
+            self._send_json(400, {"error": "Ungültiger Content-Length-Header"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {"error": "Datei zu groß"})
+            return
+        body = self.rfile.read(length)
+
+        if not self.service.slots.acquire(timeout=self.service.queue_timeout):
+            self.service.metrics.reject()
+            self._send_json(503, {"error": "Zu viele gleichzeitige Anfragen"})
+            return
+
+        self.service.metrics.start()
+        start = time.perf_counter()
+        status = 500
+        try:
+            status, payload = handler(body.decode("utf-8-sig"))
+        except Exception as error:
+            payload = {"error": f"{type(error).__name__}: {error}"}
+        finally:
+            self.service.slots.release()
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.service.metrics.finish(self.path, duration_ms, status >= 400)
+
+        payload["duration_ms"] = round(duration_ms, 3)
+        self._send_json(status, payload)
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _content_length(value):
+    """Body length from the Content-Length header (0 if missing), None if it is not a non-negative integer."""
+    if value is None:
+        return 0
+    value = value.strip()
+    if not value.isascii() or not value.isdigit():
+        return None
+    return int(value)
+
+
+def _json_default(value):
+    """Serialize Money amounts as euro numbers with two decimals."""
+    if isinstance(value, Money):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} ist nicht JSON-serialisierbar")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokaler Abrechnungs-Service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-concurrent", type=int, default=os.cpu_count() or 1,
+                        help="Maximale Anzahl gleichzeitig berechneter Anfragen")
+    parser.add_argument("--queue-timeout", type=float, default=5.0,
+                        help="Wartezeit in Sekunden auf einen freien Platz, danach 503")
+    args = parser.parse_args()
+
+    print("=== Abrechnungs-Service ===\n")
+
+    SettlementRequestHandler.service = SettlementService(
+        "config_bank.yaml", "config_paper.yaml", args.max_concurrent, args.queue_timeout
+    )
+    server = ThreadingHTTPServer((args.host, args.port), SettlementRequestHandler)
+    print(f"Lausche auf http://{args.host}:{args.port}")
+    print("POST /bank, POST /paper, GET /metrics, GET /health")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nBeendet.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
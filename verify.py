@@ -0,0 +1,371 @@
+import argparse
+import contextlib
+import gzip
+import io
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import types
+import zipfile
+
+# Stelle sicher, dass alle Module gefunden werden
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+import bank
+from modules.csv_exporter import CsvExporter
+from modules.csv_reader import BankStatementReader
+from modules.dedup import TransactionDeduplicator
+from modules.expense_reader import ExpenseReader
+from modules.filters import partition_transactions
+from modules.incremental import IncrementalExpenseReader
+from modules.locking import LOCK_FILENAME
+from modules.parallel_reader import ParallelStatementReader
+from modules.planner import MODE_STREAMING, plan_execution
+from modules.report_writer import BankReportWriter, PersonReportWriter
+from modules.rules import RuleEngine
+from modules.settlement import (calculate_bank_settlement, calculate_person_settlement,
+                                calculate_person_settlement_from_totals)
+from modules.synthetic import ALLOW_LIST, BLOCK_LIST, VALID_PERSONS, generate_expenses, generate_statement
+
+BANK_FORMATS = ["csv", "xlsx", "jsonl", "sqlite"]
+STATEMENT_FILENAME = "kontoauszug.csv"
+EXPENSES_FILENAME = "ausgaben.csv"
+
+# Differences listed per engine before the rest is only counted
+MAX_LISTED_DIFFERENCES = 5
+
+# Expenses of the fixed extra case: its file is well over the 64 KiB an edit
+# before the stored offset may lie back
+LARGE_PAPER_ROWS = 4000
+
+
+# Bank engines: read the statement of a case and write all outputs into output_folder
+
+def bank_reference(case_folder: str, output_folder: str) -> None:
+    """The classic path: read_csv, partition, settle, write report and exports."""
+    reader = BankStatementReader(delimiter=";")
+    transactions = reader.read_csv(os.path.join(case_folder, STATEMENT_FILENAME))
+    _write_bank_outputs(reader, transactions, output_folder)
+
+
+def bank_parallel(case_folder: str, output_folder: str) -> None:
+    """Byte-range parallel reader, forced even for small statements."""
+    reader = BankStatementReader(delimiter=";")
+    parallel_reader = ParallelStatementReader(reader, workers=2, min_parallel_bytes=0)
+    transactions = parallel_reader.read_csv(os.path.join(case_folder, STATEMENT_FILENAME))
+    _write_bank_outputs(reader, transactions, output_folder)
+
+
+def bank_in_memory(case_folder: str, output_folder: str) -> None:
+    """In-memory path of bank.py (bank.run_in_memory), including its checks."""
+    statement_path = os.path.join(case_folder, STATEMENT_FILENAME)
+    config = {"output_folder": output_folder, "output_formats": BANK_FORMATS}
+    settings = types.SimpleNamespace(income_allow_list=ALLOW_LIST, expense_block_list=BLOCK_LIST)
+    bank.run_in_memory(
+        config, [statement_path], BankStatementReader(delimiter=";"), TransactionDeduplicator(),
+        RuleEngine(ALLOW_LIST, BLOCK_LIST), settings, BankReportWriter(output_folder),
+        CsvExporter(output_folder)
+    )
+
+
+def bank_streaming(case_folder: str, output_folder: str) -> None:
+    """Streaming path of bank.py with sorted runs spilled to disk."""
+    statement_path = os.path.join(case_folder, STATEMENT_FILENAME)
+    plan = plan_execution([statement_path], memory_budget_mb=1, mode=MODE_STREAMING)
+    config = {"output_folder": output_folder, "output_formats": BANK_FORMATS}
+    bank.run_streaming(
+        config, [statement_path], BankStatementReader(delimiter=";"), TransactionDeduplicator(),
+        RuleEngine(ALLOW_LIST, BLOCK_LIST), plan, BankReportWriter(output_folder),
+        CsvExporter(output_folder)
+    )
+
+
+def bank_gzip(case_folder: str, output_folder: str) -> None:
+    """Classic path reading the gzip-compressed statement."""
+    reader = BankStatementReader(delimiter=";")
+    transactions = reader.read_csv(os.path.join(case_folder, STATEMENT_FILENAME + ".gz"))
+    _write_bank_outputs(reader, transactions, output_folder)
+
+
+def _write_bank_outputs(reader, transactions, output_folder):
+    reader.diagnostics.report(output_folder)
+    rule_engine = RuleEngine(ALLOW_LIST, BLOCK_LIST)
+    result = partition_transactions(transactions, ALLOW_LIST, BLOCK_LIST, rule_engine=rule_engine)
+    # Expected behavior of every path: fail before writing anything if nothing is kept
+    if not result.kept:
+        raise ValueError("Keine relevanten Transaktionen gefunden")
+    settlement_result = calculate_bank_settlement(result.kept)
+    BankReportWriter(output_folder).generate_report(settlement_result, result.kept)
+    CsvExporter(output_folder).export(
+        settlement_result, result.kept, transactions, result.ignored, result.zero_amount,
+        formats=BANK_FORMATS
+    )
+
+
+# Paper engines: read the expense file of a case and write the reports into output_folder
+
+def paper_reference(case_folder: str, output_folder: str) -> None:
+    """The classic path: read_csv, settle, write text and CSV report."""
+    reader = ExpenseReader(valid_persons=VALID_PERSONS, delimiter=";")
+    year, month, expenses = reader.read_csv(os.path.join(case_folder, EXPENSES_FILENAME))
+    settlement_result = calculate_person_settlement(expenses)
+    PersonReportWriter(output_folder).generate_reports(settlement_result, expenses, year, month)
+
+
+def paper_incremental(case_folder: str, output_folder: str) -> None:
+    """Incremental reader: first half of the file, then the appended rest from the stored state."""
+    lines = _expense_lines(case_folder)
+    input_path, state_path = _incremental_paths(case_folder)
+    _write_lines(input_path, lines[:3 + (len(lines) - 3) // 2])
+    try:
+        _read_incremental(input_path, state_path)
+    except ValueError:
+        pass
+    _write_lines(input_path, lines)
+    _write_incremental_reports(_read_incremental(input_path, state_path), output_folder)
+
+
+def paper_incremental_edited(case_folder: str, output_folder: str) -> None:
+    """Incremental reader after an edit far before the stored offset.
+
+    The first run reads all but the last rows with the payer of the first
+    row changed. The second run sees that row restored and the rest
+    appended; only a full recompute gives the reference result.
+    """
+    lines = _expense_lines(case_folder)
+    input_path, state_path = _incremental_paths(case_folder)
+    edited = list(lines)
+    # The payer is the first field and never quoted
+    edited[3] = ("b" if edited[3].startswith("a") else "a") + edited[3][1:]
+    _write_lines(input_path, edited[:max(4, len(lines) - 5)])
+    try:
+        _read_incremental(input_path, state_path)
+    except ValueError:
+        pass
+    _write_lines(input_path, lines)
+    result = _read_incremental(input_path, state_path)
+    if not result.full_recompute:
+        raise ValueError("Änderung vor dem gespeicherten Offset nicht erkannt")
+    _write_incremental_reports(result, output_folder)
+
+
+def _expense_lines(case_folder):
+    with open(os.path.join(case_folder, EXPENSES_FILENAME), "r", encoding="utf-8", newline="") as file:
+        return file.readlines()
+
+
+def _incremental_paths(case_folder):
+    """Input copy and state file of the incremental engines; an old state is removed."""
+    state_path = os.path.join(case_folder, "paper_state.json")
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return os.path.join(case_folder, "ausgaben_inkrementell.csv"), state_path
+
+
+def _write_lines(path, lines):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.writelines(lines)
+
+
+def _write_incremental_reports(result, output_folder):
+    # As in paper.py: the reports list the stored expenses and are settled from them
+    settlement_result = calculate_person_settlement(result.expenses)
+    if settlement_result != calculate_person_settlement_from_totals(result.person_totals):
+        raise ValueError("Gespeicherte Summen passen nicht zu den gespeicherten Ausgaben")
+    PersonReportWriter(output_folder).generate_reports(
+        settlement_result, result.expenses, result.year, result.month
+    )
+
+
+def _read_incremental(input_path, state_path):
+    reader = ExpenseReader(valid_persons=VALID_PERSONS, delimiter=";")
+    return IncrementalExpenseReader(reader, state_path).read(input_path)
+
+
+BANK_ENGINES = {
+    "speicher": bank_in_memory,
+    "parallel": bank_parallel,
+    "streaming": bank_streaming,
+    "gzip": bank_gzip,
+}
+PAPER_ENGINES = {
+    "inkrementell": paper_incremental,
+    "bearbeitet": paper_incremental_edited,
+}
+
+
+def prepare_case(case_folder: str, rng, rows: int, paper_rows: int, keep_none: bool = False) -> None:
+    """Write the generated statement (plain and gzip) and expense file of one case.
+
+    With keep_none the lists filter out every transaction of the statement.
+    """
+    os.makedirs(case_folder, exist_ok=True)
+    statement = generate_statement(rng, rows, keep_none=keep_none).encode("utf-8")
+    with open(os.path.join(case_folder, STATEMENT_FILENAME), "wb") as file:
+        file.write(statement)
+    with gzip.open(os.path.join(case_folder, STATEMENT_FILENAME + ".gz"), "wb") as file:
+        file.write(statement)
+    with open(os.path.join(case_folder, EXPENSES_FILENAME), "w", encoding="utf-8", newline="") as file:
+        file.write(generate_expenses(rng, paper_rows))
+
+
+def run_engine(engine, case_folder: str, output_folder: str) -> dict:
+    """Run one engine with its console output suppressed.
+
+    Returns:
+        Dictionary with seconds, error (message or "") and outputs (path -> normalized bytes)
+    """
+    start = time.perf_counter()
+    error = ""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine(case_folder, output_folder)
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {' '.join(str(exception).split())}"
+    return {
+        "seconds": time.perf_counter() - start,
+        "error": error,
+        "outputs": snapshot(output_folder),
+    }
+
+
+def snapshot(folder: str) -> dict:
+    """Normalized content of every output file, keyed by its path relative to folder.
+
+    Creation timestamps are dropped from text and CSV files, SQLite databases
+    are compared as SQL dumps and XLSX workbooks by their member contents,
+    since the zip container stores write times.
+    """
+    outputs = {}
+    for directory, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if filename == LOCK_FILENAME:
+                continue
+            path = os.path.join(directory, filename)
+            outputs[os.path.relpath(path, folder)] = _normalized_content(path)
+    return outputs
+
+
+def _normalized_content(path: str) -> bytes:
+    extension = os.path.splitext(path)[1]
+    if extension == ".sqlite":
+        with contextlib.closing(sqlite3.connect(path)) as connection:
+            return "\n".join(connection.iterdump()).encode("utf-8")
+    if extension == ".xlsx":
+        with zipfile.ZipFile(path) as archive:
+            return b"".join(
+                name.encode("utf-8") + b"\0" + archive.read(name) for name in sorted(archive.namelist())
+            )
+    with open(path, "rb") as file:
+        content = file.read()
+    if extension in (".txt", ".csv"):
+        content = b"".join(
+            line for line in content.splitlines(keepends=True) if not line.startswith(b"Erstellt am")
+        )
+    return content
+
+
+def differences(reference: dict, candidate: dict) -> list:
+    """Describe how a candidate result differs from the reference (empty if identical)."""
+    found = []
+    if reference["error"] != candidate["error"]:
+        found.append(f"Fehler: Referenz '{reference['error'] or '-'}', Engine '{candidate['error'] or '-'}'")
+    for path in sorted(set(reference["outputs"]) | set(candidate["outputs"])):
+        if path not in candidate["outputs"]:
+            found.append(f"{path} fehlt")
+        elif path not in reference["outputs"]:
+            found.append(f"{path} zusätzlich")
+        elif reference["outputs"][path] != candidate["outputs"][path]:
+            found.append(f"{path} weicht ab")
+    return found
+
+
+def verify(pipeline: str, reference_engine, engines: dict, cases: list, work_folder: str) -> bool:
+    """Run all cases through the reference and each engine and print the comparison.
+
+    Returns:
+        True if every engine matched the reference in every case
+    """
+    reference_seconds = 0.0
+    stats = {name: {"seconds": 0.0, "identical": 0, "differences": []} for name in engines}
+    for case_number, case_folder in cases:
+        output_root = os.path.join(work_folder, pipeline, f"fall_{case_number:03d}")
+        reference = run_engine(reference_engine, case_folder, os.path.join(output_root, "referenz"))
+        reference_seconds += reference["seconds"]
+        for name, engine in engines.items():
+            candidate = run_engine(engine, case_folder, os.path.join(output_root, name))
+            stats[name]["seconds"] += candidate["seconds"]
+            found = differences(reference, candidate)
+            if found:
+                stats[name]["differences"].extend(f"Fall {case_number}: {line}" for line in found)
+            else:
+                stats[name]["identical"] += 1
+
+    print(f"{pipeline.capitalize()} (Referenz {reference_seconds:.2f}s):")
+    all_identical = True
+    for name, result in stats.items():
+        identical = result["identical"] == len(cases)
+        all_identical = all_identical and identical
+        speedup = reference_seconds / result["seconds"] if result["seconds"] else 0.0
+        print(f"  {'✓' if identical else '✗'} {name:<13} {result['identical']:>3}/{len(cases)} identisch"
+              f"  {result['seconds']:>7.2f}s  Faktor {speedup:.2f}x")
+        for line in result["differences"][:MAX_LISTED_DIFFERENCES]:
+            print(f"      {line}")
+        if len(result["differences"]) > MAX_LISTED_DIFFERENCES:
+            print(f"      ... und {len(result['differences']) - MAX_LISTED_DIFFERENCES} weitere Abweichungen")
+    return all_identical
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Alternative Engines gegen die Referenz auf zufälligen Kontoauszügen und Ausgaben prüfen"
+    )
+    parser.add_argument("--cases", type=int, default=20, help="Anzahl zufälliger Fälle (Standard: 20)")
+    parser.add_argument("--seed", type=int, default=1, help="Startwert des Zufallsgenerators (Standard: 1)")
+    parser.add_argument("--rows", type=int, default=500, help="Buchungen pro Kontoauszug (Standard: 500)")
+    parser.add_argument("--paper-rows", type=int, default=40, help="Ausgaben pro Paper-Datei (Standard: 40)")
+    parser.add_argument("--keep", metavar="ORDNER",
+                        help="Fälle und Ausgaben in diesem Ordner behalten statt in einem temporären")
+    args = parser.parse_args()
+    if args.cases < 1 or args.rows < 1 or args.paper_rows < 1:
+        parser.error("--cases, --rows und --paper-rows müssen mindestens 1 sein")
+    if args.keep and os.path.exists(args.keep) and os.listdir(args.keep):
+        parser.error(f"Ordner {args.keep} ist nicht leer")
+
+    work_folder = args.keep or tempfile.mkdtemp(prefix="abrechnung_pruefung_")
+
+    try:
+        rng = random.Random(args.seed)
+        cases = []
+        for case_number in range(1, args.cases + 1):
+            case_folder = os.path.join(work_folder, "faelle", f"fall_{case_number:03d}")
+            prepare_case(case_folder, rng, args.rows, args.paper_rows)
+            cases.append((case_number, case_folder))
+        # Fixed extra case: nothing kept in the statement, a large expense file
+        case_number = args.cases + 1
+        case_folder = os.path.join(work_folder, "faelle", f"fall_{case_number:03d}")
+        prepare_case(case_folder, rng, args.rows, LARGE_PAPER_ROWS, keep_none=True)
+        cases.append((case_number, case_folder))
+
+        print(f"Äquivalenzprüfung: {args.cases} Fälle + 1 Sonderfall, Seed {args.seed}, "
+              f"{args.rows} Buchungen / {args.paper_rows} Ausgaben pro Fall")
+        print()
+        bank_identical = verify("bank", bank_reference, BANK_ENGINES, cases, work_folder)
+        print()
+        paper_identical = verify("paper", paper_reference, PAPER_ENGINES, cases, work_folder)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    if args.keep:
+        print(f"\nFälle und Ausgaben: {work_folder}")
+    return 0 if bank_identical and paper_identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())